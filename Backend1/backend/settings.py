@@ -47,8 +47,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # ** per-view latency/SQL metrics, exported at /api/metrics; first so it times everything below
+    "store.metrics.MetricsMiddleware",
+    # ** sends catalog/order GETs to a read replica (store/routers.py)
+    "store.routers.ReplicaRoutingMiddleware",
     # ** django-cors-header
     "corsheaders.middleware.CorsMiddleware",
+    # ** token buckets from STORE_RATE_LIMITS; after CORS so 429s stay readable by the frontend
+    "store.throttling.ThrottleMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,20 +90,57 @@ WSGI_APPLICATION = 'backend.wsgi.application'
  # ** In my mysql database
 
 from decouple import config
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': config("DB_NAME"),
-        "USER": config("DB_USER"),
-        "PASSWORD": config("DB_PASSWORD"),
-        "HOST": config("DB_HOST"),
-        "PORT": config("DB_PORT"),
-        'OPTIONS': {
-            'charset': 'utf8mb4',
-            "init_command": "SET sql_mode= 'STRICT_TRANS_TABLES'"
-        },
+if config("DB_ENGINE", default="mysql") == "mysql":
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': config("DB_NAME"),
+            "USER": config("DB_USER"),
+            "PASSWORD": config("DB_PASSWORD"),
+            "HOST": config("DB_HOST"),
+            "PORT": config("DB_PORT"),
+            'OPTIONS': {
+                'charset': 'utf8mb4',
+                "init_command": "SET sql_mode= 'STRICT_TRANS_TABLES'"
+            },
+        }
+    }
+else:
+    # ** DB_ENGINE=sqlite: local runs of the seed/benchmark commands without MySQL
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config("DB_NAME", default=str(BASE_DIR / "db.sqlite3")),
+            'OPTIONS': {
+                # ** let concurrent benchmark writers queue instead of failing
+                "timeout": 20,
+                "transaction_mode": "IMMEDIATE",
+                "init_command": "PRAGMA journal_mode=WAL;",
+            },
+            # ** a file, not the in-memory default, so the threads of StockStressTests really race
+            'TEST': {'NAME': str(BASE_DIR / "test_db.sqlite3")},
+        }
     }
-}
+
+# ** persistent connections, checked before reuse. MySQL has no built-in pool in
+# ** Django, so each worker thread keeps its own connection for DB_CONN_MAX_AGE
+# ** seconds (ASGI closes connections per request; keep 0 there)
+DATABASES["default"]["CONN_MAX_AGE"] = config("DB_CONN_MAX_AGE", default=60, cast=int)
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
+# ** read replicas: comma-separated hosts (mysql) or database files (sqlite);
+# ** see store/routers.py for which reads go there
+for index, replica in enumerate(filter(None, config("DB_REPLICAS", default="").split(","))):
+    DATABASES[f"replica{index + 1}"] = {
+        **DATABASES["default"],
+        "HOST" if DATABASES["default"]["ENGINE"].endswith("mysql") else "NAME": replica.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+STORE_DB_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["store.routers.ReplicaRouter"]
+# ** after a write, the writer's reads (and after catalog edits, all catalog
+# ** reads) stay on the primary this long; set above the usual replication lag
+DB_REPLICA_STICKY_SECONDS = config("DB_REPLICA_STICKY_SECONDS", default=5, cast=int)
 
 
 # Password validation
@@ -137,6 +180,7 @@ USE_TZ = True
 STATIC_URL = 'static/'
 
 import os
+from corsheaders.defaults import default_headers
 # ** allowing fronend local host to recive the backend
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
@@ -148,9 +192,73 @@ CSRF_TRUSTED_ORIGINS = [
     "http://localhost:5174",
 ]
 
+# ** the guest cart lives in a signed cookie (store/carts.py), so the frontend sends credentials
+CORS_ALLOW_CREDENTIALS = True
+# ** retried checkouts and cart adds carry an Idempotency-Key (store/idempotency.py)
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
+CORS_EXPOSE_HEADERS = ["Idempotent-Replayed"]
+# ** Lax only reaches the API from a same-site page: the frontend calls http://localhost:8000
+# ** (same site as localhost:5173, ports do not count), not 127.0.0.1. An API on another
+# ** site needs GUEST_CART_COOKIE_SAMESITE=None, which also makes the cookie Secure (HTTPS only)
+GUEST_CART_COOKIE_SAMESITE = os.getenv("GUEST_CART_COOKIE_SAMESITE", "Lax")
+# ** browsers drop a SameSite=None cookie that is not Secure
+GUEST_CART_COOKIE_SECURE = os.getenv("GUEST_CART_COOKIE_SECURE", "") == "1" or GUEST_CART_COOKIE_SAMESITE == "None"
+
+# ** byte-for-byte JSONRenderer output, encoded with orjson when it is installed
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "store.fastser.OrjsonRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+# ** catalog responses are cached per catalog version (see store/catalog_cache.py);
+# ** point "default" at a shared backend such as redis when running several workers
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+CATALOG_CACHE_ALIAS = "default"
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# ** token buckets per URL name (store/throttling.py): a rate or (rate, burst) per
+# ** client address, per token and per endpoint; buckets live in this cache, so
+# ** point it at the shared backend when running several workers
+STORE_RATE_LIMIT_CACHE = "default"
+# ** e.g. "HTTP_X_FORWARDED_FOR" behind a proxy that appends to it; the client is the hop
+# ** the outermost of STORE_RATE_LIMIT_TRUSTED_PROXIES proxies saw, counted from the right
+STORE_RATE_LIMIT_CLIENT_HEADER = os.getenv("RATE_LIMIT_CLIENT_HEADER") or None
+STORE_RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "1"))
+STORE_RATE_LIMITS = {
+    "*": {"client": ("50/s", 100)},
+    # ** every attempt costs a PBKDF2 hash
+    "login": {"client": ("10/m", 10), "endpoint": ("20/s", 40)},
+    "register": {"client": ("5/m", 5), "endpoint": ("20/s", 40)},
+    "get-products?search": {"client": ("5/s", 20), "user": ("5/s", 20)},
+    "async-get-products?search": {"client": ("5/s", 20), "user": ("5/s", 20)},
+    "create-order": {"user": ("10/m", 10)},
+    # ** each call walks a date range of orders
+    "export-orders": {"user": ("6/m", 3), "endpoint": ("1/s", 4)},
+}
+
+# ** directory shared by all worker processes for /api/metrics (empty it on restart);
+# ** unset keeps metrics per process
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+
+# ** in-process token -> user cache used by store.views.get_auth_user
+AUTH_TOKEN_CACHE_SIZE = 10000
+AUTH_TOKEN_CACHE_TTL = 300
+
 MEDIA_URL  = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# ** product image derivatives (store/images.py), rendered in a process pool;
+# ** backfill existing media with `python manage.py generate_image_variants`
+IMAGE_VARIANT_SIZES = {"thumb": 160, "card": 480, "large": 1024}
+IMAGE_VARIANT_WORKERS = 2
+IMAGE_VARIANTS_SYNC = False
+
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "smtp.gmail.com"
 EMAIL_PORT = 587
@@ -161,3 +269,18 @@ EMAIL_HOST_PASSWORD = os.getenv("EMAIL_PASSWORD")
 
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# ** order notifications go through the store outbox; run
+# ** `python manage.py send_outbox_emails --loop` to deliver them
+ORDER_NOTIFICATION_RECIPIENTS = [EMAIL_HOST_USER] if EMAIL_HOST_USER else []
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_BACKOFF_SECONDS = 30
+
+# ** checkout holds on tracked stock lapse after this long without an order;
+# ** run `python manage.py release_expired_reservations --loop` to return them
+STOCK_RESERVATION_SECONDS = 15 * 60
+
+# ** responses replayed for repeated Idempotency-Key headers (store/idempotency.py);
+# ** `python manage.py expire_idempotency_keys` removes them once they lapse
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_WAIT = 10
+
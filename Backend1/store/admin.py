@@ -1,10 +1,142 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.widgets import ForeignKeyRawIdWidget
+from django.db.models import Q
+from django.forms.models import BaseInlineFormSet
+from django.urls import NoReverseMatch, reverse
+from django.utils.text import Truncator
 # Register your models here.
 
-from .models import Category, Product, UserProfile, Order, OrderItem
+from . import stock
+from .models import STOCK_FIELDS, Category, Product, UserProfile, Order, OrderItem
+from .pagination import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist defaults for tables that grow without bound."""
+    paginator = EstimatedCountPaginator
+    # ** the "N total" link is a second COUNT(*) over the unfiltered table
+    show_full_result_count = False
+    # ** date_hierarchy drill-down probed one indexed range at a time (templatetags/store_admin.py)
+    change_list_template = "admin/store/large_change_list.html"
+    # ** newest first off the (created_at, id) index, also under the status/category filters
+    ordering = ("-created_at", "-id")
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ("name", "slug")
+    search_fields = ("name", "slug")
+    prepopulated_fields = {"slug": ("name",)}
+
+
+@admin.register(Product)
+class ProductAdmin(LargeTableAdmin):
+    list_display = ("name", "category", "price", "stock_available", "stock_reserved", "created_at")
+    list_select_related = ("category",)
+    # ** each filter and the date drill-down ride an index on store_product
+    list_filter = ("category",)
+    date_hierarchy = "created_at"
+    search_fields = ("name",)
+    autocomplete_fields = ("category",)
+    readonly_fields = ("stock_reserved", "created_at", "updated_at")
+
+    def formfield_for_dbfield(self, db_field, request, **kwargs):
+        field = super().formfield_for_dbfield(db_field, request, **kwargs)
+        if db_field.name == "stock_available":
+            # ** posts back the count the page was rendered with, so an edit saves as a delta
+            field.show_hidden_initial = True
+        return field
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        obj.save(update_fields=[name for name in form.changed_data if name not in STOCK_FIELDS] + ["updated_at"])
+        if "stock_available" not in form.changed_data:
+            return
+        seen = form.data.get(form.add_initial_prefix("stock_available"))
+        before = form.initial.get("stock_available") if seen is None else form.fields["stock_available"].to_python(seen)
+        after = obj.stock_available
+        if before is None or after is None:
+            # ** starting or stopping tracking sets the count outright
+            Product.objects.filter(pk=obj.pk).update(stock_available=after)
+        elif not stock.adjust(obj.pk, after - before):
+            self.message_user(
+                request, f"Stock of {obj} was not changed: fewer than {before - after} units are left.",
+                messages.WARNING,
+            )
+
+
+class LoadedRawIdWidget(ForeignKeyRawIdWidget):
+    """Raw id widget that labels the object its form already loaded instead of fetching it again."""
+    loaded = None
+
+    def label_and_url_for_value(self, value):
+        obj = self.loaded
+        if obj is None or str(obj.pk) != str(value):
+            return super().label_and_url_for_value(value)
+        try:
+            url = reverse(f"{self.admin_site.name}:{obj._meta.app_label}_{obj._meta.model_name}_change", args=(obj.pk,))
+        except NoReverseMatch:
+            url = ""
+        return Truncator(obj).words(14), url
+
+
+class OrderItemFormSet(BaseInlineFormSet):
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        if form.instance.pk is not None and "product" in form.fields:
+            # ** select_related by OrderItemInline.get_queryset
+            form.fields["product"].widget.loaded = form.instance.product
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    formset = OrderItemFormSet
+    extra = 0
+    raw_id_fields = ("product",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("product")
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == "product":
+            kwargs["widget"] = LoadedRawIdWidget(db_field.remote_field, self.admin_site, using=kwargs.get("using"))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "full_name", "status", "total_amount", "payment_method", "created_at")
+    # ** Order.__str__ and the user column both read the user
+    list_select_related = ("user",)
+    list_filter = ("status",)
+    date_hierarchy = "created_at"
+    search_fields = ("=id", "=user__username")
+    raw_id_fields = ("user",)
+    readonly_fields = ("created_at", "updated_at")
+    inlines = (OrderItemInline,)
+
+    def get_search_results(self, request, queryset, search_term):
+        # ** one indexed lookup chosen by the term's shape, not an OR of LIKEs across a join
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(Q(pk=term) if term.isdigit() else Q(user__username=term)), False
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(LargeTableAdmin):
+    list_display = ("id", "order", "product", "quantity", "price")
+    list_select_related = ("order__user", "product")
+    search_fields = ("=order__id",)
+    raw_id_fields = ("order", "product")
+    ordering = ("-id",)
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(order_id=term) if term.isdigit() else queryset.none(), False
+
 
-admin.site.register(Category)
-admin.site.register(Product)
 admin.site.register(UserProfile)
-admin.site.register(Order)  
-admin.site.register(OrderItem)  
\ No newline at end of file
@@ -3,4 +3,6 @@ from django.apps import AppConfig
 
 class StoreConfig(AppConfig):
     name = 'store'
- 
\ No newline at end of file
+
+    def ready(self):
+        from . import signals  # noqa: F401
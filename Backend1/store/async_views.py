@@ -0,0 +1,119 @@
+"""Native async versions of the read-heavy endpoints.
+
+DRF's ``@api_view`` is sync-only, so under ASGI every request to
+``store/views.py`` is handed to a worker thread for its whole lifetime.
+These views are plain ``async def`` Django views that use the async ORM
+and only leave the event loop for the individual queries; they render with
+the same compiled serializer plans and renderer, so the bytes match the
+sync endpoints. Mounted under ``/api/async/``.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework import status
+from rest_framework.request import Request
+
+from .auth_cache import auser_for_token
+from .browse import (
+    BrowseError, afacets, apply_filters, check_search, ordering, parse_filters, search_scope, wants_facets,
+)
+from .catalog_cache import acached_catalog_response
+from .fastser import OrjsonRenderer, product_plan
+from .models import Category, Product
+from .orders import order_history, wants_summary
+from .pagination import OrderCursorPagination, ProductCursorPagination
+from .search import search_products
+from .serilizer import CategorySerializer
+from .wishlists import member_rows
+
+_renderer = OrjsonRenderer()
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    return HttpResponse(_renderer.render(data), content_type=_renderer.media_type, status=status)
+
+
+async def aget_auth_user(request):
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Token "):
+        return None
+    try:
+        token_key = auth_header.split(" ")[1]
+    except IndexError:
+        return None
+    return await auser_for_token(token_key)
+
+
+def _authentication_required():
+    return json_response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
+
+
+@acached_catalog_response
+@require_safe
+async def aget_products(request):
+    query = request.GET.get("search")
+    try:
+        filters = parse_filters(request.GET)
+        if query:
+            check_search(request.GET)
+    except BrowseError as exc:
+        return json_response({"error": str(exc)}, status=exc.status)
+    products = apply_filters(Product.objects.all(), filters)
+    if query:
+        scope, order_by = search_scope(filters)
+        # ** the ranking runs several small queries; one thread hop for all of them
+        ids = await sync_to_async(search_products)(
+            query, limit=getattr(settings, "SEARCH_RESULTS_LIMIT", 100), products=scope, order_by=order_by,
+        )
+        found = {row["id"]: row async for row in product_plan.values(products.filter(pk__in=ids))}
+        return json_response(product_plan.dump([found[i] for i in ids if i in found]))
+
+    if "cursor" in request.GET or "page_size" in request.GET or wants_facets(request.GET):
+        paginator = ProductCursorPagination()
+        paginator.ordering = ordering(filters)
+        drf_request = Request(request)
+        page = await sync_to_async(paginator.paginate_queryset)(product_plan.values(products), drf_request)
+        data = paginator.get_paginated_response(product_plan.dump(page)).data
+        if wants_facets(request.GET):
+            data["facets"] = await afacets(filters)
+        return json_response(data)
+    if "sort" in request.GET:
+        products = products.order_by(*ordering(filters))
+    return json_response(await product_plan.aserialize(products))
+
+
+@acached_catalog_response
+@require_safe
+async def aget_categories(request):
+    return json_response(CategorySerializer([category async for category in Category.objects.all()], many=True).data)
+
+
+@acached_catalog_response
+@require_safe
+async def aget_product_detail(request, pk):
+    rows = await product_plan.aserialize(Product.objects.filter(pk=pk))
+    if not rows:
+        return json_response({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
+    return json_response(rows[0])
+
+
+@require_safe
+async def aget_user_orders(request):
+    user = await aget_auth_user(request)
+    if not user:
+        return _authentication_required()
+    plan, orders = order_history(user, summary=wants_summary(request.GET))
+    if "cursor" in request.GET or "page_size" in request.GET:
+        paginator = OrderCursorPagination()
+        page = await sync_to_async(lambda: plan.dump(paginator.paginate_queryset(plan.values(orders), Request(request))))()
+        return json_response(paginator.get_paginated_response(page).data)
+    return json_response(await plan.aserialize(orders.order_by("-created_at")))
+
+
+@require_safe
+async def aget_wishlist(request):
+    user = await aget_auth_user(request)
+    if not user:
+        return json_response([])
+    return json_response([pk async for pk in member_rows(user).values_list("product_id", flat=True)])
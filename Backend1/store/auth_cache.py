@@ -0,0 +1,103 @@
+"""Per-process LRU+TTL cache mapping auth token keys to users.
+
+A miss costs one joined token/user query; Token and User signals evict
+stale entries in this process and the TTL bounds staleness in the others.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.authtoken.models import Token
+
+
+class TokenUserCache:
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                user, expires = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return user
+                self._discard(key)
+            self.misses += 1
+            return None
+
+    def set(self, key, user):
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (user, time.monotonic() + self.ttl)
+            self._keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate_key(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[0].pk
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+
+token_cache = TokenUserCache(
+    max_size=getattr(settings, "AUTH_TOKEN_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "AUTH_TOKEN_CACHE_TTL", 300),
+)
+
+
+def user_for_token(key):
+    user = token_cache.get(key)
+    if user is not None:
+        return user
+    try:
+        token = Token.objects.select_related("user").get(key=key)
+    except Token.DoesNotExist:
+        return None
+    token_cache.set(key, token.user)
+    return token.user
+
+
+async def auser_for_token(key):
+    user = token_cache.get(key)
+    if user is not None:
+        return user
+    try:
+        token = await Token.objects.select_related("user").aget(key=key)
+    except Token.DoesNotExist:
+        return None
+    token_cache.set(key, token.user)
+    return token.user
@@ -0,0 +1,162 @@
+"""Server-side catalog filters, sort orders and facet counts.
+
+Shared by the sync and async product list views. Filters are the category
+slug and a price range; facet counts are products per category (honouring
+the price range) and per price bucket (honouring the category), all read
+in one GROUP BY over categories with conditional counts. Facets are cached
+per filter signature under the catalog version, so paging through one
+filtered listing computes them once.
+"""
+import hashlib
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .catalog_cache import CACHE_TIMEOUT, acatalog_version, catalog_version, get_cache
+from .models import Product
+
+# ** sort parameter -> keyset order; the trailing id keeps it total
+SORTS = {
+    "-created_at": ("-created_at", "-id"),
+    "created_at": ("created_at", "id"),
+    "price": ("price", "id"),
+    "-price": ("-price", "-id"),
+}
+DEFAULT_SORT = "-created_at"
+PRICE_BUCKETS = getattr(settings, "PRODUCT_PRICE_BUCKETS", (10, 25, 50, 100, 250))
+
+
+class BrowseError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _price(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise BrowseError(f"{name} must be a number")
+    if not price.is_finite() or price < 0:
+        raise BrowseError(f"{name} must be a non-negative number")
+    return price
+
+
+def parse_filters(params):
+    """Validated ``{"category", "min_price", "max_price", "sort"}`` from query params."""
+    sort = params.get("sort") or DEFAULT_SORT
+    if sort not in SORTS:
+        raise BrowseError(f"sort must be one of {', '.join(SORTS)}")
+    filters = {
+        "category": params.get("category") or None,
+        "min_price": _price(params, "min_price"),
+        "max_price": _price(params, "max_price"),
+        "sort": sort,
+        # ** an explicit sort overrides relevance order in a search
+        "sorted": bool(params.get("sort")),
+    }
+    if filters["min_price"] is not None and filters["max_price"] is not None and filters["min_price"] > filters["max_price"]:
+        raise BrowseError("min_price must not be greater than max_price")
+    return filters
+
+
+def check_search(params):
+    """A search is one capped list: it can be filtered and sorted, not paged or faceted."""
+    used = [name for name in ("cursor", "page_size", "facets") if params.get(name)]
+    if used:
+        raise BrowseError(f"{', '.join(used)} cannot be combined with search")
+
+
+def search_scope(filters):
+    """The ``products`` a search is narrowed to (None when unfiltered), and its sort if one was asked for."""
+    narrowed = filters["category"] or filters["min_price"] is not None or filters["max_price"] is not None
+    products = apply_filters(Product.objects.all(), filters) if narrowed else None
+    return products, ordering(filters) if filters["sorted"] else None
+
+
+def wants_facets(params):
+    return params.get("facets", "").lower() in ("1", "true", "yes")
+
+
+def _price_q(filters):
+    q = Q()
+    if filters["min_price"] is not None:
+        q &= Q(price__gte=filters["min_price"])
+    if filters["max_price"] is not None:
+        q &= Q(price__lte=filters["max_price"])
+    return q
+
+
+def apply_filters(products, filters):
+    if filters["category"]:
+        products = products.filter(category__slug=filters["category"])
+    return products.filter(_price_q(filters))
+
+
+def ordering(filters):
+    return SORTS[filters["sort"]]
+
+
+def _bucket_q(low, high):
+    q = Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+def _buckets():
+    edges = [0, *PRICE_BUCKETS]
+    return list(zip(edges, [*PRICE_BUCKETS, None]))
+
+
+def facet_query(filters):
+    """One row per category: products within the price range, and per price bucket."""
+    buckets = _buckets()
+    aggregates = {"in_range": Count("id", filter=_price_q(filters))}
+    for i, (low, high) in enumerate(buckets):
+        aggregates[f"bucket_{i}"] = Count("id", filter=_bucket_q(low, high))
+    return Product.objects.order_by().values("category__slug", "category__name").annotate(**aggregates)
+
+
+def build_facets(rows, filters):
+    buckets = _buckets()
+    categories = []
+    counts = [0] * len(buckets)
+    for row in sorted(rows, key=lambda row: row["category__name"]):
+        categories.append({"slug": row["category__slug"], "name": row["category__name"], "count": row["in_range"]})
+        if not filters["category"] or row["category__slug"] == filters["category"]:
+            for i in range(len(buckets)):
+                counts[i] += row[f"bucket_{i}"]
+    return {
+        "categories": categories,
+        "prices": [{"min": low, "max": high, "count": count} for (low, high), count in zip(buckets, counts)],
+    }
+
+
+def facet_key(filters, version):
+    signature = f"{filters['category'] or ''}|{filters['min_price'] or ''}|{filters['max_price'] or ''}"
+    return f"store:facets:{version}:{hashlib.sha1(signature.encode()).hexdigest()}"
+
+
+def facets(filters):
+    cache = get_cache()
+    key = facet_key(filters, catalog_version())
+    result = cache.get(key)
+    if result is None:
+        result = build_facets(list(facet_query(filters)), filters)
+        cache.set(key, result, CACHE_TIMEOUT)
+    return result
+
+
+async def afacets(filters):
+    cache = get_cache()
+    key = facet_key(filters, await acatalog_version())
+    result = await cache.aget(key)
+    if result is None:
+        result = build_facets([row async for row in facet_query(filters)], filters)
+        await cache.aset(key, result, CACHE_TIMEOUT)
+    return result
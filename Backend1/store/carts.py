@@ -0,0 +1,268 @@
+"""Running cart aggregates and batched cart mutations.
+
+``Cart.item_count``/``Cart.total`` are kept current with F() deltas from the
+cart views, recomputed in SQL whenever that is cheaper or safer than a delta
+(price changes, checkout, batches), and checked by the ``check_cart_totals``
+command.
+
+Guests get their own cart, keyed by a random ``Cart.session_key`` held in a
+signed cookie. The row is only created on the first add, and
+``merge_guest_cart`` folds it into the user's cart at login.
+"""
+import secrets
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from django.db.models import (
+    DecimalField, F, IntegerField, OuterRef, Prefetch, Q, Subquery, Sum, Value,
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Cart, CartItem, Product
+
+TOTAL_FIELD = DecimalField(max_digits=12, decimal_places=3)
+
+
+def apply_line_delta(cart_id, quantity, amount):
+    """Shift a cart's aggregates by a change in one or more of its lines."""
+    Cart.objects.filter(pk=cart_id).update(
+        item_count=Greatest(F("item_count") + quantity, Value(0)),
+        total=F("total") + Value(Decimal(amount), output_field=TOTAL_FIELD),
+    )
+
+
+def _line_aggregates():
+    lines = CartItem.objects.filter(cart=OuterRef("pk")).order_by().values("cart")
+    count = lines.annotate(n=Sum("quantity")).values("n")
+    total = lines.annotate(
+        amount=Sum(F("quantity") * F("product__price"), output_field=TOTAL_FIELD)
+    ).values("amount")
+    return (
+        Coalesce(Subquery(count, output_field=IntegerField()), Value(0)),
+        Coalesce(Subquery(total, output_field=TOTAL_FIELD), Value(Decimal(0)), output_field=TOTAL_FIELD),
+    )
+
+
+def recompute_totals(carts):
+    """Rewrite the aggregates of ``carts`` from their lines in one UPDATE."""
+    item_count, total = _line_aggregates()
+    return carts.update(item_count=item_count, total=total)
+
+
+def drifted_carts():
+    """Carts whose stored aggregates disagree with their lines."""
+    item_count, total = _line_aggregates()
+    return Cart.objects.annotate(
+        actual_count=item_count, actual_total=total,
+    ).filter(~Q(item_count=F("actual_count")) | ~Q(total=F("actual_total")))
+
+
+def carts_containing(product):
+    return Cart.objects.filter(pk__in=CartItem.objects.filter(product=product).values("cart_id"))
+
+
+def load_cart(cart_id):
+    """Fresh cart row plus its lines with products joined: two queries."""
+    return Cart.objects.prefetch_related(
+        Prefetch("items", queryset=CartItem.objects.select_related("product").order_by("id"))
+    ).get(pk=cart_id)
+
+
+BATCH_OPERATIONS = ("add", "set", "remove")
+MAX_BATCH_OPERATIONS = getattr(settings, "CART_BATCH_MAX_OPERATIONS", 100)
+
+
+class CartBatchError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _positive_int(value, minimum, name="quantity"):
+    try:
+        number = int(value)
+    except (TypeError, ValueError, OverflowError):
+        number = None
+    # ** int() would also take True and truncate 1.9
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        number = None
+    if number is None or number < minimum:
+        raise CartBatchError(f"{name} must be an integer >= {minimum}")
+    return number
+
+
+def parse_operations(operations):
+    """Validate a batch into (op, product_id, item_id, quantity) tuples."""
+    if not isinstance(operations, list) or not operations:
+        raise CartBatchError("operations must be a non-empty list")
+    if len(operations) > MAX_BATCH_OPERATIONS:
+        raise CartBatchError(f"at most {MAX_BATCH_OPERATIONS} operations per batch")
+
+    parsed = []
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get("op") not in BATCH_OPERATIONS:
+            raise CartBatchError(f"op must be one of {', '.join(BATCH_OPERATIONS)}")
+        op = operation["op"]
+        product_id = operation.get("product_id")
+        item_id = operation.get("item_id") if op == "remove" else None
+        if product_id is None and item_id is None:
+            raise CartBatchError(f"{op} needs a product_id")
+        if product_id is not None:
+            product_id = _positive_int(product_id, 1, "product_id")
+        if item_id is not None:
+            item_id = _positive_int(item_id, 1, "item_id")
+        quantity = None
+        if op == "add":
+            quantity = _positive_int(operation.get("quantity", 1), 1)
+        elif op == "set":
+            quantity = _positive_int(operation.get("quantity"), 0)
+        parsed.append((op, product_id, item_id, quantity))
+    return parsed
+
+
+def apply_batch(cart, operations):
+    """Apply parsed operations to ``cart`` with set-based statements.
+
+    Returns (changed product ids, removed item ids). The number of queries
+    does not depend on the number of operations.
+    """
+    # ** no savepoint: a failed batch rolls back the caller's transaction with it
+    with transaction.atomic(savepoint=False):
+        # ** serialize batches on the same cart; other carts are unaffected
+        Cart.objects.select_for_update().filter(pk=cart.pk).exists()
+
+        product_ids = {product_id for _, product_id, _, _ in operations if product_id is not None}
+        item_ids = {item_id for _, _, item_id, _ in operations if item_id is not None}
+        lines = {
+            line.product_id: line
+            for line in CartItem.objects.filter(cart=cart).filter(
+                Q(product_id__in=product_ids) | Q(pk__in=item_ids)
+            )
+        }
+        product_by_item = {line.pk: product_id for product_id, line in lines.items()}
+        missing_items = item_ids - set(product_by_item)
+        if missing_items:
+            raise CartBatchError(f"Item not found: {sorted(missing_items)}", status=404)
+
+        known = set(Product.objects.filter(pk__in=product_ids).values_list("pk", flat=True))
+        missing_products = product_ids - known
+        if missing_products:
+            raise CartBatchError(f"Product not found: {sorted(missing_products)}", status=404)
+
+        quantities = {product_id: line.quantity for product_id, line in lines.items()}
+        for op, product_id, item_id, quantity in operations:
+            if product_id is None:
+                product_id = product_by_item[item_id]
+            if op == "add":
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+            elif op == "set":
+                quantities[product_id] = quantity
+            else:
+                quantities[product_id] = 0
+
+        created, updated, removed = [], [], []
+        for product_id, quantity in quantities.items():
+            line = lines.get(product_id)
+            if line is None:
+                if quantity > 0:
+                    created.append(CartItem(cart=cart, product_id=product_id, quantity=quantity))
+            elif quantity == 0:
+                removed.append(line.pk)
+            elif quantity != line.quantity:
+                line.quantity = quantity
+                updated.append(line)
+
+        if created:
+            CartItem.objects.bulk_create(created)
+        if updated:
+            CartItem.objects.bulk_update(updated, ["quantity"])
+        if removed:
+            CartItem.objects.filter(pk__in=removed).delete()
+        if created or updated or removed:
+            recompute_totals(Cart.objects.filter(pk=cart.pk))
+
+    changed = [line.product_id for line in created] + [line.product_id for line in updated]
+    return changed, removed
+
+
+GUEST_CART_COOKIE = getattr(settings, "GUEST_CART_COOKIE", "store_cart")
+GUEST_CART_MAX_AGE = getattr(settings, "GUEST_CART_MAX_AGE", 60 * 60 * 24 * 30)
+GUEST_CART_SALT = "store.carts.guest"
+
+
+def guest_key(request):
+    """The guest cart key from the request's signed cookie, or None."""
+    return request.get_signed_cookie(
+        GUEST_CART_COOKIE, default=None, salt=GUEST_CART_SALT, max_age=GUEST_CART_MAX_AGE,
+    )
+
+
+def remember_guest(response, key):
+    response.set_signed_cookie(
+        GUEST_CART_COOKIE, key, salt=GUEST_CART_SALT, max_age=GUEST_CART_MAX_AGE, httponly=True,
+        samesite=getattr(settings, "GUEST_CART_COOKIE_SAMESITE", "Lax"),
+        secure=getattr(settings, "GUEST_CART_COOKIE_SECURE", False),
+    )
+    return response
+
+
+def forget_guest(response):
+    response.delete_cookie(GUEST_CART_COOKIE, samesite=getattr(settings, "GUEST_CART_COOKIE_SAMESITE", "Lax"))
+    return response
+
+
+def cart_for(user, key, create=False):
+    """The caller's cart, plus the key of a guest cart created by this call.
+
+    Users always have a cart. A guest without one gets None unless ``create``
+    is set, in which case a new row and key are made.
+    """
+    if user is not None:
+        cart, _ = Cart.objects.get_or_create(user=user)
+        return cart, None
+    if key:
+        cart = Cart.objects.filter(session_key=key, user=None).first()
+        if cart is not None:
+            return cart, None
+    if not create:
+        return None, None
+    key = secrets.token_urlsafe(32)
+    return Cart.objects.create(session_key=key), key
+
+
+def empty_cart():
+    """The body of a guest cart that has not been created yet."""
+    return {"id": None, "items": [], "total": Decimal("0.000"), "item_count": 0, "created_at": None, "user": None}
+
+
+def merge_guest_cart(key, user):
+    """Move a guest cart's lines into ``user``'s cart; returns the user's cart id or None.
+
+    Lines for products the user already has are added together in one bulk
+    UPDATE, the rest are re-pointed with another, so the statement count
+    does not depend on the size of either cart.
+    """
+    with transaction.atomic():
+        guest = Cart.objects.select_for_update().filter(session_key=key, user=None).first()
+        if guest is None:
+            return None
+        cart = Cart.objects.select_for_update().filter(user=user).order_by("pk").first()
+        if cart is None:
+            # ** nothing to merge into: the guest cart becomes the user's cart
+            Cart.objects.filter(pk=guest.pk).update(user=user, session_key=None)
+            return guest.pk
+
+        guest_quantities = dict(CartItem.objects.filter(cart=guest).values_list("product_id", "quantity"))
+        shared = list(CartItem.objects.filter(cart=cart, product_id__in=guest_quantities))
+        for line in shared:
+            line.quantity += guest_quantities[line.product_id]
+        if shared:
+            CartItem.objects.bulk_update(shared, ["quantity"])
+        CartItem.objects.filter(cart=guest).exclude(
+            product_id__in=[line.product_id for line in shared]
+        ).update(cart=cart)
+        Cart.objects.filter(pk=guest.pk).delete()
+        recompute_totals(Cart.objects.filter(pk=cart.pk))
+    return cart.pk
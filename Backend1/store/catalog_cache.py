@@ -0,0 +1,199 @@
+"""Versioned response cache for the read-only catalog endpoints.
+
+Every cached body is stored under the current catalog version, which
+Product/Category signals bump on change, so invalidation is a single
+counter increment instead of a key scan. Responses carry a strong ETag and
+conditional requests are answered with 304 without touching the view.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+
+from .routers import pin_catalog
+
+VERSION_KEY = "store:catalog:version"
+CACHE_TIMEOUT = getattr(settings, "CATALOG_CACHE_TIMEOUT", 60 * 60)
+LOCK_TIMEOUT = getattr(settings, "CATALOG_CACHE_LOCK_TIMEOUT", 10)
+LOCK_WAIT = getattr(settings, "CATALOG_CACHE_LOCK_WAIT", 5)
+LOCK_POLL_INTERVAL = 0.02
+
+# ** striped in-process locks: threads of one worker queue here instead of
+# ** polling the shared cache
+_local_locks = [threading.Lock() for _ in range(64)]
+
+
+def get_cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+async def acatalog_version():
+    cache = get_cache()
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, int(time.time() * 1000), None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def catalog_version():
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # ** seed from the clock so an evicted counter never reuses old keys
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+
+
+def invalidate_catalog():
+    """Bump now for readers in this transaction and again after commit, so a
+    concurrent rebuild that saw pre-commit rows cannot stay cached."""
+    bump_catalog_version()
+    transaction.on_commit(_committed)
+
+
+def _committed():
+    # ** keep refills off lagging replicas until they have the change
+    pin_catalog()
+    bump_catalog_version()
+
+
+def response_key(request, version):
+    digest = hashlib.sha1(
+        f"{request.build_absolute_uri()}|{request.META.get('HTTP_ACCEPT', '')}".encode()
+    ).hexdigest()
+    return f"store:catalog:{version}:{digest}"
+
+
+def _etag_matches(request, etag):
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _render(view, request, args, kwargs):
+    """Run the view; return a cache entry for 200s, else the response itself."""
+    return _entry(view(request, *args, **kwargs))
+
+
+def _entry(response):
+    # ** cookies sit in response.cookies until the handler writes them out; one would be replayed to everybody
+    if response.status_code != 200 or response.cookies or response.has_header("Set-Cookie"):
+        return response
+    if hasattr(response, "render"):
+        response.render()
+    body = response.content
+    etag = '"%s"' % hashlib.sha256(body).hexdigest()
+    return {"etag": etag, "content_type": response["Content-Type"], "body": body}
+
+
+def _single_flight(cache, key, build):
+    """Build ``key`` at most once across threads and processes."""
+    with _local_locks[hash(key) % len(_local_locks)]:
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        lock_key = f"{key}:lock"
+        if cache.add(lock_key, 1, LOCK_TIMEOUT):
+            try:
+                entry = build()
+                if isinstance(entry, dict):
+                    cache.set(key, entry, CACHE_TIMEOUT)
+                return entry
+            finally:
+                cache.delete(lock_key)
+
+        # ** another process is rebuilding: wait for its result, then give up
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
+        return build()
+
+
+def cached_catalog_response(view):
+    """Serve a GET view from the versioned cache with ETag/304 support."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return view(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = response_key(request, catalog_version())
+        entry = cache.get(key)
+        if entry is None:
+            entry = _single_flight(cache, key, lambda: _render(view, request, args, kwargs))
+            if not isinstance(entry, dict):
+                return entry
+
+        return _respond(request, entry)
+    return wrapper
+
+
+async def _asingle_flight(cache, key, build):
+    """``_single_flight`` for coroutines; waits without blocking the loop."""
+    lock_key = f"{key}:lock"
+    if await cache.aadd(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            entry = _entry(await build())
+            if isinstance(entry, dict):
+                await cache.aset(key, entry, CACHE_TIMEOUT)
+            return entry
+        finally:
+            await cache.adelete(lock_key)
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        entry = await cache.aget(key)
+        if entry is not None:
+            return entry
+    return _entry(await build())
+
+
+def acached_catalog_response(view):
+    """``cached_catalog_response`` for async views."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return await view(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = response_key(request, await acatalog_version())
+        entry = await cache.aget(key)
+        if entry is None:
+            entry = await _asingle_flight(cache, key, lambda: view(request, *args, **kwargs))
+            if not isinstance(entry, dict):
+                return entry
+        return _respond(request, entry)
+    return wrapper
+
+
+def _respond(request, entry):
+    if _etag_matches(request, entry["etag"]):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry["body"], content_type=entry["content_type"])
+    response["ETag"] = entry["etag"]
+    response["Cache-Control"] = "no-cache"
+    response["Vary"] = "Accept"
+    return response
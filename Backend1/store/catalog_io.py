@@ -0,0 +1,392 @@
+"""Streaming catalog import and export as CSV or JSON lines.
+
+Both directions hold a chunk of rows at a time, so memory stays flat
+whatever the size of the file or the catalog. An import upserts the
+categories a chunk names (by slug) and then its products with
+``bulk_create(update_conflicts=True)``: a row with an ``id`` updates that
+product (or creates it with that id), a row without one adds a product.
+Only the columns present in the file are written, so a price-only file
+leaves descriptions and images alone. Image sources - URLs, local files or
+names already in storage - are fetched on a thread pool, the next chunk's
+while the current one is being written.
+
+``bulk_create`` sends no model signals, so the importer does their work
+itself: carts holding a repriced product are recomputed in the same
+transaction, the catalog cache is invalidated per chunk and the search
+index is refreshed for the touched products at the end. Image variants are
+left to ``generate_image_variants``.
+"""
+import csv
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from itertools import chain, islice
+from urllib.parse import urlparse
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_slug
+from django.db import IntegrityError, connection, reset_queries, transaction
+from django.utils import timezone
+
+from . import search
+from .carts import recompute_totals
+from .catalog_cache import invalidate_catalog
+from .models import Cart, CartItem, Category, Product
+
+FIELDS = ("id", "name", "description", "price", "category", "category_name", "image", "stock_available")
+REQUIRED = ("name", "price", "category")
+# ** file column -> Product field an upsert overwrites; stock_reserved and
+# ** image_variants belong to the running store and are never imported
+UPDATABLE = {
+    "name": "name",
+    "description": "description",
+    "price": "price",
+    "category": "category",
+    "image": "image",
+    "stock_available": "stock_available",
+}
+EXPORT_VALUES = (
+    "id", "name", "description", "price", "category__slug", "category__name", "image", "stock_available",
+)
+FORMATS = ("csv", "jsonl")
+CHUNK_SIZE = getattr(settings, "CATALOG_IMPORT_CHUNK_SIZE", 1000)
+IMAGE_TIMEOUT = getattr(settings, "CATALOG_IMAGE_TIMEOUT", 30)
+IMAGE_DIR = "products"
+
+_NAME_LENGTH = Product._meta.get_field("name").max_length
+_CATEGORY_LENGTH = Category._meta.get_field("name").max_length
+_PRICE_LIMIT = Decimal(10) ** (
+    Product._meta.get_field("price").max_digits - Product._meta.get_field("price").decimal_places
+)
+_PRICE_STEP = Decimal(1).scaleb(-Product._meta.get_field("price").decimal_places)
+
+
+class CatalogError(Exception):
+    """The file as a whole cannot be imported."""
+
+
+class RowError(Exception):
+    """One row is invalid; the import skips it and carries on."""
+
+
+def guess_format(path):
+    return "jsonl" if path.lower().endswith((".jsonl", ".ndjson")) else "csv"
+
+
+# ** reading
+
+
+def _jsonl(stream):
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError:
+            yield line_number, None
+
+
+def read_rows(stream, fmt):
+    """``(columns, iterator of (line number, row))`` for a CSV or JSON lines stream."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        columns = reader.fieldnames or []
+        return columns, ((reader.line_num, row) for row in reader)
+    rows = _jsonl(stream)
+    first = next(rows, None)
+    if first is None:
+        return [], iter(())
+    columns = list(first[1]) if isinstance(first[1], dict) else []
+    return columns, chain([first], rows)
+
+
+def _text(raw, name):
+    value = raw.get(name)
+    return "" if value is None else str(value).strip()
+
+
+def _integer(raw, name):
+    value = _text(raw, name)
+    if not value:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise RowError(f"{name} must be a whole number")
+    if number < (1 if name == "id" else 0):
+        raise RowError(f"{name} must be {'positive' if name == 'id' else 'zero or more'}")
+    return number
+
+
+def _price(raw):
+    try:
+        price = Decimal(_text(raw, "price"))
+    except InvalidOperation:
+        raise RowError("price must be a number")
+    if not price.is_finite() or price < 0 or price >= _PRICE_LIMIT:
+        raise RowError(f"price must be between 0 and {_PRICE_LIMIT}")
+    return price.quantize(_PRICE_STEP)
+
+
+def parse_row(raw):
+    """Validated values of one file row; raises ``RowError``."""
+    if not isinstance(raw, dict):
+        raise RowError("not a JSON object")
+    missing = [name for name in REQUIRED if not _text(raw, name)]
+    if missing:
+        raise RowError(f"missing {', '.join(missing)}")
+    row = {
+        "id": _integer(raw, "id"),
+        "name": _text(raw, "name"),
+        "description": _text(raw, "description"),
+        "price": _price(raw),
+        "category": _text(raw, "category"),
+        "category_name": _text(raw, "category_name"),
+        "image": _text(raw, "image"),
+        "stock_available": _integer(raw, "stock_available"),
+    }
+    if len(row["name"]) > _NAME_LENGTH:
+        raise RowError(f"name is longer than {_NAME_LENGTH} characters")
+    if len(row["category_name"]) > _CATEGORY_LENGTH:
+        raise RowError(f"category_name is longer than {_CATEGORY_LENGTH} characters")
+    try:
+        validate_slug(row["category"])
+    except ValidationError:
+        raise RowError("category must be a slug")
+    return row
+
+
+# ** images
+
+
+def fetch_image(source, storage=default_storage):
+    """Storage name for an image source: a URL, a name already in storage or a local path."""
+    if source.startswith(("http://", "https://")):
+        name = os.path.basename(urlparse(source).path) or "image"
+        with urlopen(source, timeout=IMAGE_TIMEOUT) as response:
+            return storage.save(f"{IMAGE_DIR}/{name}", File(response))
+    # ** relative names are looked up in storage first, as export_catalog writes them
+    if not os.path.isabs(source) and storage.exists(source):
+        return source
+    if os.path.isfile(source):
+        with open(source, "rb") as image:
+            return storage.save(f"{IMAGE_DIR}/{os.path.basename(source)}", File(image))
+    raise RowError(f"{source!r} not found")
+
+
+# ** importing
+
+
+def _unique(field):
+    # ** MySQL upserts on any unique key and rejects an explicit target
+    return {"unique_fields": [field]} if connection.features.supports_update_conflicts_with_target else {}
+
+
+class CatalogImporter:
+    """Upsert chunks of parsed rows; counts what happened on the way."""
+
+    def __init__(self, columns, workers=8, storage=default_storage, on_error=None):
+        unknown = [name for name in columns if name not in FIELDS]
+        if unknown:
+            raise CatalogError(f"Unknown columns: {', '.join(unknown)}; expected {', '.join(FIELDS)}")
+        missing = [name for name in REQUIRED if name not in columns]
+        if missing:
+            raise CatalogError(f"Missing columns: {', '.join(missing)}")
+        self.columns = set(columns)
+        self.update_fields = [field for column, field in UPDATABLE.items() if column in self.columns] + ["updated_at"]
+        self.workers = workers
+        self.storage = storage
+        self.on_error = on_error or (lambda line, message: None)
+        self.categories = {}
+        self.renamed = set()
+        self.created = self.updated = self.failed = self.images = 0
+        self.started = timezone.now()
+
+    def run(self, rows, chunk_size=CHUNK_SIZE):
+        """Import ``(line number, raw row)`` pairs; at most two chunks are held at once."""
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = None
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                prepared = self._prepare(chunk, pool)
+                if pending is not None:
+                    self._write(pending)
+                pending = prepared
+            if pending is not None:
+                self._write(pending)
+        self._finish()
+        return self
+
+    def _fail(self, line, message):
+        self.failed += 1
+        self.on_error(line, message)
+
+    def _prepare(self, chunk, pool):
+        prepared = []
+        for line, raw in chunk:
+            try:
+                row = parse_row(raw)
+            except RowError as exc:
+                self._fail(line, str(exc))
+                continue
+            future = None
+            if "image" in self.columns and row["image"]:
+                future = pool.submit(fetch_image, row["image"], self.storage)
+            prepared.append((line, row, future))
+        return prepared
+
+    def _resolve_images(self, prepared):
+        rows = []
+        for line, row, future in prepared:
+            if future is not None:
+                try:
+                    row["image"] = future.result()
+                except Exception as exc:
+                    self._fail(line, f"image: {exc}")
+                    continue
+                self.images += 1
+            rows.append((line, row))
+        return rows
+
+    def _write(self, prepared):
+        rows = self._resolve_images(prepared)
+        if not rows:
+            return
+        with transaction.atomic():
+            rows = self._upsert_categories(rows)
+            if rows:
+                self._upsert_products([row for _, row in rows])
+            invalidate_catalog()
+        # ** with DEBUG on, the query log would keep thousands of bulk INSERTs alive
+        reset_queries()
+
+    def _name_clashes(self, wanted):
+        """``{slug: message}`` for slugs whose name another category already has."""
+        owners = dict(
+            Category.objects.filter(name__in=wanted.values()).exclude(slug__in=wanted).values_list("name", "slug")
+        )
+        clashes = {}
+        for slug, name in wanted.items():
+            owner = owners.get(name)
+            if owner is None:
+                owners[name] = slug
+            else:
+                clashes[slug] = f"category_name {name!r} is already used by category {owner!r}"
+        return clashes
+
+    def _upsert_categories(self, rows):
+        """Create or rename the categories of ``rows``; returns the rows that have a category."""
+        names = {}
+        for _, row in rows:
+            if row["category"] not in self.categories:
+                names[row["category"]] = row["category_name"] or names.get(row["category"], "")
+        if names:
+            previous = dict(Category.objects.filter(slug__in=names).values_list("slug", "name"))
+            wanted = {slug: name or previous.get(slug) or slug for slug, name in names.items()}
+            # ** Category.name is unique too: a new slug under a taken name fails its rows, not the import
+            clashes = self._name_clashes(wanted)
+            categories = [Category(slug=slug, name=name) for slug, name in wanted.items() if slug not in clashes]
+            try:
+                with transaction.atomic():
+                    if "category_name" in self.columns:
+                        Category.objects.bulk_create(
+                            categories, update_conflicts=True, update_fields=["name"], **_unique("slug"),
+                        )
+                    else:
+                        Category.objects.bulk_create(categories, ignore_conflicts=True)
+            except IntegrityError as exc:
+                # ** a clash the check could not see (names swapped within the chunk, a concurrent edit)
+                clashes.update((category.slug, f"category: {exc}") for category in categories)
+            for slug, pk in Category.objects.filter(slug__in=names).exclude(slug__in=clashes).values_list("slug", "pk"):
+                self.categories[slug] = pk
+                if slug in previous and names[slug] and previous[slug] != names[slug]:
+                    self.renamed.add(pk)
+        kept = []
+        for line, row in rows:
+            if row["category"] in self.categories:
+                kept.append((line, row))
+            else:
+                self._fail(line, clashes.get(row["category"], f"category {row['category']!r} could not be created"))
+        return kept
+
+    def _product(self, row):
+        return Product(
+            id=row["id"],
+            category_id=self.categories[row["category"]],
+            name=row["name"],
+            description=row["description"],
+            price=row["price"],
+            image=row["image"],
+            stock_available=row["stock_available"],
+        )
+
+    def _upsert_products(self, rows):
+        # ** the last row wins when a chunk names the same id twice
+        by_id = {row["id"]: row for row in rows if row["id"] is not None}
+        new = [self._product(row) for row in rows if row["id"] is None]
+        previous = dict(Product.objects.filter(pk__in=by_id).values_list("pk", "price")) if by_id else {}
+        if by_id:
+            Product.objects.bulk_create(
+                [self._product(row) for row in by_id.values()],
+                update_conflicts=True, update_fields=self.update_fields, **_unique("id"),
+            )
+        if new:
+            Product.objects.bulk_create(new)
+        self.updated += len(previous)
+        self.created += len(by_id) - len(previous) + len(new)
+
+        repriced = [pk for pk, price in previous.items() if price != by_id[pk]["price"]]
+        if repriced:
+            recompute_totals(Cart.objects.filter(
+                pk__in=CartItem.objects.filter(product_id__in=repriced).values("cart_id")
+            ))
+
+    def _finish(self):
+        search.reindex_products(Product.objects.filter(updated_at__gte=self.started))
+        for category in Category.objects.filter(pk__in=self.renamed):
+            search.reindex_category(category)
+        invalidate_catalog()
+
+
+def import_catalog(stream, fmt, chunk_size=CHUNK_SIZE, workers=8, storage=default_storage, on_error=None):
+    columns, rows = read_rows(stream, fmt)
+    if not columns:
+        raise CatalogError("The file has no header row" if fmt == "csv" else "The first line is not a JSON object")
+    importer = CatalogImporter(columns, workers=workers, storage=storage, on_error=on_error)
+    return importer.run(rows, chunk_size)
+
+
+# ** exporting
+
+
+def export_rows(products=None, chunk_size=CHUNK_SIZE):
+    """One dict per product, streamed off the database ``chunk_size`` rows at a time."""
+    products = (Product.objects.all() if products is None else products).order_by("id")
+    for values in products.values_list(*EXPORT_VALUES).iterator(chunk_size=chunk_size):
+        row = dict(zip(FIELDS, values))
+        row["price"] = str(row["price"])
+        row["image"] = row["image"] or ""
+        yield row
+
+
+def write_rows(stream, rows, fmt):
+    """Write ``rows`` to ``stream``; returns how many were written."""
+    written = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+        return written
+    for row in rows:
+        stream.write(json.dumps(row, ensure_ascii=False) + "\n")
+        written += 1
+    return written
@@ -0,0 +1,267 @@
+"""Precompiled ``.values()`` serialization for the hot read endpoints.
+
+``compile_plan`` walks a DRF serializer's fields once and turns them into a
+list of (output key, column getter) pairs over a ``.values()`` row, so
+rendering a page is a dict comprehension per row instead of model
+instantiation plus per-field ``get_attribute``/``to_representation``. Field
+order, nested serializers, ``many=True`` children and value formatting all
+come from the serializer itself, which keeps the output byte-identical to
+the DRF path; ``OrjsonRenderer`` then encodes it the way ``JSONRenderer``
+would.
+"""
+import decimal
+from contextvars import ContextVar
+from operator import itemgetter
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.settings import ISO_8601, api_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .images import variant_urls
+from .serilizer import (
+    CartItemSerializer, CartSerializer, OrderSerializer, OrderSummarySerializer, ProductSerializer,
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+# ** SerializerMethodFields cannot be introspected: serializer -> key -> (column path, function)
+METHOD_FIELDS = {
+    ProductSerializer: {"image_variants": ("image_variants", variant_urls)},
+    CartItemSerializer: {"product_image_variants": ("product.image_variants", variant_urls)},
+}
+
+# ** fields whose DRF representation of a .values() value is the value itself
+IDENTITY_FIELDS = (
+    serializers.IntegerField, serializers.CharField, serializers.ReadOnlyField,
+    serializers.PrimaryKeyRelatedField, serializers.ChoiceField, serializers.JSONField,
+    serializers.BooleanField, serializers.FloatField,
+)
+
+
+def _model_field(model, attrs):
+    """The model field behind a source path, or None for an annotation."""
+    field = None
+    for attr in attrs:
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        model = field.related_model
+    return field
+
+
+def _nullable(column, convert):
+    if convert is None:
+        return itemgetter(column)
+
+    def get(row):
+        value = row[column]
+        return None if value is None else convert(value)
+    return get
+
+
+def _converter(field, model_field):
+    if isinstance(field, serializers.FileField):
+        # ** relative URLs: the API views serialize without a request in context
+        storage = model_field.storage
+        if not getattr(field, "use_url", True):
+            return None
+        return lambda name: storage.url(name) if name else None
+    if isinstance(field, serializers.CharField) and isinstance(model_field, models.FileField):
+        return None
+    if isinstance(field, IDENTITY_FIELDS):
+        return None
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_converter(field)
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_converter(field)
+    return field.to_representation
+
+
+# ** the active timezone, looked up once per dump instead of once per value
+_output_timezone = ContextVar("store_fastser_timezone")
+
+
+def _decimal_converter(field):
+    """``DecimalField.to_representation`` with the quantize context built once."""
+    coerce = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce or field.localize or field.normalize_output or field.decimal_places is None:
+        return field.to_representation
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    quantum = decimal.Decimal(".1") ** field.decimal_places
+    rounding = field.rounding
+    slow = field.to_representation
+
+    def convert(value):
+        if type(value) is not decimal.Decimal:
+            return slow(value)
+        return format(value.quantize(quantum, rounding=rounding, context=context), "f")
+    return convert
+
+
+def _datetime_converter(field):
+    """``DateTimeField.to_representation`` for ISO 8601 output of aware values."""
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601 or hasattr(field, "timezone"):
+        return field.to_representation
+    slow = field.to_representation
+
+    def convert(value):
+        if isinstance(value, str) or value.tzinfo is None:
+            return slow(value)
+        value = value.astimezone(_output_timezone.get()).isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
+    return convert
+
+
+class Plan:
+    def __init__(self, model, columns, getters, children):
+        self.model = model
+        self.columns = columns
+        self.getters = getters
+        self.children = children  # ** [(key, child plan, fk column on the child)]
+        self.pk = model._meta.pk.attname
+
+    def values(self, queryset, *extra):
+        return queryset.values(*self.columns, *extra)
+
+    def build(self, row):
+        return {key: get(row) for key, get in self.getters}
+
+    def _build_all(self, rows):
+        token = _output_timezone.set(timezone.get_current_timezone())
+        try:
+            return [self.build(row) for row in rows]
+        finally:
+            _output_timezone.reset(token)
+
+    def _children_of(self, rows, child, fk):
+        ids = [row[self.pk] for row in rows]
+        # ** (fk, pk) is the fk index's own order, so no sort step
+        return child.values(child.model.objects.filter(**{f"{fk}__in": ids}).order_by(fk, "pk"))
+
+    def _attach(self, rows, key, child, fk, child_rows):
+        groups = {row[self.pk]: [] for row in rows}
+        for child_row in child_rows:
+            groups[child_row[fk]].append(child_row)
+        for row in rows:
+            row[f"__{key}"] = child.dump(groups[row[self.pk]])
+
+    def dump(self, rows):
+        """Serialize rows produced by ``values()``, fetching children in one query each."""
+        for key, child, fk in self.children:
+            self._attach(rows, key, child, fk, list(self._children_of(rows, child, fk)) if rows else [])
+        return self._build_all(rows)
+
+    def serialize(self, queryset):
+        return self.dump(list(self.values(queryset)))
+
+    def first(self, queryset):
+        """The serialized first row of ``queryset``, or None."""
+        rows = self.serialize(queryset[:1])
+        return rows[0] if rows else None
+
+    async def aserialize(self, queryset):
+        rows = [row async for row in self.values(queryset)]
+        for key, child, fk in self.children:
+            child_rows = [child_row async for child_row in self._children_of(rows, child, fk)] if rows else []
+            self._attach(rows, key, child, fk, child_rows)
+        return self._build_all(rows)
+
+
+def _nested(column, getters):
+    def get(row):
+        return None if row[column] is None else {key: getter(row) for key, getter in getters}
+    return get
+
+
+def _compile(serializer, model, prefix, columns, getters, children):
+    methods = METHOD_FIELDS.get(type(serializer), {})
+    for key, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if isinstance(field, serializers.SerializerMethodField):
+            if key not in methods:
+                raise ValueError(f"No fast path for {type(serializer).__name__}.{key}")
+            path, function = methods[key]
+            column = prefix + path.replace(".", "__")
+            columns.append(column)
+            getters.append((key, _nullable(column, function)))
+            continue
+
+        attrs = field.source_attrs
+        column = prefix + "__".join(attrs)
+        if isinstance(field, serializers.ListSerializer):
+            if prefix:
+                raise ValueError(f"Nested many=True field {key} is only supported at the top level")
+            relation = model._meta.get_field(attrs[0])
+            fk = relation.field.attname
+            child = compile_plan(type(field.child), relation.related_model)
+            child.columns = list(dict.fromkeys(child.columns + [fk]))
+            children.append((key, child, fk))
+            getters.append((key, itemgetter(f"__{key}")))
+            continue
+        if isinstance(field, serializers.Serializer):
+            nested_getters = []
+            _compile(field, _model_field(model, attrs).related_model, column + "__", columns, nested_getters, [])
+            columns.append(column)
+            getters.append((key, _nested(column, nested_getters)))
+            continue
+
+        model_field = _model_field(model, attrs)
+        columns.append(column)
+        if isinstance(field, serializers.CharField) and isinstance(model_field, models.FileField):
+            # ** str() of an empty FieldFile
+            getters.append((key, lambda row, column=column: row[column] or ""))
+        else:
+            getters.append((key, _nullable(column, _converter(field, model_field))))
+
+
+def compile_plan(serializer_class, model=None, prefix=""):
+    """Compile ``serializer_class`` into a ``Plan`` over ``.values()`` rows.
+
+    With ``prefix`` (e.g. ``"product__"``) the rows come from a model that
+    points at the serializer's model, such as an M2M through table.
+    """
+    model = model or serializer_class.Meta.model
+    columns, getters, children = [], [], []
+    _compile(serializer_class(), model, prefix, columns, getters, children)
+    return Plan(model, list(dict.fromkeys(columns + [prefix + model._meta.pk.attname])), getters, children)
+
+
+product_plan = compile_plan(ProductSerializer)
+cart_plan = compile_plan(CartSerializer)
+order_plan = compile_plan(OrderSerializer)
+order_summary_plan = compile_plan(OrderSummarySerializer)
+# ** product cards read straight off wishlist through-table rows
+wishlist_product_plan = compile_plan(ProductSerializer, prefix="product__")
+
+
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    # ** everything orjson does not handle natively gets DRF's encoding (Decimal -> float, ...)
+    return _encoder.default(obj)
+
+
+class OrjsonRenderer(JSONRenderer):
+    """``JSONRenderer`` with the same bytes, encoded by orjson when installed."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+        # ** JSONRenderer escapes these two so the output is valid JavaScript
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
@@ -0,0 +1,169 @@
+"""``Idempotency-Key`` support for the mutating cart and checkout views.
+
+The first request with a key claims it by inserting an ``IdempotencyKey``
+row, runs the view and stores the response on that row; retries with the
+same key (from the same caller, to the same endpoint, with the same body)
+get the stored response back instead of running the view again. Duplicates
+that arrive while the first is still running poll the row until it settles.
+A caller is its ``Authorization`` header or its guest cart cookie; a request
+with neither has no namespace of its own and runs without a key, so one
+visitor's stored response (and its Set-Cookie) never reaches another.
+Responses are kept for ``IDEMPOTENCY_KEY_TTL`` seconds;
+``expire_idempotency_keys`` deletes them afterwards.
+"""
+import hashlib
+import threading
+import time
+from datetime import timedelta
+from functools import wraps
+from http.cookies import SimpleCookie
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .carts import GUEST_CART_COOKIE
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+KEY_TTL = getattr(settings, "IDEMPOTENCY_KEY_TTL", 24 * 60 * 60)
+# ** a claim older than this belongs to a request that died; the next retry takes it over
+LOCK_TIMEOUT = getattr(settings, "IDEMPOTENCY_LOCK_TIMEOUT", 60)
+WAIT = getattr(settings, "IDEMPOTENCY_WAIT", 10)
+POLL_INTERVAL = 0.05
+
+_local_locks = [threading.Lock() for _ in range(64)]
+
+
+def _caller(request):
+    return request.headers.get("Authorization") or request.COOKIES.get(GUEST_CART_COOKIE, "")
+
+
+def lookup_key(caller, name, key):
+    """The row key: one namespace per caller and endpoint."""
+    return hashlib.sha256(f"{caller}|{name}|{key}".encode()).hexdigest()
+
+
+def request_fingerprint(request):
+    return hashlib.sha256(b"%s|%s|%s" % (
+        request.method.encode(), request.get_full_path().encode(), request.body,
+    )).hexdigest()
+
+
+def _claim(lookup, fingerprint):
+    """Insert the in-progress row; None if another request holds the key."""
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                lookup=lookup, fingerprint=fingerprint,
+                expires_at=timezone.now() + timedelta(seconds=LOCK_TIMEOUT),
+            )
+    except IntegrityError:
+        return None
+
+
+def _store(claim, response):
+    if hasattr(response, "render"):
+        response.render()
+    IdempotencyKey.objects.filter(pk=claim.pk).update(
+        status_code=response.status_code,
+        content_type=response.get("Content-Type", ""),
+        body=response.content,
+        cookies=[morsel.OutputString() for morsel in response.cookies.values()],
+        expires_at=timezone.now() + timedelta(seconds=KEY_TTL),
+    )
+
+
+def _replay(row):
+    response = HttpResponse(bytes(row.body), status=row.status_code, content_type=row.content_type)
+    for cookie in row.cookies:
+        response.cookies.update(SimpleCookie(cookie))
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _error(message, status, **headers):
+    response = JsonResponse({"error": message}, status=status)
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def _run(view, request, args, kwargs, claim):
+    try:
+        response = view(request, *args, **kwargs)
+    except BaseException:
+        claim.delete()
+        raise
+    if response.status_code >= 500:
+        # ** not a result worth replaying; let the client retry for real
+        claim.delete()
+    else:
+        _store(claim, response)
+    return response
+
+
+def _settled(lookup, fingerprint):
+    """The stored row, an error response, or None while the key is still in progress."""
+    row = IdempotencyKey.objects.filter(lookup=lookup).first()
+    if row is None:
+        return None
+    if row.fingerprint != fingerprint:
+        return _error(f"{HEADER} was already used for a different request", 422)
+    if row.status_code is not None:
+        return _replay(row)
+    if row.expires_at <= timezone.now():
+        # ** the request that claimed it died; drop its claim so the next attempt can run
+        IdempotencyKey.objects.filter(pk=row.pk, status_code__isnull=True).delete()
+    return None
+
+
+def _settle_or_claim(lookup, fingerprint):
+    """``(response, claim)``: the settled response, a fresh claim, or neither while another request runs."""
+    # ** threads of one worker take turns at the bookkeeping only, never across the view or a wait
+    with _local_locks[hash(lookup) % len(_local_locks)]:
+        # ** look before claiming: a retry of a finished request is then a single read
+        settled = _settled(lookup, fingerprint)
+        if settled is not None:
+            return settled, None
+        return None, _claim(lookup, fingerprint)
+
+
+def idempotent(view):
+    """Honor an ``Idempotency-Key`` header on ``view``."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER, "").strip()
+        caller = _caller(request)
+        if not key or not caller:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return _error(f"{HEADER} must be at most {MAX_KEY_LENGTH} characters", 400)
+
+        lookup = lookup_key(caller, request.resolver_match.view_name, key)
+        fingerprint = request_fingerprint(request)
+        deadline = time.monotonic() + WAIT
+        while True:
+            settled, claim = _settle_or_claim(lookup, fingerprint)
+            if settled is not None:
+                return settled
+            if claim is not None:
+                return _run(view, request, args, kwargs, claim)
+            if time.monotonic() >= deadline:
+                return _error(f"A request with this {HEADER} is still in progress", 409, **{"Retry-After": "1"})
+            # ** another request is running it: wait for its response
+            time.sleep(POLL_INTERVAL)
+    return wrapper
+
+
+def expire_keys(batch_size=1000, now=None):
+    """Delete expired keys ``batch_size`` rows at a time; returns how many went."""
+    now = now or timezone.now()
+    deleted = 0
+    while True:
+        batch = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list("pk", flat=True)[:batch_size])
+        if not batch:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=batch).delete()[0]
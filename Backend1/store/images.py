@@ -0,0 +1,141 @@
+"""Product image derivatives.
+
+Saving a product image schedules ``render_variants`` on a process pool; it
+writes bounded-size JPEG/WebP/AVIF copies next to the original and the
+result is stored on ``Product.image_variants`` so serializers can expose the
+URLs without touching the filesystem. ``render_variants`` only uses Pillow
+so spawned worker processes never need to set up Django.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps, features
+
+DEFAULT_SIZES = {"thumb": 160, "card": 480, "large": 1024}
+QUALITY = {"jpeg": 82, "webp": 80, "avif": 60}
+EXTENSIONS = {"jpeg": "jpg", "webp": "webp", "avif": "avif"}
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def available_formats():
+    formats = ["jpeg"]
+    if features.check("webp"):
+        formats.append("webp")
+    if features.check("avif"):
+        formats.append("avif")
+    return formats
+
+
+def variant_dir(name):
+    stem = os.path.splitext(name)[0]
+    return f"{os.path.dirname(stem)}/variants/{os.path.basename(stem)}"
+
+
+def render_variants(media_root, name, sizes, formats):
+    """Write every size/format of image ``name`` under ``media_root``.
+
+    Returns ``{label: {"width", "height", <format>: <storage name>}}``.
+    """
+    variants = {}
+    out_dir = variant_dir(name)
+    os.makedirs(os.path.join(media_root, out_dir), exist_ok=True)
+    with Image.open(os.path.join(media_root, name)) as original:
+        image = ImageOps.exif_transpose(original)
+        for label, edge in sizes.items():
+            resized = image.copy()
+            resized.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+            entry = {"width": resized.width, "height": resized.height}
+            for fmt in formats:
+                target = f"{out_dir}/{label}.{EXTENSIONS[fmt]}"
+                frame = resized
+                if fmt == "jpeg" and frame.mode not in ("RGB", "L"):
+                    frame = frame.convert("RGB")
+                elif frame.mode not in ("RGB", "RGBA", "L"):
+                    frame = frame.convert("RGBA")
+                frame.save(os.path.join(media_root, target), fmt.upper(), quality=QUALITY[fmt])
+                entry[fmt] = target
+            variants[label] = entry
+    return variants
+
+
+def _settings():
+    from django.conf import settings
+
+    return (
+        settings.MEDIA_ROOT,
+        getattr(settings, "IMAGE_VARIANT_SIZES", DEFAULT_SIZES),
+        getattr(settings, "IMAGE_VARIANT_WORKERS", 2),
+        getattr(settings, "IMAGE_VARIANTS_SYNC", False),
+    )
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=_settings()[2],
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def store_variants(product_id, name, variants):
+    """Attach rendered variants unless the product's image changed meanwhile."""
+    from .catalog_cache import invalidate_catalog
+    from .models import Product
+
+    variants = dict(variants, source=name)
+    if Product.objects.filter(pk=product_id, image=name).update(image_variants=variants):
+        invalidate_catalog()
+
+
+def _store_result(product_id, name, submitter, future):
+    from django.db import connection
+
+    try:
+        store_variants(product_id, name, future.result())
+    except Exception:
+        logger.exception("Could not render variants for %s", name)
+    finally:
+        # ** normally runs on the executor's callback thread, which owns its
+        # ** own connection; never close the submitting request's connection
+        if threading.get_ident() != submitter:
+            connection.close()
+
+
+def schedule_variants(product):
+    """Render variants for ``product.image`` off the request path."""
+    media_root, sizes, _, sync = _settings()
+    name = product.image.name
+    if sync:
+        store_variants(product.pk, name, render_variants(media_root, name, sizes, available_formats()))
+        return
+    future = get_executor().submit(render_variants, media_root, name, sizes, available_formats())
+    submitter = threading.get_ident()
+    future.add_done_callback(lambda f: _store_result(product.pk, name, submitter, f))
+
+
+def needs_variants(product):
+    return bool(product.image) and (product.image_variants or {}).get("source") != product.image.name
+
+
+def variant_urls(variants):
+    from django.core.files.storage import default_storage
+
+    urls = {}
+    for label, entry in (variants or {}).items():
+        if label == "source":
+            continue
+        urls[label] = {
+            key: default_storage.url(value) if key in EXTENSIONS else value
+            for key, value in entry.items()
+        }
+    return urls
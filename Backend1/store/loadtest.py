@@ -0,0 +1,544 @@
+"""Per-endpoint load test harness.
+
+Every route in ``store/urls1.py`` has a scenario below that builds one
+request (plus any untimed setup it needs, e.g. putting an item in the cart
+before checkout). ``run_endpoint`` drives a scenario through the Django test
+client from N threads and records latency percentiles and query counts,
+which ``check_budgets`` compares against ``loadtest_budgets.json``.
+"""
+import asyncio
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from .models import Order, Product
+from .throttling import unthrottled
+
+BUDGETS_PATH = Path(__file__).with_name("loadtest_budgets.json")
+
+
+@dataclass
+class Dataset:
+    product_ids: list
+    users: list  # ** (username, token key, [order ids]) per seeded user
+    password: str
+    host: str = "localhost"
+
+    @classmethod
+    def load(cls, prefix, password, host="localhost", users=50, products=200):
+        product_ids = list(Product.objects.order_by("id").values_list("id", flat=True)[:products])
+        rows = []
+        for user in User.objects.filter(username__startswith=f"{prefix}user").select_related("auth_token").order_by("id")[:users]:
+            orders = list(Order.objects.filter(user=user).order_by("-id").values_list("id", flat=True)[:5])
+            rows.append((user.username, user.auth_token.key, orders))
+        if not product_ids or not rows:
+            raise ValueError("No seeded data found; run `manage.py seed_store` first")
+        return cls(product_ids=product_ids, users=rows, password=password, host=host)
+
+
+@dataclass
+class Call:
+    method: str
+    path: str
+    data: dict = field(default_factory=dict)
+    token: str = None
+    expect: tuple = (200,)
+
+
+class Session:
+    """One worker's view of the dataset: its own client and its own user."""
+
+    def __init__(self, dataset, worker):
+        self.dataset = dataset
+        self.worker = worker
+        self.client = Client(HTTP_HOST=dataset.host)
+        self.username, self.token, self.order_ids = dataset.users[worker % len(dataset.users)]
+
+    def product(self, i):
+        return self.dataset.product_ids[(self.worker * 7919 + i) % len(self.dataset.product_ids)]
+
+    def send(self, call):
+        headers = {"HTTP_AUTHORIZATION": f"Token {call.token}"} if call.token else {}
+        if call.method == "GET":
+            return self.client.get(call.path, call.data, **headers)
+        return self.client.post(call.path, call.data, content_type="application/json", **headers)
+
+    def add_to_cart(self, i):
+        response = self.send(Call("POST", reverse("get-add-carts"), {"product_id": self.product(i)}, self.token))
+        items = response.json()["cart"]["items"]
+        return items[-1]["id"]
+
+
+def _products(s, i):
+    return Call("GET", reverse("get-products"))
+
+
+def _product_page(s, i):
+    return Call("GET", reverse("get-products"), {"page_size": 24})
+
+
+def _search(s, i):
+    return Call("GET", reverse("get-products"), {"search": ["phone", "smart", "laptp", "classic"][i % 4]})
+
+
+def _browse(s, i):
+    low = 10 * (i % 5)
+    data = {"min_price": low, "max_price": low + 50, "sort": ["price", "-price"][i % 2], "page_size": 24, "facets": 1}
+    return Call("GET", reverse("get-products"), data)
+
+
+def _product_detail(s, i):
+    return Call("GET", reverse("get-product-detail", args=[s.product(i)]))
+
+
+def _categories(s, i):
+    return Call("GET", reverse("get-categories"))
+
+
+def _cart(s, i):
+    return Call("GET", reverse("get-carts"), token=s.token)
+
+
+def _add_to_cart(s, i):
+    return Call("POST", reverse("get-add-carts"), {"product_id": s.product(i)}, s.token)
+
+
+def _remove_from_cart(s, i):
+    return Call("POST", reverse("get-remove-carts"), {"item_id": s.add_to_cart(i)}, s.token)
+
+
+def _update_quantity(s, i):
+    return Call("POST", reverse("update-cart-quantity"), {"item_id": s.add_to_cart(i), "action": "increase"}, s.token)
+
+
+def _batch_cart(s, i):
+    operations = [{"op": "add", "product_id": s.product(i + n)} for n in range(5)]
+    return Call("POST", reverse("batch-update-cart"), {"operations": operations}, s.token)
+
+
+def _register(s, i):
+    username = f"lt-{uuid.uuid4().hex[:12]}"
+    return Call("POST", reverse("register"), {"username": username, "password": "Load-test-pass-1"}, expect=(201,))
+
+
+def _login(s, i):
+    return Call("POST", reverse("login"), {"username": s.username, "password": s.dataset.password})
+
+
+def _toggle_wishlist(s, i):
+    return Call("POST", reverse("toggle-wishlist"), {"product_id": s.product(i)}, s.token)
+
+
+def _batch_wishlist(s, i):
+    return Call("POST", reverse("batch-toggle-wishlist"), {"product_ids": [s.product(i + n) for n in range(5)]}, s.token)
+
+
+def _wishlist_products(s, i):
+    return Call("GET", reverse("get-wishlist-products"), {"page_size": 24}, s.token)
+
+
+def _wishlist(s, i):
+    return Call("GET", reverse("get-wishlist"), token=s.token)
+
+
+def _create_order(s, i):
+    s.add_to_cart(i)
+    data = {"full_name": s.username, "phone": "9800000000", "address": "1 Load Test Lane"}
+    return Call("POST", reverse("create-order"), data, s.token, expect=(201,))
+
+
+def _orders(s, i):
+    return Call("GET", reverse("get-user-orders"), token=s.token)
+
+
+def _order_page(s, i):
+    return Call("GET", reverse("get-user-orders"), {"page_size": 20}, s.token)
+
+
+def _order_summary(s, i):
+    return Call("GET", reverse("get-user-orders"), {"summary": 1, "page_size": 20}, s.token)
+
+
+def _order_detail(s, i):
+    if not s.order_ids:
+        s.order_ids = [s.send(_create_order(s, i)).json()["order"]["id"]]
+    return Call("GET", reverse("get-order-detail", args=[s.order_ids[i % len(s.order_ids)]]), token=s.token)
+
+
+def _export_orders(s, i):
+    # ** seeded users are not staff: this measures the refusal, not a download
+    return Call("GET", reverse("export-orders"), {"status": "delivered"}, s.token, expect=(403,))
+
+
+def _metrics(s, i):
+    return Call("GET", reverse("metrics"))
+
+
+# ** url name -> scenarios; every route in store/urls1.py must appear here
+SCENARIOS = {
+    "get-products": {"list": _products, "page": _product_page, "search": _search, "browse": _browse},
+    "get-product-detail": {"detail": _product_detail},
+    "get-categories": {"list": _categories},
+    "get-carts": {"view": _cart},
+    "get-add-carts": {"add": _add_to_cart},
+    "get-remove-carts": {"remove": _remove_from_cart},
+    "update-cart-quantity": {"increase": _update_quantity},
+    "batch-update-cart": {"add5": _batch_cart},
+    "register": {"new-user": _register},
+    "login": {"valid": _login},
+    "toggle-wishlist": {"toggle": _toggle_wishlist},
+    "batch-toggle-wishlist": {"toggle5": _batch_wishlist},
+    "get-wishlist": {"ids": _wishlist},
+    "get-wishlist-products": {"cards": _wishlist_products},
+    "get-order-detail": {"detail": _order_detail},
+    "create-order": {"checkout": _create_order},
+    "get-user-orders": {"history": _orders, "page": _order_page, "summary": _order_summary},
+    "export-orders": {"forbidden": _export_orders},
+    "metrics": {"scrape": _metrics},
+}
+
+# ** sync route -> its native async twin in store/async_views.py
+ASYNC_ROUTES = {
+    "get-products": "async-get-products",
+    "get-product-detail": "async-get-product-detail",
+    "get-categories": "async-get-categories",
+    "get-user-orders": "async-get-user-orders",
+    "get-wishlist": "async-get-wishlist",
+}
+
+
+def on_route(scenario, name):
+    """The same request as ``scenario``, sent to URL name ``name``."""
+    def build(s, i):
+        call = scenario(s, i)
+        return replace(call, path=reverse(name, kwargs=resolve(call.path).kwargs))
+    return build
+
+
+for _sync_name, _async_name in ASYNC_ROUTES.items():
+    SCENARIOS[_async_name] = {
+        label: on_route(scenario, _async_name) for label, scenario in SCENARIOS[_sync_name].items()
+    }
+
+
+def uncovered_routes():
+    from . import urls1
+
+    return sorted({pattern.name for pattern in urls1.urlpatterns} - set(SCENARIOS))
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return 0.0
+    return samples[max(0, math.ceil(pct / 100 * len(samples)) - 1)]
+
+
+@dataclass
+class Result:
+    key: str
+    latencies: list = field(default_factory=list)
+    queries: list = field(default_factory=list)
+    errors: int = 0
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        return {
+            "requests": len(latencies),
+            "errors": self.errors,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "mean_queries": round(sum(self.queries) / len(self.queries), 2) if self.queries else 0,
+            "max_queries": max(self.queries, default=0),
+        }
+
+
+def _worker(dataset, worker, scenario, indexes, result, lock):
+    session = Session(dataset, worker)
+    try:
+        for i in indexes:
+            call = scenario(session, i)
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = session.send(call)
+                elapsed = time.perf_counter() - started
+            with lock:
+                result.latencies.append(elapsed)
+                result.queries.append(len(queries))
+                if response.status_code not in call.expect:
+                    result.errors += 1
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+
+
+@unthrottled()
+def run_endpoint(dataset, key, scenario, requests, concurrency):
+    """Run ``requests`` calls of ``scenario`` spread over ``concurrency`` threads."""
+    result = Result(key)
+    lock = threading.Lock()
+    shares = [range(w, requests, concurrency) for w in range(concurrency)]
+    if concurrency == 1:
+        _worker(dataset, 0, scenario, shares[0], result, lock)
+        return result
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(_worker, dataset, worker, scenario, share, result, lock)
+            for worker, share in enumerate(shares)
+        ]
+        for future in futures:
+            future.result()
+    return result
+
+
+def load_budgets(path=None):
+    with open(path or BUDGETS_PATH) as handle:
+        return json.load(handle)
+
+
+def check_budgets(summaries, budgets):
+    """Return a human readable line for every exceeded budget."""
+    violations = []
+    for key, summary in summaries.items():
+        budget = budgets.get(key) or budgets.get(key.split(":")[0], {})
+        if summary["errors"]:
+            violations.append(f"{key}: {summary['errors']} unexpected responses")
+        for metric, limit in budget.items():
+            if summary.get(metric, 0) > limit:
+                violations.append(f"{key}: {metric} {summary[metric]} > budget {limit}")
+    return violations
+
+
+def _wsgi_call(app, host, call):
+    environ = {
+        "REQUEST_METHOD": call.method,
+        "PATH_INFO": call.path,
+        "QUERY_STRING": urlencode(call.data, doseq=True),
+        "HTTP_HOST": host,
+    }
+    if call.token:
+        environ["HTTP_AUTHORIZATION"] = f"Token {call.token}"
+    setup_testing_defaults(environ)
+    started = []
+    body = app(environ, lambda status, headers, exc_info=None: started.append(int(status.split()[0])))
+    try:
+        for _ in body:
+            pass
+    finally:
+        body.close()
+    return started[0]
+
+
+async def _asgi_call(app, host, call):
+    headers = [(b"host", host.encode())]
+    if call.token:
+        headers.append((b"authorization", f"Token {call.token}".encode()))
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": call.method,
+        "scheme": "http",
+        "path": call.path,
+        "raw_path": call.path.encode(),
+        "query_string": urlencode(call.data, doseq=True).encode(),
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 0),
+        "server": (host, 80),
+    }
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # ** the client never disconnects; the handler cancels this wait
+        await asyncio.Future()
+
+    started = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            started.append(message["status"])
+
+    await app(scope, receive, send)
+    return started[0]
+
+
+def _timed(result, call, status, elapsed):
+    result.latencies.append(elapsed)
+    if status not in call.expect:
+        result.errors += 1
+
+
+def bench_wsgi(app, dataset, key, scenario, requests, concurrency):
+    """Drive a WSGI app from ``concurrency`` threads, like a threaded server."""
+    result = Result(key)
+    lock = threading.Lock()
+
+    def worker(w):
+        session = Session(dataset, w)
+        for i in range(w, requests, concurrency):
+            call = scenario(session, i)
+            started = time.perf_counter()
+            status = _wsgi_call(app, dataset.host, call)
+            with lock:
+                _timed(result, call, status, time.perf_counter() - started)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker, w) for w in range(concurrency)]:
+            future.result()
+    return result
+
+
+def bench_asgi(app, dataset, key, scenario, requests, concurrency):
+    """Drive an ASGI app with ``concurrency`` in-flight requests on one event loop."""
+    result = Result(key)
+
+    async def worker(w):
+        session = Session(dataset, w)
+        for i in range(w, requests, concurrency):
+            call = scenario(session, i)
+            started = time.perf_counter()
+            status = await _asgi_call(app, dataset.host, call)
+            _timed(result, call, status, time.perf_counter() - started)
+
+    async def main():
+        await asyncio.gather(*(worker(w) for w in range(concurrency)))
+
+    asyncio.run(main())
+    return result
+
+
+@unthrottled()
+def compare_servers(dataset, requests, concurrency, names=None):
+    """Throughput of each read route as sync/WSGI, sync/ASGI and async/ASGI.
+
+    Returns ``{"<url name>:<label>": {mode: summary with "rps"}}``.
+    """
+    from django.core.asgi import get_asgi_application
+    from django.core.wsgi import get_wsgi_application
+
+    wsgi_app, asgi_app = get_wsgi_application(), get_asgi_application()
+    modes = {
+        "wsgi": lambda key, scenario, name: bench_wsgi(wsgi_app, dataset, key, scenario, requests, concurrency),
+        "asgi-sync": lambda key, scenario, name: bench_asgi(asgi_app, dataset, key, scenario, requests, concurrency),
+        "asgi-async": lambda key, scenario, name: bench_asgi(
+            asgi_app, dataset, key, on_route(scenario, ASYNC_ROUTES[name]), requests, concurrency
+        ),
+    }
+    report = {}
+    for name in names or ASYNC_ROUTES:
+        for label, scenario in SCENARIOS[name].items():
+            key = f"{name}:{label}"
+            report[key] = {}
+            for mode, run in modes.items():
+                started = time.perf_counter()
+                summary = run(key, scenario, name).summary()
+                wall = time.perf_counter() - started
+                summary["rps"] = round(summary["requests"] / wall, 1) if wall else 0.0
+                report[key][mode] = summary
+    return report
+
+
+def _stress_shoppers(product_id, checkouts, tag):
+    """``checkouts`` users, each with a token and one unit of the product in their cart."""
+    from rest_framework.authtoken.models import Token
+
+    from .models import Cart, CartItem
+
+    User.objects.bulk_create([User(username=f"{tag}-{i}") for i in range(checkouts)])
+    users = list(User.objects.filter(username__startswith=f"{tag}-").order_by("id"))
+    tokens = Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in users])
+    Cart.objects.bulk_create([Cart(user=user) for user in users])
+    carts = Cart.objects.filter(user__in=users)
+    CartItem.objects.bulk_create([CartItem(cart=cart, product_id=product_id, quantity=1) for cart in carts])
+    Cart.objects.filter(user__in=users).update(item_count=1, total=Product.objects.get(pk=product_id).price)
+    return [token.key for token in tokens]
+
+
+@unthrottled()
+def stress_checkout(product_id, stock, checkouts, concurrency, host="localhost", windows=5):
+    """Race ``checkouts`` single-unit orders for one product holding ``stock`` units.
+
+    Each checkout comes from its own throwaway user. Returns the outcome and
+    the completion rate over ``windows`` equal slices of the run, then
+    removes the users and their orders and restores the product's stock.
+    """
+    product = Product.objects.get(pk=product_id)
+    original = (product.stock_available, product.stock_reserved)
+    Product.objects.filter(pk=product_id).update(stock_available=stock, stock_reserved=0)
+    tag = f"stress-{uuid.uuid4().hex[:8]}"
+    tokens = _stress_shoppers(product_id, checkouts, tag)
+    data = {"full_name": "Stress Test", "phone": "9800000000", "address": "1 Stress Lane"}
+    outcomes = []
+    lock = threading.Lock()
+
+    def worker(w):
+        client = Client(HTTP_HOST=host)
+        try:
+            for i in range(w, checkouts, concurrency):
+                started = time.perf_counter()
+                response = client.post(
+                    reverse("create-order"), data, content_type="application/json",
+                    HTTP_AUTHORIZATION=f"Token {tokens[i]}",
+                )
+                finished = time.perf_counter()
+                with lock:
+                    outcomes.append((response.status_code, started, finished))
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+
+    # ** the expected 409s would otherwise log one warning each
+    logging.disable(logging.WARNING)
+    try:
+        began = time.perf_counter()
+        if concurrency == 1:
+            worker(0)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                for future in [pool.submit(worker, w) for w in range(concurrency)]:
+                    future.result()
+        wall = time.perf_counter() - began
+
+        product.refresh_from_db()
+        sold = sum(1 for code, _, _ in outcomes if code == 201)
+        slice_length = wall / windows
+        rates = [0] * windows
+        for _, _, finished in outcomes:
+            rates[min(int((finished - began) / slice_length), windows - 1)] += 1
+        latencies = sorted(finished - started for _, started, finished in outcomes)
+        return {
+            "checkouts": checkouts,
+            "stock": stock,
+            "sold": sold,
+            "rejected": sum(1 for code, _, _ in outcomes if code == 409),
+            "errors": sum(1 for code, _, _ in outcomes if code not in (201, 409)),
+            "stock_available": product.stock_available,
+            "stock_reserved": product.stock_reserved,
+            "oversold": sold > stock or product.stock_available + sold != stock,
+            "rps": round(len(outcomes) / wall, 1) if wall else 0.0,
+            "window_rps": [round(n / slice_length, 1) if slice_length else 0.0 for n in rates],
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        }
+    finally:
+        logging.disable(logging.NOTSET)
+        User.objects.filter(username__startswith=f"{tag}-").delete()
+        Product.objects.filter(pk=product_id).update(stock_available=original[0], stock_reserved=original[1])
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from store.carts import load_cart
+from store.fastser import OrjsonRenderer, cart_plan, order_plan, product_plan
+from store.models import Cart, Order, Product
+from store.serilizer import CartSerializer, OrderSerializer, ProductSerializer
+
+
+class Command(BaseCommand):
+    help = "Time DRF serializers + JSONRenderer against the compiled plans + OrjsonRenderer on existing rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=500, help="Products per product-list payload.")
+        parser.add_argument("--orders", type=int, default=50, help="Orders per order-history payload.")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.order_by("id").values_list("id", flat=True)[:options["products"]])
+        order_ids = list(Order.objects.order_by("-id").values_list("id", flat=True)[:options["orders"]])
+        cart = Cart.objects.exclude(items=None).order_by("id").first()
+        if not product_ids or not order_ids or cart is None:
+            raise CommandError("Not enough data; run `manage.py seed_store` first")
+
+        drf, fast = JSONRenderer(), OrjsonRenderer()
+        products = Product.objects.filter(pk__in=product_ids).order_by("id")
+        orders = Order.objects.filter(pk__in=order_ids).order_by("-id")
+        carts = Cart.objects.filter(pk=cart.pk)
+        cases = {
+            f"products x{len(product_ids)}": (
+                lambda: drf.render(ProductSerializer(products.select_related("category"), many=True).data),
+                lambda: fast.render(product_plan.serialize(products)),
+            ),
+            "cart": (
+                lambda: drf.render(CartSerializer(load_cart(cart.pk)).data),
+                lambda: fast.render(cart_plan.first(carts)),
+            ),
+            f"orders x{len(order_ids)}": (
+                lambda: drf.render(OrderSerializer(orders.prefetch_related("items__product"), many=True).data),
+                lambda: fast.render(order_plan.serialize(orders)),
+            ),
+        }
+
+        self.stdout.write(f"{'payload':16} {'drf ms':>9} {'fast ms':>9} {'speedup':>8}")
+        for label, (slow_path, fast_path) in cases.items():
+            if slow_path() != fast_path():
+                raise CommandError(f"{label}: fast path output differs from the DRF serializer")
+            slow_ms, fast_ms = self.time(slow_path, options["repeat"]), self.time(fast_path, options["repeat"])
+            self.stdout.write(f"{label:16} {slow_ms:>9.2f} {fast_ms:>9.2f} {slow_ms / fast_ms:>7.1f}x")
+
+    def time(self, func, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        return (time.perf_counter() - started) / repeat * 1000
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from store.carts import drifted_carts, recompute_totals
+from store.models import Cart
+
+
+class Command(BaseCommand):
+    help = "Find carts whose item_count/total disagree with their lines, and optionally repair them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Recompute the aggregates of drifted carts.")
+
+    def handle(self, *args, **options):
+        drifted = list(drifted_carts().values_list("pk", "item_count", "actual_count", "total", "actual_total"))
+        for pk, item_count, actual_count, total, actual_total in drifted:
+            self.stdout.write(
+                f"Cart {pk}: item_count {item_count} (lines {actual_count}), total {total} (lines {actual_total})"
+            )
+
+        if drifted and options["fix"]:
+            recompute_totals(Cart.objects.filter(pk__in=[row[0] for row in drifted]))
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(drifted)} carts"))
+        elif drifted:
+            self.stdout.write(self.style.WARNING(f"{len(drifted)} carts drifted; rerun with --fix to repair"))
+        else:
+            self.stdout.write(self.style.SUCCESS("All cart totals are consistent"))
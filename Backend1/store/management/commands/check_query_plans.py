@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.loadtest import Dataset
+from store.management.commands.seed_store import BENCH_PASSWORD
+from store.queryplans import capture_plans
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the queries of the hot endpoints and fail on full table scans or filesorts."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--prefix", default="bench", help="Username prefix used by seed_store.")
+        parser.add_argument("--password", default=BENCH_PASSWORD)
+        parser.add_argument("--host", default="localhost", help="Host header; must be in ALLOWED_HOSTS.")
+        parser.add_argument("--verbose-plans", action="store_true", help="Print every plan, not just the failing ones.")
+
+    def handle(self, *args, **options):
+        try:
+            dataset = Dataset.load(options["prefix"], options["password"], options["host"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        failing = 0
+        for plan in capture_plans(dataset):
+            if plan.problems:
+                failing += 1
+                self.stdout.write(self.style.ERROR(f"{plan.scenario}: {'; '.join(plan.problems)}"))
+                self.stdout.write(f"  {plan.sql}")
+            elif options["verbose_plans"]:
+                self.stdout.write(f"{plan.scenario}: ok")
+            if plan.problems or options["verbose_plans"]:
+                for step in plan.plan:
+                    self.stdout.write(f"    {step}")
+
+        if failing:
+            raise CommandError(f"{failing} queries scan or sort without an index")
+        self.stdout.write(self.style.SUCCESS("Every hot query is index-driven"))
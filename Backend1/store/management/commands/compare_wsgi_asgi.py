@@ -0,0 +1,41 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.loadtest import ASYNC_ROUTES, Dataset, compare_servers
+from store.management.commands.seed_store import BENCH_PASSWORD
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput of the read endpoints served by the WSGI handler, the ASGI handler "
+        "running the sync views, and the ASGI handler running the native async views."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Requests per route and mode.")
+        parser.add_argument("--concurrency", type=int, default=16, help="Threads (WSGI) or in-flight requests (ASGI).")
+        parser.add_argument("--only", nargs="*", default=None, choices=sorted(ASYNC_ROUTES), help="Sync URL names to compare.")
+        parser.add_argument("--prefix", default="bench", help="Username prefix used by seed_store.")
+        parser.add_argument("--password", default=BENCH_PASSWORD)
+        parser.add_argument("--host", default="localhost", help="Host header; must be in ALLOWED_HOSTS.")
+        parser.add_argument("--json", dest="json_path", default=None, help="Also write the results here.")
+
+    def handle(self, *args, **options):
+        try:
+            dataset = Dataset.load(options["prefix"], options["password"], options["host"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        report = compare_servers(dataset, options["requests"], options["concurrency"], options["only"])
+        self.stdout.write(f"{'scenario':30} {'mode':11} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'err':>4}")
+        for key, modes in report.items():
+            for mode, summary in modes.items():
+                self.stdout.write(
+                    f"{key:30} {mode:11} {summary['rps']:>8} {summary['p50_ms']:>8} "
+                    f"{summary['p95_ms']:>8} {summary['errors']:>4}"
+                )
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as handle:
+                json.dump(report, handle, indent=2)
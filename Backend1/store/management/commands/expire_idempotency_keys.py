@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.idempotency import expire_keys
+
+
+class Command(BaseCommand):
+    help = "Delete stored Idempotency-Key responses whose TTL has passed, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = expire_keys(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Expired {deleted} idempotency keys"))
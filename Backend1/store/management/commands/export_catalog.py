@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from store.catalog_io import CHUNK_SIZE, FORMATS, export_rows, guess_format, write_rows
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = "Stream the catalog to a CSV or JSON lines file that import_catalog reads back."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Output file, or - for stdout.")
+        parser.add_argument("--format", choices=FORMATS, default=None, help="Default: from the file extension.")
+        parser.add_argument("--category", default=None, help="Only export this category slug.")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or guess_format(path)
+        products = Product.objects.all()
+        if options["category"]:
+            products = products.filter(category__slug=options["category"])
+        rows = export_rows(products, options["chunk_size"])
+
+        if path == "-":
+            write_rows(self.stdout, rows, fmt)
+            return
+        with open(path, "w", newline="", encoding="utf-8") as stream:
+            written = write_rows(stream, rows, fmt)
+        self.stdout.write(self.style.SUCCESS(f"Exported {written} products to {path}"))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_io import guess_format
+from store.order_export import CHUNK_SIZE, FORMATS, OrderExportError, export_rows, parse_filters, render
+
+
+class Command(BaseCommand):
+    help = "Stream orders, one row per line item, to CSV or JSON lines for finance."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Output file, or - for stdout.")
+        parser.add_argument("--since", default=None, help="ISO date or datetime, inclusive.")
+        parser.add_argument("--until", default=None, help="ISO datetime, exclusive; a bare date includes that day.")
+        parser.add_argument("--status", default=None, help="Comma separated statuses (default: all).")
+        parser.add_argument("--format", choices=FORMATS, default=None, help="Default: from the file extension.")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Orders per query.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or guess_format(path)
+        try:
+            filters = parse_filters({
+                "since": options["since"], "until": options["until"], "status": options["status"], "format": fmt,
+            })
+        except OrderExportError as exc:
+            raise CommandError(str(exc))
+        pieces = render(export_rows(filters, options["chunk_size"]), fmt)
+
+        if path == "-":
+            for piece in pieces:
+                self.stdout.write(piece, ending="")
+            return
+        with open(path, "w", newline="", encoding="utf-8") as stream:
+            stream.writelines(pieces)
+        self.stdout.write(self.style.SUCCESS(f"Exported orders to {path}"))
@@ -0,0 +1,47 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.images import DEFAULT_SIZES, available_formats, needs_variants, render_variants, store_variants
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = "Backfill thumbnail/WebP/AVIF variants for existing product images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Re-render products that already have variants.")
+        parser.add_argument("--workers", type=int, default=getattr(settings, "IMAGE_VARIANT_WORKERS", 2))
+        parser.add_argument("--chunk-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        sizes = getattr(settings, "IMAGE_VARIANT_SIZES", DEFAULT_SIZES)
+        formats = available_formats()
+        products = Product.objects.exclude(image="").exclude(image=None).only("id", "image", "image_variants")
+
+        rendered = failed = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            pending = {}
+            for product in products.iterator(chunk_size=options["chunk_size"]):
+                if not options["force"] and not needs_variants(product):
+                    continue
+                future = pool.submit(render_variants, settings.MEDIA_ROOT, product.image.name, sizes, formats)
+                pending[future] = product
+                if len(pending) >= options["chunk_size"]:
+                    rendered, failed = self._collect(pending, rendered, failed)
+            rendered, failed = self._collect(pending, rendered, failed)
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered variants for {rendered} products, {failed} failed"))
+
+    def _collect(self, pending, rendered, failed):
+        for future in as_completed(pending):
+            product = pending[future]
+            try:
+                store_variants(product.pk, product.image.name, future.result())
+                rendered += 1
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f"Product {product.pk} ({product.image.name}): {exc}")
+        pending.clear()
+        return rendered, failed
@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.catalog_io import CHUNK_SIZE, FORMATS, CatalogError, guess_format, import_catalog
+
+
+class Command(BaseCommand):
+    help = "Upsert categories and products from a CSV or JSON lines file, a chunk at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for stdin.")
+        parser.add_argument("--format", choices=FORMATS, default=None, help="Default: from the file extension.")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument("--workers", type=int, default=8, help="Threads fetching or copying images.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or guess_format(path)
+        try:
+            if path == "-":
+                importer = self.run(sys.stdin, fmt, options)
+            else:
+                with open(path, newline="", encoding="utf-8") as stream:
+                    importer = self.run(stream, fmt, options)
+        except (CatalogError, OSError) as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {importer.created} and updated {importer.updated} products, "
+            f"{importer.images} images stored, {importer.failed} rows skipped"
+        ))
+        if importer.images:
+            self.stdout.write("Run generate_image_variants to render thumbnails for the new images.")
+
+    def run(self, stream, fmt, options):
+        return import_catalog(
+            stream, fmt, chunk_size=options["chunk_size"], workers=options["workers"],
+            on_error=lambda line, message: self.stderr.write(f"line {line}: {message}"),
+        )
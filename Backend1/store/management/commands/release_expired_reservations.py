@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.stock import release_expired
+
+
+class Command(BaseCommand):
+    help = "Return the stock held by checkouts whose reservations expired without an order."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep polling instead of exiting after one pass.")
+        parser.add_argument("--interval", type=float, default=60.0, help="Seconds to sleep between passes with --loop.")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            total += release_expired()
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Released {total} expired reservations"))
@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.loadtest import (
+    SCENARIOS, Dataset, check_budgets, load_budgets, run_endpoint, uncovered_routes,
+)
+from store.management.commands.seed_store import BENCH_PASSWORD
+
+
+class Command(BaseCommand):
+    help = "Drive every API route at a given concurrency and check latency/query budgets."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="Requests per scenario.")
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--only", nargs="*", default=None, help="URL names to run (default: all).")
+        parser.add_argument("--prefix", default="bench", help="Username prefix used by seed_store.")
+        parser.add_argument("--password", default=BENCH_PASSWORD)
+        parser.add_argument("--host", default="localhost", help="Host header; must be in ALLOWED_HOSTS.")
+        parser.add_argument("--budgets", default=None, help="Budget file (default: store/loadtest_budgets.json).")
+        parser.add_argument("--no-budgets", action="store_true", help="Report only, never fail.")
+        parser.add_argument("--json", dest="json_path", default=None, help="Also write the results here.")
+
+    def handle(self, *args, **options):
+        missing = uncovered_routes()
+        if missing:
+            raise CommandError(f"No load test scenario for: {', '.join(missing)}")
+
+        try:
+            dataset = Dataset.load(options["prefix"], options["password"], options["host"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        names = options["only"] or list(SCENARIOS)
+        summaries = {}
+        header = f"{'scenario':38} {'n':>5} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'max q':>6}"
+        self.stdout.write(header)
+        for name in names:
+            for label, scenario in SCENARIOS[name].items():
+                key = f"{name}:{label}"
+                summary = run_endpoint(dataset, key, scenario, options["requests"], options["concurrency"]).summary()
+                summaries[key] = summary
+                self.stdout.write(
+                    f"{key:38} {summary['requests']:>5} {summary['errors']:>4} {summary['p50_ms']:>8} "
+                    f"{summary['p95_ms']:>8} {summary['p99_ms']:>8} {summary['mean_queries']:>8} {summary['max_queries']:>6}"
+                )
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as handle:
+                json.dump(summaries, handle, indent=2)
+
+        if options["no_budgets"]:
+            return
+        violations = check_budgets(summaries, load_budgets(options["budgets"]))
+        if violations:
+            raise CommandError("Budgets exceeded:\n  " + "\n  ".join(violations))
+        self.stdout.write(self.style.SUCCESS("All endpoints within budget"))
@@ -0,0 +1,165 @@
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from store.carts import recompute_totals
+from store.catalog_cache import invalidate_catalog
+from store.models import Cart, CartItem, Category, Order, OrderItem, Product
+from store.search import index_products
+
+ADJECTIVES = [
+    "Classic", "Compact", "Deluxe", "Eco", "Ultra", "Smart", "Vintage", "Wireless",
+    "Premium", "Rugged", "Slim", "Portable", "Pro", "Mini", "Limited", "Organic",
+]
+NOUNS = [
+    "Phone", "Laptop", "Headphones", "Backpack", "Sneakers", "Watch", "Camera", "Speaker",
+    "Jacket", "Figure", "Poster", "Mug", "Keyboard", "Monitor", "Lamp", "Bottle",
+]
+SECTIONS = [
+    "Electronics", "Fashion", "Home", "Anime", "Sports", "Books", "Toys", "Beauty",
+    "Garden", "Grocery", "Office", "Outdoors", "Music", "Gaming", "Kitchen", "Travel",
+]
+PHRASES = [
+    "built to last", "lightweight and durable", "great for everyday use", "limited stock",
+    "customer favourite", "ships in two days", "water resistant", "comes with a warranty",
+]
+
+BENCH_PASSWORD = "bench-pass-123"
+
+
+class Command(BaseCommand):
+    help = "Generate a reproducible dataset of categories, products, users, carts and orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--products", type=int, default=2000)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--carts", type=int, default=100, help="Users (from the start of the pool) that get a cart.")
+        parser.add_argument("--orders", type=int, default=500)
+        parser.add_argument("--max-lines", type=int, default=5, help="Maximum lines per cart and order.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--prefix", default="bench", help="Prefix for generated usernames and slugs.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = options["prefix"]
+        batch = options["batch_size"]
+
+        with transaction.atomic():
+            categories = self.create_categories(options["categories"], prefix, batch)
+            products = self.create_products(rng, categories, options["products"], batch)
+            users = self.create_users(options["users"], prefix, batch)
+            self.create_carts(rng, users[:options["carts"]], products, options["max_lines"], batch)
+            self.create_orders(rng, users, products, options["orders"], options["max_lines"], batch)
+
+        invalidate_catalog()
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(categories)} categories, {len(products)} products, {len(users)} users "
+            f"(password {BENCH_PASSWORD!r}), {min(options['carts'], len(users))} carts, {options['orders']} orders"
+        ))
+
+    def create_categories(self, count, prefix, batch):
+        Category.objects.bulk_create(
+            [
+                Category(name=f"{SECTIONS[i % len(SECTIONS)]} {prefix} {i}", slug=f"{prefix}-{i}")
+                for i in range(count)
+            ],
+            batch_size=batch,
+            ignore_conflicts=True,
+        )
+        return list(Category.objects.filter(slug__startswith=f"{prefix}-").order_by("id"))
+
+    def create_products(self, rng, categories, count, batch):
+        first_id = (Product.objects.order_by("-id").values_list("id", flat=True).first() or 0)
+        Product.objects.bulk_create(
+            [
+                Product(
+                    category=rng.choice(categories),
+                    name=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}",
+                    description=f"{rng.choice(PHRASES).capitalize()}, {rng.choice(PHRASES)}.",
+                    price=Decimal(rng.randint(199, 99999)) / 100,
+                )
+                for i in range(count)
+            ],
+            batch_size=batch,
+        )
+        products = list(Product.objects.filter(id__gt=first_id).select_related("category").order_by("id"))
+        # ** bulk_create skips signals, so index the new rows explicitly
+        for start in range(0, len(products), batch):
+            index_products(products[start:start + batch])
+        return products
+
+    def create_users(self, count, prefix, batch):
+        password = make_password(BENCH_PASSWORD)
+        User.objects.bulk_create(
+            [
+                User(username=f"{prefix}user{i}", email=f"{prefix}user{i}@example.com", password=password)
+                for i in range(count)
+            ],
+            batch_size=batch,
+            ignore_conflicts=True,
+        )
+        users = list(User.objects.filter(username__startswith=f"{prefix}user").order_by("id")[:count])
+        Token.objects.bulk_create(
+            [Token(key=Token.generate_key(), user=user) for user in users],
+            batch_size=batch,
+            ignore_conflicts=True,
+        )
+        return users
+
+    def create_carts(self, rng, users, products, max_lines, batch):
+        has_cart = set(Cart.objects.filter(user__in=users).values_list("user_id", flat=True))
+        Cart.objects.bulk_create([Cart(user=user) for user in users if user.pk not in has_cart], batch_size=batch)
+        carts = Cart.objects.filter(user__in=users).exclude(user_id__in=has_cart)
+        CartItem.objects.bulk_create(
+            [
+                CartItem(cart=cart, product=product, quantity=rng.randint(1, 3))
+                for cart in carts
+                for product in rng.sample(products, min(len(products), rng.randint(1, max_lines)))
+            ],
+            batch_size=batch,
+        )
+        recompute_totals(carts)
+
+    def create_orders(self, rng, users, products, count, max_lines, batch):
+        if not users or not count:
+            return
+        plans = []
+        for _ in range(count):
+            lines = [
+                (product, rng.randint(1, 3))
+                for product in rng.sample(products, min(len(products), rng.randint(1, max_lines)))
+            ]
+            plans.append((rng.choice(users), lines))
+
+        orders = Order.objects.bulk_create(
+            [
+                Order(
+                    user=user,
+                    total_amount=sum(product.price * quantity for product, quantity in lines),
+                    full_name=user.username.title(),
+                    phone=f"98{rng.randint(0, 99999999):08d}",
+                    address=f"{rng.randint(1, 999)} Market Street",
+                    status=rng.choice(Order.STATUS_CHOICES)[0],
+                )
+                for user, lines in plans
+            ],
+            batch_size=batch,
+        )
+        if orders[0].pk is None:
+            # ** MySQL does not return bulk-inserted ids
+            orders = list(Order.objects.order_by("-id")[:len(orders)])[::-1]
+        OrderItem.objects.bulk_create(
+            [
+                OrderItem(order=order, product=product, quantity=quantity, price=product.price)
+                for order, (_, lines) in zip(orders, plans)
+                for product, quantity in lines
+            ],
+            batch_size=batch,
+        )
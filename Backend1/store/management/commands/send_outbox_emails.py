@@ -0,0 +1,33 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from store.outbox import send_batch
+
+
+class Command(BaseCommand):
+    help = "Deliver queued outbox emails in batches, over one SMTP connection while there is work."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--loop", action="store_true", help="Keep polling instead of exiting once drained.")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds to sleep between polls with --loop.")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        connection = get_connection()
+        while True:
+            # ** one session per busy spell: the server drops an idle one between polls, and
+            # ** the first send on it would fail and count an attempt against its message
+            with connection:
+                while True:
+                    sent, failed = send_batch(connection, options["batch_size"])
+                    total_sent += sent
+                    total_failed += failed
+                    if not (sent or failed):
+                        break
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Sent {total_sent} emails, {total_failed} failed"))
@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.loadtest import stress_checkout
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = "Race many concurrent checkouts for one product and verify that none of it is oversold."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--product", type=int, default=None, help="Product id (default: the first product).")
+        parser.add_argument("--stock", type=int, default=100, help="Units on sale for the run.")
+        parser.add_argument("--checkouts", type=int, default=300)
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument("--host", default="localhost", help="Host header; must be in ALLOWED_HOSTS.")
+        parser.add_argument("--json", dest="json_path", default=None, help="Also write the results here.")
+
+    def handle(self, *args, **options):
+        product_id = options["product"] or Product.objects.order_by("id").values_list("id", flat=True).first()
+        if product_id is None:
+            raise CommandError("No products found; run `manage.py seed_store` first")
+
+        report = stress_checkout(
+            product_id, options["stock"], options["checkouts"], options["concurrency"], options["host"],
+        )
+        for key, value in report.items():
+            self.stdout.write(f"{key:16} {value}")
+
+        if options["json_path"]:
+            with open(options["json_path"], "w") as handle:
+                json.dump(report, handle, indent=2)
+
+        if report["oversold"] or report["errors"]:
+            raise CommandError(f"Stock check failed: sold {report['sold']} of {report['stock']}, {report['errors']} errors")
+        self.stdout.write(self.style.SUCCESS(f"Sold {report['sold']} of {report['stock']} units without overselling"))
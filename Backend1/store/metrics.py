@@ -0,0 +1,204 @@
+"""Per-view request metrics in Prometheus text format.
+
+Every known URL name owns a fixed slot of doubles (request count, latency
+sum, SQL query count, SQL seconds and one counter per latency bucket) in a
+buffer laid out once per process, so recording a request only bumps a few
+numbers in place.
+
+With ``METRICS_MULTIPROC_DIR`` set, each process maps its buffer onto its
+own file in that directory and the exporter sums every file, so all
+workers behind a load balancer report the same totals. Clear the
+directory when the service is (re)started.
+"""
+import bisect
+import mmap
+import os
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+
+from .auth_cache import token_cache
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+OTHER = "other"
+
+COUNT, LATENCY, QUERIES, SQL_SECONDS, FIRST_BUCKET = range(5)
+STRIDE = FIRST_BUCKET + len(BUCKETS) + 1
+# ** process-wide slots after the per-view ones: token cache hits/misses
+PROCESS_SLOTS = ("auth_token_cache_hits", "auth_token_cache_misses")
+
+
+def view_names():
+    from . import urls1
+
+    return sorted({pattern.name for pattern in urls1.urlpatterns if pattern.name} | {OTHER})
+
+
+class MetricsStore:
+    def __init__(self, names, directory=None, pid=None):
+        self.names = names
+        self.index = {name: i * STRIDE for i, name in enumerate(names)}
+        self.process_offset = len(names) * STRIDE
+        self.size = (self.process_offset + len(PROCESS_SLOTS)) * 8
+        self.directory = directory
+        self.pid = pid or os.getpid()
+        self.lock = threading.Lock()
+        if directory:
+            path = Path(directory) / f"store_metrics_{self.pid}.db"
+            with open(path, "a+b") as handle:
+                handle.truncate(self.size)
+                self._buffer = mmap.mmap(handle.fileno(), self.size)
+        else:
+            self._buffer = bytearray(self.size)
+        self.values = memoryview(self._buffer).cast("d")
+
+    def record(self, name, seconds, queries, sql_seconds):
+        offset = self.index.get(name)
+        if offset is None:
+            offset = self.index[OTHER]
+        values = self.values
+        with self.lock:
+            values[offset + COUNT] += 1
+            values[offset + LATENCY] += seconds
+            values[offset + QUERIES] += queries
+            values[offset + SQL_SECONDS] += sql_seconds
+            values[offset + FIRST_BUCKET + bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def set_process_values(self, *numbers):
+        values = self.values
+        for i, number in enumerate(numbers):
+            values[self.process_offset + i] = number
+
+    def snapshot(self):
+        """Totals over every process sharing the directory (or just this one)."""
+        if not self.directory:
+            return list(self.values)
+        totals = [0.0] * (self.size // 8)
+        for path in Path(self.directory).glob("store_metrics_*.db"):
+            data = path.read_bytes()
+            if len(data) != self.size:
+                continue
+            for i, value in enumerate(memoryview(data).cast("d")):
+                totals[i] += value
+        return totals
+
+
+class _QueryTimer:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# ** the current request's timer; a context variable so queries that async
+# ** views run through sync_to_async threads are still attributed to them
+_current_timer = ContextVar("store_metrics_timer", default=None)
+
+
+def _timed_execute(execute, sql, params, many, context):
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.count += 1
+        timer.seconds += time.perf_counter() - started
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    pid = os.getpid()
+    if _store is None or _store.pid != pid:
+        with _store_lock:
+            if _store is None or _store.pid != pid:
+                directory = getattr(settings, "METRICS_MULTIPROC_DIR", None)
+                _store = MetricsStore(view_names(), directory=directory, pid=pid)
+    return _store
+
+
+def _install_wrappers():
+    for conn in connections.all():
+        if _timed_execute not in conn.execute_wrappers:
+            conn.execute_wrappers.append(_timed_execute)
+
+
+@sync_and_async_middleware
+def MetricsMiddleware(get_response):
+    """Record latency and SQL usage per resolved URL name."""
+
+    def start():
+        _install_wrappers()
+        timer = _QueryTimer()
+        return timer, _current_timer.set(timer), time.perf_counter()
+
+    def finish(request, timer, token, started):
+        elapsed = time.perf_counter() - started
+        _current_timer.reset(token)
+        match = request.resolver_match
+        store = get_store()
+        store.record(match.url_name if match else OTHER, elapsed, timer.count, timer.seconds)
+        store.set_process_values(token_cache.hits, token_cache.misses)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            state = start()
+            response = await get_response(request)
+            finish(request, *state)
+            return response
+    else:
+        def middleware(request):
+            state = start()
+            response = get_response(request)
+            finish(request, *state)
+            return response
+    return middleware
+
+
+def _line(metric, labels, value):
+    return f"{metric}{{{labels}}} {value:.17g}"
+
+
+def render_metrics():
+    store = get_store()
+    totals = store.snapshot()
+    lines = [
+        "# HELP store_request_duration_seconds Request latency per URL name.",
+        "# TYPE store_request_duration_seconds histogram",
+    ]
+    for name in store.names:
+        offset = store.index[name]
+        cumulative = 0.0
+        for i, bound in enumerate(BUCKETS):
+            cumulative += totals[offset + FIRST_BUCKET + i]
+            lines.append(_line("store_request_duration_seconds_bucket", f'view="{name}",le="{bound}"', cumulative))
+        lines.append(_line("store_request_duration_seconds_bucket", f'view="{name}",le="+Inf"', totals[offset + COUNT]))
+        lines.append(_line("store_request_duration_seconds_sum", f'view="{name}"', totals[offset + LATENCY]))
+        lines.append(_line("store_request_duration_seconds_count", f'view="{name}"', totals[offset + COUNT]))
+
+    for metric, slot, help_text in (
+        ("store_db_queries_total", QUERIES, "SQL queries executed per URL name."),
+        ("store_db_query_seconds_total", SQL_SECONDS, "Time spent in SQL per URL name."),
+    ):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for name in store.names:
+            lines.append(_line(metric, f'view="{name}"', totals[store.index[name] + slot]))
+
+    for i, slot in enumerate(PROCESS_SLOTS):
+        metric = f"store_{slot}_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {totals[store.process_offset + i]:.17g}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_product_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, unique=True)),
+                ('length', models.PositiveSmallIntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['length', 'term'], name='searchterm_length_term_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weight', models.FloatField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_postings', to='store.product')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='store.searchterm')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('term', 'product'), name='unique_search_posting')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:27
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_cart_aggregates(apps, schema_editor):
+    Cart = apps.get_model('store', 'Cart')
+    CartItem = apps.get_model('store', 'CartItem')
+    total_field = models.DecimalField(max_digits=12, decimal_places=3)
+    lines = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+    Cart.objects.update(
+        item_count=Coalesce(
+            Subquery(lines.annotate(n=Sum('quantity')).values('n'), output_field=IntegerField()),
+            Value(0),
+        ),
+        total=Coalesce(
+            Subquery(
+                lines.annotate(amount=Sum(F('quantity') * F('product__price'), output_field=total_field)).values('amount'),
+                output_field=total_field,
+            ),
+            Value(Decimal(0)),
+            output_field=total_field,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='total',
+            field=models.DecimalField(decimal_places=3, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_cart_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='session_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
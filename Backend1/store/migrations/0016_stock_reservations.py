@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-18 12:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_cart_session_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_available',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stock_reserved',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hold', models.UUIDField(db_index=True)),
+                ('quantity', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='store.order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='store.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='stockreservation_expiry_idx')],
+            },
+        ),
+    ]
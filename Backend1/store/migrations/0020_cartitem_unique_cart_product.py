@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-18 13:01
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    # ** fold repeated (cart, product) lines into the oldest one; the cart
+    # ** totals do not change because the quantities are summed
+    CartItem = apps.get_model('store', 'CartItem')
+    duplicates = list(
+        CartItem.objects.order_by().values('cart_id', 'product_id')
+        .annotate(lines=Count('id'), keep=Min('id'), total_quantity=Sum('quantity'))
+        .filter(lines__gt=1)
+    )
+    for row in duplicates:
+        CartItem.objects.filter(pk=row['keep']).update(quantity=row['total_quantity'])
+        CartItem.objects.filter(
+            cart_id=row['cart_id'], product_id=row['product_id'],
+        ).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0019_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_product'),
+        ),
+    ]
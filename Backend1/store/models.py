@@ -1,9 +1,14 @@
 from django.db import models
+from django.utils import timezone
 # Create your models here.
 
 from django.contrib.auth.models import User
 from django.core.validators import MinLengthValidator, RegexValidator 
 
+# ** Product columns only changed by the conditional F() updates in store/stock.py
+STOCK_FIELDS = ("stock_available", "stock_reserved")
+
+
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100,unique=True)
@@ -17,11 +22,38 @@ class Product(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=3)
     image = models.ImageField(upload_to="products/",blank= True, null=True)
+    # ** thumbnails/WebP/AVIF copies of image, filled in by store/images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # ** units that can still be sold (NULL: not tracked) and units held by checkouts;
+    # ** only ever changed with conditional F() updates in store/stock.py
+    stock_available = models.PositiveIntegerField(null=True, blank=True)
+    stock_reserved = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now = True)
 
+    class Meta:
+        indexes = [
+            # ** backs the keyset pagination order of /api/products/
+            models.Index(fields=["-created_at", "-id"], name="product_created_id_idx"),
+            # ** category-filtered listings sorted by price or age (store/browse.py)
+            models.Index(fields=["category", "price"], name="product_category_price_idx"),
+            models.Index(fields=["category", "created_at"], name="product_category_created_idx"),
+            # ** the whole catalog sorted by price
+            models.Index(fields=["price"], name="product_price_idx"),
+        ]
+
     def __str__(self):
        return self.name
+
+    def save(self, *args, **kwargs):
+        # ** a full-row UPDATE would write back the stock counts read with this
+        # ** instance and undo every reservation made since; store/stock.py owns them
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in STOCK_FIELDS
+            ]
+        super().save(*args, **kwargs)
     
 class UserProfile(models.Model):
     user = models.OneToOneField( User, on_delete=models.CASCADE) 
@@ -64,6 +96,16 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # ** a customer's order history, newest first (get_user_orders)
+            models.Index(fields=["user", "created_at"], name="order_user_created_idx"),
+            # ** date-range walks of the staff order export (store/order_export.py)
+            models.Index(fields=["created_at", "id"], name="order_created_id_idx"),
+            # ** the admin's status filter, newest first
+            models.Index(fields=["status", "created_at"], name="order_status_created_idx"),
+        ]
+
     def __str__(self):
         return f"Order {self.id} - {self.full_name or self.user.username}"
 
@@ -76,22 +118,46 @@ class OrderItem(models.Model):
     def __str__(self):
         return(f"{self.quantity}*{self.product.name}")
 
+class StockReservation(models.Model):
+    """Units of one product held by a checkout, see store/stock.py."""
+    hold = models.UUIDField(db_index=True)
+    product = models.ForeignKey(Product, related_name="reservations", on_delete=models.CASCADE)
+    order = models.ForeignKey(Order, related_name="reservations", null=True, blank=True, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    # ** NULL once the order is placed; until then the hold lapses at this time
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["expires_at"], name="stockreservation_expiry_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} X {self.product_id} held by {self.order_id or self.hold}"
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    # ** guest carts belong to the visitor holding the signed cookie with this key
+    session_key = models.CharField(max_length=64, null=True, blank=True, unique=True)
+    # ** running aggregates over the lines, maintained by store/carts.py
+    item_count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=3, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return(f"Cart {self.id} for {self.user}")
 
-    @property
-    def total(self):
-        return sum(item.subtotal for item in self.items.all())
-
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name="items", on_delete=models.CASCADE )
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            # ** one line per product; adding again raises the quantity
+            models.UniqueConstraint(fields=["cart", "product"], name="unique_cart_product"),
+        ]
+
     def __str__(self):
         return (f"{self.quantity} X {self.product}") 
     
@@ -107,3 +173,77 @@ class Wishlist(models.Model):
     def __str__(self):
         return f"Wishlist for {self.user.username}"
 
+
+class SearchTerm(models.Model):
+    """One normalized token in the product search vocabulary."""
+    term = models.CharField(max_length=64, unique=True)
+    length = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            # ** narrows typo-tolerant candidates to terms of a similar length
+            models.Index(fields=["length", "term"], name="searchterm_length_term_idx"),
+        ]
+
+    def __str__(self):
+        return self.term
+
+class SearchPosting(models.Model):
+    """Inverted index entry: how strongly a term describes a product."""
+    term = models.ForeignKey(SearchTerm, related_name="postings", on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name="search_postings", on_delete=models.CASCADE)
+    weight = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["term", "product"], name="unique_search_posting"),
+        ]
+
+    def __str__(self):
+        return f"{self.term_id} -> {self.product_id} ({self.weight})"
+
+class OutboxEmail(models.Model):
+    """Email queued in the same transaction as the change that triggered it
+    and delivered later by the ``send_outbox_emails`` worker."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True, default='')
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # ** the worker's "due pending rows" scan
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_status_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """A client-chosen request key and the response it produced, see store/idempotency.py."""
+    # ** sha256 of caller, endpoint and key
+    lookup = models.CharField(max_length=64, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    # ** NULL while the first request is still running
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True, default="")
+    body = models.BinaryField(default=b"")
+    cookies = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Idempotency key {self.lookup[:12]} ({self.status_code or 'pending'})"
@@ -0,0 +1,193 @@
+"""Streaming order export for finance and operations.
+
+One row per order line, oldest order first; an order without lines still
+gets a row with empty line columns. Orders are read in keyset chunks on
+``(created_at, id)`` and each chunk's lines, joined with their product
+names, in one more query, so only one chunk is in memory at a time however
+many orders match. Keyset chunks rather than one long ``.iterator()``:
+MySQLdb buffers a whole result set client side, and short queries do not
+hold a read view open for the length of a download. Exports read from a
+replica when ``STORE_DB_REPLICAS`` has any.
+"""
+import csv
+import json
+import random
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Order, OrderItem
+from .routers import PRIMARY, replicas
+
+FIELDS = (
+    "order_id", "created_at", "status", "username", "full_name", "phone", "address", "payment_method",
+    "order_total", "product_id", "product_name", "quantity", "price", "line_total",
+)
+ORDER_VALUES = (
+    "id", "created_at", "status", "user__username", "full_name", "phone", "address", "payment_method",
+    "total_amount",
+)
+LINE_VALUES = ("order_id", "product_id", "product__name", "quantity", "price")
+FORMATS = ("csv", "jsonl")
+CONTENT_TYPES = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson; charset=utf-8"}
+CHUNK_SIZE = getattr(settings, "ORDER_EXPORT_CHUNK_SIZE", 500)
+STATUSES = [value for value, _ in Order.STATUS_CHOICES]
+# ** free-text columns a spreadsheet could read as a formula; the numeric ones stay as they are
+TEXT_FIELDS = frozenset(("username", "full_name", "phone", "address", "payment_method", "product_name"))
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+class OrderExportError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _moment(params, name, end=False):
+    """An aware datetime from an ISO date or datetime; a bare ``until`` date includes that day."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        # ** dates first: parse_datetime would read a bare date as its midnight
+        day = parse_date(value)
+        moment = None if day else parse_datetime(value)
+    except ValueError:
+        moment = day = None
+    if day is not None:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    if moment is None:
+        raise OrderExportError(f"{name} must be an ISO date or datetime")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_filters(params):
+    """Validated ``{"since", "until", "status", "format"}``; ``until`` is exclusive."""
+    statuses = [value for value in (params.get("status") or "").split(",") if value]
+    unknown = [value for value in statuses if value not in STATUSES]
+    if unknown:
+        raise OrderExportError(f"status must be one of {', '.join(STATUSES)}")
+    fmt = params.get("format") or "csv"
+    if fmt not in FORMATS:
+        raise OrderExportError(f"format must be one of {', '.join(FORMATS)}")
+    filters = {
+        "since": _moment(params, "since"),
+        "until": _moment(params, "until", end=True),
+        "status": statuses,
+        "format": fmt,
+    }
+    if filters["since"] and filters["until"] and filters["since"] >= filters["until"]:
+        raise OrderExportError("since must be before until")
+    return filters
+
+
+def filtered_orders(filters):
+    orders = Order.objects.all()
+    if filters["since"]:
+        orders = orders.filter(created_at__gte=filters["since"])
+    if filters["until"]:
+        orders = orders.filter(created_at__lt=filters["until"])
+    if filters["status"]:
+        orders = orders.filter(status__in=filters["status"])
+    return orders
+
+
+def export_alias():
+    pool = replicas()
+    return random.choice(pool) if pool else PRIMARY
+
+
+def _chunks(orders, chunk_size):
+    last = None
+    while True:
+        page = orders
+        if last is not None:
+            # ** the plain >= bound lets the index range start at the last row read
+            page = page.filter(created_at__gte=last[0]).filter(
+                Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1])
+            )
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last = (chunk[-1][1], chunk[-1][0])
+
+
+def _text(value):
+    return "" if value is None else str(value)
+
+
+def _cell(name, value):
+    text = _text(value)
+    if name in TEXT_FIELDS and text.startswith(FORMULA_PREFIXES):
+        return "'" + text
+    return text
+
+
+def export_rows(filters, chunk_size=CHUNK_SIZE, using=None):
+    """One dict per order line, ``chunk_size`` orders at a time."""
+    using = using or export_alias()
+    orders = (
+        filtered_orders(filters).using(using)
+        .order_by("created_at", "id")
+        .values_list(*ORDER_VALUES)
+    )
+    for chunk in _chunks(orders, chunk_size):
+        lines = defaultdict(list)
+        items = (
+            OrderItem.objects.using(using)
+            .filter(order_id__in=[order[0] for order in chunk])
+            .order_by("order_id", "id")
+            .values_list(*LINE_VALUES)
+        )
+        for order_id, *line in items:
+            lines[order_id].append(line)
+        for order_id, created_at, status, username, full_name, phone, address, payment, total in chunk:
+            head = {
+                "order_id": order_id,
+                "created_at": created_at.isoformat(),
+                "status": status,
+                "username": username,
+                "full_name": full_name,
+                "phone": phone,
+                "address": address,
+                "payment_method": payment,
+                "order_total": _text(total),
+            }
+            for product_id, product_name, quantity, price in lines.get(order_id) or [(None, "", None, None)]:
+                yield {
+                    **head,
+                    "product_id": product_id,
+                    "product_name": product_name,
+                    "quantity": quantity,
+                    "price": _text(price),
+                    "line_total": _text(price * quantity if price is not None else None),
+                }
+
+
+class _Echo:
+    """csv.writer target that hands each formatted row straight back."""
+
+    def write(self, value):
+        return value
+
+
+def render(rows, fmt):
+    """Encoded pieces of the export, one per row after the CSV header.
+
+    CSV text cells that a spreadsheet would run as a formula get a leading ``'``.
+    """
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(FIELDS)
+        for row in rows:
+            yield writer.writerow([_cell(name, row[name]) for name in FIELDS])
+        return
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
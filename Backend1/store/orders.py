@@ -0,0 +1,41 @@
+"""Order history queries shared by the sync and async views."""
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .fastser import order_plan, order_summary_plan
+from .models import Order, OrderItem
+
+LINE_TOTAL = DecimalField(max_digits=12, decimal_places=3)
+
+
+def wants_summary(params):
+    return params.get("summary", "").lower() in ("1", "true", "yes")
+
+
+def _lines(aggregate, output_field):
+    lines = OrderItem.objects.filter(order=OuterRef("pk")).order_by().values("order")
+    return Subquery(lines.annotate(value=aggregate).values("value"), output_field=output_field)
+
+
+def with_line_totals(orders):
+    """Annotate item/line counts and the line total in the same query.
+
+    Correlated subqueries rather than a join + GROUP BY, so a page of orders
+    is still read straight off the (user, created_at) index, in order.
+    """
+    return orders.annotate(
+        item_count=Coalesce(_lines(Sum("quantity"), IntegerField()), Value(0)),
+        line_count=Coalesce(_lines(Count("id"), IntegerField()), Value(0)),
+        items_total=Coalesce(
+            _lines(Sum(F("quantity") * F("price"), output_field=LINE_TOTAL), LINE_TOTAL),
+            Value(0), output_field=LINE_TOTAL,
+        ),
+    )
+
+
+def order_history(user, summary=False):
+    """(plan, queryset) for ``user``'s orders, full or summarized."""
+    orders = Order.objects.filter(user=user)
+    if summary:
+        return order_summary_plan, with_line_totals(orders)
+    return order_plan, orders
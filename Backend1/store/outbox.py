@@ -0,0 +1,91 @@
+"""Transactional email outbox.
+
+Views call ``enqueue_email`` inside their transaction, so the email exists
+exactly when the order does and no request ever waits on SMTP. The
+``send_outbox_emails`` command drains due rows in batches over one SMTP
+session per busy spell (closed while it waits for more), retrying failures with exponential backoff and dead-lettering
+rows that keep failing.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+MAX_ATTEMPTS = getattr(settings, "OUTBOX_MAX_ATTEMPTS", 5)
+BACKOFF_SECONDS = getattr(settings, "OUTBOX_BACKOFF_SECONDS", 30)
+MAX_BACKOFF_SECONDS = getattr(settings, "OUTBOX_MAX_BACKOFF_SECONDS", 60 * 60)
+# ** claimed rows are pushed this far into the future while a worker sends them
+LEASE_SECONDS = getattr(settings, "OUTBOX_LEASE_SECONDS", 5 * 60)
+
+
+def enqueue_email(subject, body, recipients, from_email=None):
+    if not recipients:
+        return None
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL or '',
+        recipients=list(recipients),
+    )
+
+
+def backoff(attempts):
+    return timedelta(seconds=min(BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+
+def claim_batch(batch_size):
+    """Lease up to ``batch_size`` due rows so concurrent workers skip them."""
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        if rows:
+            OutboxEmail.objects.filter(pk__in=[row.pk for row in rows]).update(
+                next_attempt_at=now + timedelta(seconds=LEASE_SECONDS)
+            )
+    return rows
+
+
+def send_batch(connection, batch_size):
+    """Send one batch over ``connection``; return (sent, failed) counts."""
+    rows = claim_batch(batch_size)
+    sent = []
+    failed = 0
+    for row in rows:
+        message = EmailMessage(
+            subject=row.subject,
+            body=row.body,
+            from_email=row.from_email or None,
+            to=row.recipients,
+            connection=connection,
+        )
+        try:
+            message.send()
+        except Exception as exc:
+            failed += 1
+            _record_failure(row, exc)
+            # ** drop a possibly broken SMTP session; the next send reopens it
+            connection.close()
+        else:
+            sent.append(row.pk)
+
+    if sent:
+        OutboxEmail.objects.filter(pk__in=sent).update(status='sent', sent_at=timezone.now(), last_error='')
+    return len(sent), failed
+
+
+def _record_failure(row, exc):
+    attempts = row.attempts + 1
+    changes = {"attempts": attempts, "last_error": f"{type(exc).__name__}: {exc}"}
+    if attempts >= MAX_ATTEMPTS:
+        changes["status"] = 'dead'
+    else:
+        changes["next_attempt_at"] = timezone.now() + backoff(attempts)
+    OutboxEmail.objects.filter(pk=row.pk).update(**changes)
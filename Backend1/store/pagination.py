@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+
+class ProductCursorPagination(CursorPagination):
+    """Keyset pagination for the catalog, newest products first.
+
+    DRF's cursor holds only the created_at of the page boundary plus an
+    offset past the rows that share it; -id just makes ties sort stably. A
+    page is then one range query on the (created_at, id) index that skips at
+    most those ties, however deep the client has paged.
+    """
+    ordering = ("-created_at", "-id")
+    page_size = getattr(settings, "PRODUCTS_PAGE_SIZE", 24)
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "PRODUCTS_MAX_PAGE_SIZE", 100)
+
+
+def wants_cursor_page(request):
+    """Cursor pagination is opt-in so existing list clients keep working."""
+    params = request.query_params
+    return "cursor" in params or "page_size" in params
+
+
+class WishlistCursorPagination(CursorPagination):
+    """Wishlist products, most recently added first (by through-table id)."""
+    ordering = ("-id",)
+    page_size = getattr(settings, "WISHLIST_PAGE_SIZE", 24)
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "WISHLIST_MAX_PAGE_SIZE", 100)
+
+
+class OrderCursorPagination(CursorPagination):
+    """A customer's order history, newest first."""
+    ordering = ("-created_at", "-id")
+    page_size = getattr(settings, "ORDERS_PAGE_SIZE", 20)
+    page_size_query_param = "page_size"
+    max_page_size = getattr(settings, "ORDERS_MAX_PAGE_SIZE", 100)
+
+
+def estimated_rows(queryset):
+    """The planner's row estimate for ``queryset``'s table, or None where there is none."""
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "mysql":
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+        elif connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] and row[0] > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Admin changelist paginator that skips ``COUNT(*)`` over a whole huge table.
+
+    An unfiltered list reports the planner's estimate once it is above
+    ``ADMIN_ESTIMATED_COUNT_THRESHOLD`` rows; filtered lists, and small
+    tables where the estimate is loose and counting is cheap, still count.
+    """
+    threshold = getattr(settings, "ADMIN_ESTIMATED_COUNT_THRESHOLD", 100_000)
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, "query") and not queryset.query.where:
+            estimate = estimated_rows(queryset)
+            if estimate is not None and estimate >= self.threshold:
+                return estimate
+        return super().count
@@ -0,0 +1,103 @@
+"""EXPLAIN every query a hot endpoint runs and flag full scans and filesorts.
+
+``capture_plans`` drives load-test scenarios (``store/loadtest.py``) through
+the test client, records their SQL and asks the database for the plan of
+each SELECT. ``plan_problems`` understands SQLite's ``EXPLAIN QUERY PLAN``
+and MySQL's ``EXPLAIN`` and reports, per query, a table read without an
+index or a sort the planner has to do itself. ``check_query_plans`` runs it
+against the configured database and the test suite against SQLite.
+"""
+import re
+from dataclasses import dataclass, field
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .loadtest import SCENARIOS, Session
+from .throttling import unthrottled
+
+# ** endpoints whose every query must be index-driven
+HOT_SCENARIOS = {
+    "get-product-detail": ("detail",),
+    "get-products": ("page", "browse"),
+    "get-carts": ("view",),
+    "get-add-carts": ("add",),
+    "update-cart-quantity": ("increase",),
+    "get-wishlist": ("ids",),
+    "get-wishlist-products": ("cards",),
+    "create-order": ("checkout",),
+    "get-user-orders": ("page", "summary"),
+    "get-order-detail": ("detail",),
+}
+
+# ** tables small enough that reading all of them is the right plan
+SCAN_OK = frozenset({"store_category", "django_content_type"})
+
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+_SQLITE_TEMP_SORT = re.compile(r"USE TEMP B-TREE FOR (?:ORDER BY|.*GROUP BY|DISTINCT)")
+
+
+@dataclass
+class QueryPlan:
+    scenario: str
+    sql: str
+    plan: list
+    problems: list = field(default_factory=list)
+
+
+def explain(sql, params=None, using=connection):
+    with using.cursor() as cursor:
+        if using.vendor == "sqlite":
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute(f"EXPLAIN {sql}", params)
+        columns = [column[0].lower() for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _alias_tables(sql):
+    """alias -> table for the ``FROM``/``JOIN`` clauses of ``sql``."""
+    return {
+        (alias or table): table
+        for table, alias in re.findall(r'(?:FROM|JOIN)\s+[`"]?(\w+)[`"]?(?:\s+(?:AS\s+)?[`"]?(\w+)[`"]?)?', sql)
+    }
+
+
+def plan_problems(plan, vendor, sql=""):
+    """Human readable full-scan/filesort findings for one plan."""
+    problems = []
+    if vendor == "sqlite":
+        aliases = _alias_tables(sql)
+        for detail in plan:
+            scan = _SQLITE_SCAN.match(detail)
+            if scan and aliases.get(scan.group(1), scan.group(1)) not in SCAN_OK:
+                problems.append(f"full scan: {detail}")
+            elif _SQLITE_TEMP_SORT.search(detail):
+                problems.append(f"sort without index: {detail}")
+        return problems
+    for row in plan:
+        table = row.get("table") or ""
+        if row.get("type") == "ALL" and table not in SCAN_OK and not table.startswith("<"):
+            problems.append(f"full scan of {table}")
+        if "filesort" in (row.get("extra") or ""):
+            problems.append(f"filesort on {table}")
+    return problems
+
+
+def capture_plans(dataset, scenarios=None, using=connection):
+    """Run each (url name, label) once and EXPLAIN the SELECTs it issued."""
+    plans = []
+    session = Session(dataset, 0)
+    with unthrottled():
+        for name, labels in (scenarios or HOT_SCENARIOS).items():
+            for label in labels:
+                call = SCENARIOS[name][label](session, 0)
+                with CaptureQueriesContext(using) as queries:
+                    session.send(call)
+                for query in queries.captured_queries:
+                    sql = query["sql"]
+                    if not sql.lstrip().upper().startswith("SELECT"):
+                        continue
+                    plan = explain(sql, using=using)
+                    plans.append(QueryPlan(f"{name}:{label}", sql, plan, plan_problems(plan, using.vendor, sql)))
+    return plans
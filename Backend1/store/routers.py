@@ -0,0 +1,152 @@
+"""Read-replica routing.
+
+``ReplicaRoutingMiddleware`` marks requests to the read-only catalog and
+order views as replica-safe; for those requests only, ``ReplicaRouter``
+sends reads of the catalog/order tables to one replica chosen per request.
+Everything else (writes, auth, carts, reads inside other views) stays on
+``default``.
+
+Read-your-writes: a successful unsafe request pins its token to the primary
+for ``DB_REPLICA_STICKY_SECONDS``, and a catalog change pins all catalog
+reads the same way, so neither a customer's fresh order nor a catalog
+cache refill can come from a replica that has not caught up yet.
+"""
+import hashlib
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+
+PRIMARY = "default"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# ** URL names whose reads may be served by a replica
+CATALOG_VIEWS = frozenset({
+    "get-products", "get-product-detail", "get-categories",
+    "async-get-products", "async-get-product-detail", "async-get-categories",
+})
+ORDER_VIEWS = frozenset({
+    "get-user-orders", "get-order-detail", "async-get-user-orders",
+})
+# ** tables those views read; auth, carts and the rest always use the primary
+REPLICA_MODELS = frozenset({
+    "store.category", "store.product", "store.order", "store.orderitem",
+    "store.searchterm", "store.searchposting",
+})
+
+CATALOG_PIN_KEY = "store:db:pin:catalog"
+
+
+class _RoutingState:
+    __slots__ = ("alias",)
+
+    def __init__(self):
+        self.alias = None
+
+
+# ** a mutable holder set once per request, so process_view can fill it in
+# ** even when Django runs that hook in a thread with a copied context
+_state = ContextVar("store_db_routing", default=None)
+
+
+def replicas():
+    return getattr(settings, "STORE_DB_REPLICAS", [])
+
+
+def sticky_seconds():
+    return getattr(settings, "DB_REPLICA_STICKY_SECONDS", 5)
+
+
+def _pins():
+    return caches[getattr(settings, "DB_REPLICA_PIN_CACHE_ALIAS", "default")]
+
+
+def _token_pin_key(request):
+    header = request.headers.get("Authorization", "")
+    if not header.startswith("Token "):
+        return None
+    return "store:db:pin:" + hashlib.sha1(header.encode()).hexdigest()
+
+
+def pin_catalog():
+    """Serve catalog reads from the primary until replicas have the change."""
+    if replicas():
+        _pins().set(CATALOG_PIN_KEY, 1, sticky_seconds())
+
+
+def current_read_alias():
+    state = _state.get()
+    return state.alias if state is not None else None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = current_read_alias()
+        if alias is None or model._meta.label_lower not in REPLICA_MODELS:
+            return PRIMARY
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # ** every alias holds the same data
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """Choose the replica for safe requests to read views; pin after writes."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _state.set(_RoutingState())
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        self.remember_write(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = _state.set(_RoutingState())
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        self.remember_write(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _state.get()
+        pool = replicas()
+        if state is None or not pool or request.method not in SAFE_METHODS:
+            return None
+        name = request.resolver_match.url_name
+        if name in CATALOG_VIEWS:
+            pinned = _pins().get(CATALOG_PIN_KEY)
+        elif name in ORDER_VIEWS:
+            key = _token_pin_key(request)
+            pinned = key is not None and _pins().get(key)
+        else:
+            return None
+        if not pinned:
+            state.alias = random.choice(pool)
+        return None
+
+    def remember_write(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400 or not replicas():
+            return
+        key = _token_pin_key(request)
+        if key is not None:
+            _pins().set(key, 1, sticky_seconds())
@@ -0,0 +1,260 @@
+"""Inverted-index product search.
+
+Products are tokenized over name, category name and description into
+``SearchTerm``/``SearchPosting`` rows. A query is resolved term by term
+(exact, prefix and typo-tolerant matches against the vocabulary) and the
+matching postings are ranked with a single aggregate query, so the cost
+follows the number of matching postings rather than the catalog size.
+"""
+import math
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import reset_queries
+from django.db.models import Case, F, FloatField, IntegerField, Max, Sum, Value, When
+
+from .catalog_cache import invalidate_catalog
+from .models import Product, SearchPosting, SearchTerm
+
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "description": 1.0}
+
+EXACT_FACTOR = 1.0
+PREFIX_FACTOR = 0.6
+FUZZY_FACTOR = 0.4
+
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TOKENS = 8
+PREFIX_EXPANSIONS = 50
+FUZZY_CANDIDATES = 500
+
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in",
+    "is", "it", "of", "on", "or", "the", "to", "with",
+})
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+INDEX_BATCH_SIZE = getattr(settings, "SEARCH_INDEX_BATCH_SIZE", 500)
+
+
+def normalize(text):
+    """Lowercase and strip accents so "Café" and "cafe" index the same."""
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text):
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in TOKEN_RE.findall(normalize(text))
+        if token not in STOPWORDS
+    ]
+
+
+def term_weights(product, category_name):
+    """Map every term of a product to its field-weighted, log-damped score."""
+    weights = {}
+    for field, text in (
+        ("name", product.name),
+        ("category", category_name),
+        ("description", product.description),
+    ):
+        counts = {}
+        for token in tokenize(text):
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            weights[token] = weights.get(token, 0.0) + FIELD_WEIGHTS[field] * (1 + math.log(count))
+    return weights
+
+
+def _term_ids(terms):
+    """Return {term: id}, creating missing vocabulary rows in bulk."""
+    ids = dict(SearchTerm.objects.filter(term__in=terms).values_list("term", "id"))
+    missing = [term for term in terms if term not in ids]
+    if missing:
+        SearchTerm.objects.bulk_create(
+            [SearchTerm(term=term, length=len(term)) for term in missing],
+            ignore_conflicts=True,
+        )
+        ids.update(SearchTerm.objects.filter(term__in=missing).values_list("term", "id"))
+    return ids
+
+
+def index_products(products):
+    """(Re)index a batch of products with a fixed number of queries."""
+    products = list(products)
+    if not products:
+        return
+    per_product = {p.id: term_weights(p, p.category.name) for p in products}
+    terms = set()
+    for weights in per_product.values():
+        terms.update(weights)
+    ids = _term_ids(sorted(terms))
+
+    SearchPosting.objects.filter(product_id__in=per_product).delete()
+    SearchPosting.objects.bulk_create(
+        [
+            SearchPosting(term_id=ids[term], product_id=product_id, weight=weight)
+            for product_id, weights in per_product.items()
+            for term, weight in weights.items()
+        ],
+        batch_size=INDEX_BATCH_SIZE,
+    )
+
+
+def index_product(product):
+    index_products([product])
+
+
+def reindex_category(category):
+    """Category names are indexed on their products, so refresh all of them."""
+    products = Product.objects.filter(category=category).select_related("category").order_by("id")
+    _index_in_batches(products)
+
+
+def reindex_products(queryset):
+    """(Re)index every product of ``queryset``, a batch at a time."""
+    return _index_in_batches(queryset.select_related("category").order_by("id"))
+
+
+def rebuild_index():
+    """Drop the whole index and rebuild it from the catalog."""
+    SearchPosting.objects.all().delete()
+    SearchTerm.objects.all().delete()
+    products = Product.objects.select_related("category").order_by("id")
+    indexed = _index_in_batches(products)
+    invalidate_catalog()
+    return indexed
+
+
+def _index_in_batches(queryset):
+    indexed = 0
+    batch = []
+    for product in queryset.iterator(chunk_size=INDEX_BATCH_SIZE):
+        batch.append(product)
+        if len(batch) == INDEX_BATCH_SIZE:
+            index_products(batch)
+            indexed += len(batch)
+            batch = []
+            reset_queries()  # ** keeps DEBUG's query log from growing over a full rebuild
+    index_products(batch)
+    return indexed + len(batch)
+
+
+def edit_distance(a, b, limit):
+    """Edit distance counting adjacent swaps as one typo (optimal string
+    alignment), giving up early once it exceeds ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb),
+            )
+            if before and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+def _typo_limit(token):
+    if len(token) < 4:
+        return 0
+    return 1 if len(token) < 8 else 2
+
+
+def _prefix_range(prefix):
+    # ** a plain range instead of LIKE so MySQL and SQLite both seek the index
+    return {"term__gte": prefix, "term__lt": prefix + "\uffff"}
+
+
+def match_terms(token):
+    """Resolve one query token to {term_id: factor} over the vocabulary."""
+    matches = {}
+    exact_and_prefix = (
+        SearchTerm.objects.filter(**_prefix_range(token))
+        .order_by("length", "term")
+        .values_list("id", "term")[:PREFIX_EXPANSIONS]
+    )
+    for term_id, term in exact_and_prefix:
+        matches[term_id] = EXACT_FACTOR if term == token else PREFIX_FACTOR
+
+    limit = _typo_limit(token)
+    if limit:
+        candidates = (
+            SearchTerm.objects.filter(
+                length__range=(len(token) - limit, len(token) + limit),
+                **_prefix_range(token[0]),
+            )
+            .values_list("id", "term")[:FUZZY_CANDIDATES]
+        )
+        for term_id, term in candidates:
+            if term_id not in matches and edit_distance(token, term, limit) <= limit:
+                matches[term_id] = FUZZY_FACTOR
+    return matches
+
+
+def search_products(query, limit=None, products=None, order_by=None):
+    """Return product ids matching every query token, best match first.
+
+    ``products`` narrows the matches (browse filters) before ``limit`` cuts
+    the list, so a filtered search still finds matches ranked low overall;
+    ``order_by`` sorts the matches by those product fields instead of by
+    relevance.
+    """
+    tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return []
+
+    groups = []
+    for token in tokens:
+        matches = match_terms(token)
+        if not matches:
+            return []
+        groups.append(matches)
+
+    factors = {}
+    for matches in groups:
+        for term_id, factor in matches.items():
+            factors[term_id] = max(factor, factors.get(term_id, 0.0))
+
+    factor = Case(
+        *[When(term_id=term_id, then=Value(f)) for term_id, f in factors.items()],
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    # ** one flag per token: a product must match all of them
+    coverage = {
+        f"token_{i}": Max(Case(
+            When(term_id__in=list(matches), then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+        for i, matches in enumerate(groups)
+    }
+    postings = SearchPosting.objects.filter(term_id__in=list(factors))
+    if products is not None and not order_by:
+        postings = postings.filter(product_id__in=products.order_by().values("pk"))
+    ranked = (
+        postings.values("product_id")
+        .annotate(score=Sum(F("weight") * factor), **coverage)
+        .filter(**{name: 1 for name in coverage})
+    )
+    if order_by:
+        ranked = (products if products is not None else Product.objects.all()).filter(
+            pk__in=ranked.values("product_id")
+        ).order_by(*order_by).values_list("pk", flat=True)
+    else:
+        ranked = ranked.order_by("-score", "product_id").values_list("product_id", flat=True)
+    if limit:
+        ranked = ranked[:limit]
+    return list(ranked)
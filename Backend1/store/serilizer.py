@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Category, Product, Cart, CartItem, Order, OrderItem
+from .images import variant_urls
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -9,19 +10,28 @@ class CategorySerializer(serializers.ModelSerializer):
 
 class ProductSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
+    image_variants = serializers.SerializerMethodField()
+
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image_variants)
 
     class Meta:
         model = Product 
-        fields = "__all__" 
+        # ** stock changes on every checkout and must not invalidate the catalog cache
+        exclude = ("stock_available", "stock_reserved")
 
 class CartItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source="product.name", read_only=True)
     product_price = serializers.DecimalField(source="product.price", max_digits=10, decimal_places=3, read_only=True)
     product_image = serializers.ImageField(source="product.image", read_only=True)
+    product_image_variants = serializers.SerializerMethodField()
+
+    def get_product_image_variants(self, obj):
+        return variant_urls(obj.product.image_variants)
 
     class Meta:
         model = CartItem
-        fields = ["id", "product_name", "product_price", "product_image", "quantity"]
+        fields = ["id", "product_name", "product_price", "product_image", "product_image_variants", "quantity"]
 
 class CartSerializer(serializers.ModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
@@ -29,7 +39,7 @@ class CartSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Cart
-        fields = "__all__"
+        exclude = ("session_key",)
 
 from django.contrib.auth.models import User
 
@@ -66,4 +76,17 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'user', 'total_amount', 'full_name', 'phone', 'address', 'order_notes', 'payment_method', 'status', 'created_at', 'updated_at', 'items'
         ]
-        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+
+
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """Order header plus line aggregates annotated in SQL (see store.orders)."""
+    item_count = serializers.IntegerField(read_only=True)
+    line_count = serializers.IntegerField(read_only=True)
+    items_total = serializers.DecimalField(max_digits=12, decimal_places=3, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'total_amount', 'payment_method', 'status', 'created_at', 'updated_at', 'item_count', 'line_count', 'items_total'
+        ]
@@ -0,0 +1,113 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import search, stock
+from .auth_cache import token_cache
+from .carts import carts_containing, recompute_totals
+from .images import needs_variants, schedule_variants
+from .catalog_cache import invalidate_catalog
+from .models import Cart, Category, Order, Product
+
+
+@receiver(post_save, sender=Product, dispatch_uid="store.index_product")
+def index_saved_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_product(instance)
+
+
+@receiver(post_save, sender=Category, dispatch_uid="store.reindex_category")
+def reindex_saved_category(sender, instance, created=False, raw=False, **kwargs):
+    # ** a new category has no products yet; a renamed one changes their terms
+    if raw or created:
+        return
+    search.reindex_category(instance)
+
+
+@receiver(post_save, sender=Product, dispatch_uid="store.invalidate_product_save")
+@receiver(post_delete, sender=Product, dispatch_uid="store.invalidate_product_delete")
+@receiver(post_save, sender=Category, dispatch_uid="store.invalidate_category_save")
+@receiver(post_delete, sender=Category, dispatch_uid="store.invalidate_category_delete")
+def invalidate_catalog_cache(sender, **kwargs):
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Token, dispatch_uid="store.evict_token_save")
+@receiver(post_delete, sender=Token, dispatch_uid="store.evict_token_delete")
+def evict_cached_token(sender, instance, **kwargs):
+    token_cache.invalidate_key(instance.key)
+
+
+@receiver(post_save, sender=User, dispatch_uid="store.evict_user_save")
+@receiver(post_delete, sender=User, dispatch_uid="store.evict_user_delete")
+def evict_cached_user(sender, instance, **kwargs):
+    token_cache.invalidate_user(instance.pk)
+
+
+@receiver(pre_save, sender=Product, dispatch_uid="store.remember_product_price")
+def remember_product_price(sender, instance, raw=False, **kwargs):
+    instance._previous_price = None
+    if not raw and instance.pk:
+        instance._previous_price = (
+            Product.objects.filter(pk=instance.pk).values_list("price", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Product, dispatch_uid="store.reprice_carts")
+def reprice_carts(sender, instance, created=False, raw=False, **kwargs):
+    previous = getattr(instance, "_previous_price", None)
+    if raw or created or previous is None or previous == instance.price:
+        return
+    recompute_totals(carts_containing(instance))
+
+
+@receiver(pre_delete, sender=Product, dispatch_uid="store.remember_product_carts")
+def remember_product_carts(sender, instance, **kwargs):
+    instance._cart_ids = list(carts_containing(instance).values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Product, dispatch_uid="store.recompute_product_carts")
+def recompute_product_carts(sender, instance, **kwargs):
+    # ** the cart lines went with the product, so the aggregates must follow
+    cart_ids = getattr(instance, "_cart_ids", None)
+    if cart_ids:
+        recompute_totals(Cart.objects.filter(pk__in=cart_ids))
+
+
+@receiver(post_save, sender=Product, dispatch_uid="store.render_image_variants")
+def render_image_variants(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if needs_variants(instance):
+        transaction.on_commit(lambda: schedule_variants(instance))
+    elif not instance.image and instance.image_variants:
+        Product.objects.filter(pk=instance.pk).update(image_variants={})
+
+
+@receiver(pre_save, sender=Order, dispatch_uid="store.remember_order_status")
+def remember_order_status(sender, instance, raw=False, **kwargs):
+    instance._previous_status = None
+    if not raw and instance.pk:
+        instance._previous_status = (
+            Order.objects.filter(pk=instance.pk).values_list("status", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Order, dispatch_uid="store.settle_order_stock")
+def settle_order_stock(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, "_previous_status", None)
+    if raw or previous is None or previous == instance.status:
+        return
+    # ** cancelled orders put their units back; shipped ones take them off the shelf
+    if instance.status == "cancelled":
+        stock.release(instance.reservations.all())
+    elif instance.status in ("shipped", "delivered"):
+        stock.consume(instance.reservations.all())
+
+
+@receiver(pre_delete, sender=Order, dispatch_uid="store.release_deleted_order_stock")
+def release_deleted_order_stock(sender, instance, **kwargs):
+    stock.release(instance.reservations.all())
@@ -0,0 +1,127 @@
+"""Stock reservation without long-held row locks.
+
+``Product.stock_available`` is what can still be sold and
+``Product.stock_reserved`` what has been promised to checkouts. ``reserve``
+moves units from one to the other with a single conditional UPDATE
+(``... WHERE stock_available >= quantity``) in its own short transaction, so
+a product row is only locked for that one statement and never while an
+order is being written. Each hold is a ``StockReservation`` row: it is
+attached to the order once the order commits, and held units are returned
+by ``release`` when the checkout fails, the order is cancelled or the
+reservation expires (``release_expired_reservations`` command). Products
+with ``stock_available`` NULL are not tracked and always in stock.
+"""
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.utils import timezone
+
+from .models import Product, StockReservation
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_ids):
+        super().__init__(f"Not enough stock for products {product_ids}")
+        self.product_ids = product_ids
+
+
+def reservation_seconds():
+    return getattr(settings, "STOCK_RESERVATION_SECONDS", 15 * 60)
+
+
+def _per_product(quantities):
+    """A CASE picking each product's quantity, for one UPDATE over all of them."""
+    return Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=PositiveIntegerField(),
+    )
+
+
+def reserve(quantities):
+    """Hold ``{product id: quantity}`` of tracked products; all or nothing.
+
+    Returns the key of the new hold (None for an empty mapping). Raises
+    ``OutOfStock`` naming the products that could not cover their quantity.
+    """
+    if not quantities:
+        return None
+    amount = _per_product(quantities)
+    hold = uuid.uuid4()
+    expires_at = timezone.now() + timedelta(seconds=reservation_seconds())
+    with transaction.atomic():
+        reserved = Product.objects.filter(pk__in=quantities, stock_available__gte=amount).update(
+            stock_available=F("stock_available") - amount,
+            stock_reserved=F("stock_reserved") + amount,
+        )
+        if reserved != len(quantities):
+            short = sorted(
+                Product.objects.filter(pk__in=quantities)
+                .exclude(stock_available__gte=amount)
+                .values_list("pk", flat=True)
+            )
+            # ** undoes the products that did have enough
+            transaction.set_rollback(True)
+            raise OutOfStock(short or sorted(quantities))
+        StockReservation.objects.bulk_create([
+            StockReservation(hold=hold, product_id=product_id, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in quantities.items()
+        ])
+    return hold
+
+
+def held(hold):
+    """The reservations made by one ``reserve`` call."""
+    return StockReservation.objects.filter(hold=hold)
+
+
+def attach(hold, order):
+    """Tie held units to the order they were reserved for; they no longer expire."""
+    if hold is not None:
+        held(hold).update(order=order, expires_at=None)
+
+
+def _settle(reservations, restock):
+    with transaction.atomic():
+        rows = list(reservations.select_for_update(skip_locked=True).values_list("pk", "product_id", "quantity"))
+        if not rows:
+            return 0
+        StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+        quantities = {}
+        for _, product_id, quantity in rows:
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        amount = _per_product(quantities)
+        changes = {"stock_reserved": F("stock_reserved") - amount}
+        if restock:
+            changes["stock_available"] = F("stock_available") + amount
+        Product.objects.filter(pk__in=quantities).update(**changes)
+    return len(rows)
+
+
+def release(reservations):
+    """Put the units of ``reservations`` back on sale; returns how many were released."""
+    return _settle(reservations, restock=True)
+
+
+def consume(reservations):
+    """The units of ``reservations`` have left the warehouse: drop them from reserved."""
+    return _settle(reservations, restock=False)
+
+
+def adjust(product_id, delta):
+    """Add ``delta`` (negative to remove) units to what can be sold of a tracked product.
+
+    Returns False, changing nothing, when fewer than ``-delta`` units are left.
+    """
+    products = Product.objects.filter(pk=product_id, stock_available__isnull=False)
+    if delta < 0:
+        products = products.filter(stock_available__gte=-delta)
+    return products.update(stock_available=F("stock_available") + delta) == 1
+
+
+def release_expired(now=None):
+    """Release holds of checkouts that never produced an order."""
+    expired = StockReservation.objects.filter(order__isnull=True, expires_at__lte=now or timezone.now())
+    return release(expired)
@@ -0,0 +1,94 @@
+"""An index-friendly ``date_hierarchy`` for the store's large changelists.
+
+Django's tag finds the years, months or days that have rows with one
+``SELECT DISTINCT`` over a truncated date of every matching row, a full
+scan of the table or filter. Here the first and last row are two index
+seeks and each candidate period between them is an ``exists()`` probe over
+a ``created_at`` range, so the drill-down costs at most 33 seeks however big
+the table is.
+The links and template are Django's own.
+"""
+from datetime import datetime
+
+from django import template
+from django.contrib.admin.templatetags.admin_list import date_hierarchy
+from django.contrib.admin.templatetags.base import InclusionAdminNode
+from django.db.models import Max, Min
+from django.utils import timezone
+
+register = template.Library()
+
+
+def _start(moment, kind):
+    moment = timezone.localtime(moment) if timezone.is_aware(moment) else moment
+    return datetime(moment.year, 1 if kind == "year" else moment.month, 1 if kind != "day" else moment.day)
+
+
+def _next(start, kind):
+    if kind == "year":
+        return start.replace(year=start.year + 1)
+    if kind == "month":
+        return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return datetime.fromordinal(start.toordinal() + 1)
+
+
+class ProbedDates:
+    """Stands in for ``cl.queryset`` inside Django's ``date_hierarchy``."""
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self._bounds = {}
+
+    def bounds(self, field_name):
+        """First and last value as two index seeks; one MIN/MAX query scans on some backends."""
+        if field_name not in self._bounds:
+            values = self.queryset.values_list(field_name, flat=True)
+            self._bounds[field_name] = {
+                "first": values.order_by(field_name).first(),
+                "last": values.order_by(f"-{field_name}").first(),
+            }
+        return self._bounds[field_name]
+
+    def aggregate(self, *args, **kwargs):
+        first, last = kwargs.get("first"), kwargs.get("last")
+        if not args and len(kwargs) == 2 and isinstance(first, Min) and isinstance(last, Max):
+            return self.bounds(first.source_expressions[0].name)
+        return self.queryset.aggregate(*args, **kwargs)
+
+    def dates(self, field_name, kind):
+        return self.queryset.dates(field_name, kind)
+
+    def datetimes(self, field_name, kind):
+        bounds = self.bounds(field_name)
+        if bounds["first"] is None:
+            return []
+        aware = timezone.is_aware(bounds["first"])
+        periods = []
+        start, last = _start(bounds["first"], kind), _start(bounds["last"], kind)
+        while start <= last:
+            end = _next(start, kind)
+            low, high = (timezone.make_aware(start), timezone.make_aware(end)) if aware else (start, end)
+            if self.queryset.filter(**{f"{field_name}__gte": low, f"{field_name}__lt": high}).exists():
+                periods.append(low)
+            start = end
+        return periods
+
+
+class _ProbedChangeList:
+    def __init__(self, cl):
+        self._cl = cl
+        self.queryset = ProbedDates(cl.queryset)
+
+    def __getattr__(self, name):
+        return getattr(self._cl, name)
+
+
+def probed_date_hierarchy(cl):
+    return date_hierarchy(_ProbedChangeList(cl))
+
+
+@register.tag(name="probed_date_hierarchy")
+def probed_date_hierarchy_tag(parser, token):
+    return InclusionAdminNode(
+        parser, token, func=probed_date_hierarchy, template_name="date_hierarchy.html", takes_context=False,
+    )
@@ -1,4 +1,1614 @@
-from django.test import TestCase
+import threading
+import time
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
-  
\ No newline at end of file
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection, connections
+from django.http import JsonResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Cart, CartItem, Category, Order, OutboxEmail, Product
+
+
+def make_catalog(categories=2, products=10, prefix="category"):
+    cats = [
+        Category.objects.create(name=f"{prefix.title()} {i}", slug=f"{prefix}-{i}")
+        for i in range(categories)
+    ]
+    return [
+        Product.objects.create(
+            category=cats[i % categories],
+            name=f"Product {i}",
+            description=f"Description for product {i}",
+            price=Decimal("10.000") + i,
+        )
+        for i in range(products)
+    ]
+
+
+def make_user(username="alice"):
+    from django.contrib.auth.models import User
+    from rest_framework.authtoken.models import Token
+
+    user = User.objects.create_user(username=username, email=f"{username}@example.com", password="secret-pass")
+    return user, {"HTTP_AUTHORIZATION": f"Token {Token.objects.create(user=user).key}"}
+
+
+CHECKOUT = {"full_name": "Alice Example", "phone": "9800000000", "address": "1 Main St"}
+
+
+class ProductListTests(TestCase):
+    def test_unpaginated_list_keeps_plain_shape(self):
+        make_catalog(products=3)
+        response = self.client.get(reverse("get-products"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+        self.assertIn("slug", response.json()[0]["category"])
+
+    def test_cursor_pages_walk_whole_catalog_once(self):
+        products = make_catalog(products=7)
+        seen = []
+        url = reverse("get-products") + "?page_size=3"
+        while url:
+            body = self.client.get(url).json()
+            seen.extend(item["id"] for item in body["results"])
+            url = body["next"]
+        self.assertEqual(sorted(seen), sorted(p.id for p in products))
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_previous_cursor_returns_prior_page(self):
+        make_catalog(products=5)
+        first = self.client.get(reverse("get-products") + "?page_size=2").json()
+        second = self.client.get(first["next"]).json()
+        back = self.client.get(second["previous"]).json()
+        self.assertEqual(back["results"], first["results"])
+
+    def test_page_query_count_does_not_grow_with_catalog(self):
+        make_catalog(categories=1, products=3)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse("get-products") + "?page_size=50")
+        make_catalog(categories=5, products=40, prefix="more")
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(reverse("get-products") + "?page_size=50")
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(large), 1)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.phones = Category.objects.create(name="Phones", slug="phones")
+        self.laptops = Category.objects.create(name="Laptops", slug="laptops")
+        self.galaxy = Product.objects.create(
+            category=self.phones, name="Samsung Galaxy", description="Android phone", price=Decimal("500"),
+        )
+        self.thinkpad = Product.objects.create(
+            category=self.laptops, name="ThinkPad X1", description="Business laptop with Samsung display",
+            price=Decimal("1500"),
+        )
+
+    def search(self, query):
+        return [item["id"] for item in self.client.get(reverse("get-products"), {"search": query}).json()]
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search("samsung"), [self.galaxy.id, self.thinkpad.id])
+
+    def test_category_and_description_are_searchable(self):
+        self.assertEqual(self.search("laptops"), [self.thinkpad.id])
+        self.assertEqual(self.search("android"), [self.galaxy.id])
+
+    def test_prefix_and_typo_matching(self):
+        self.assertEqual(self.search("galax"), [self.galaxy.id])
+        self.assertEqual(self.search("samsnug"), [self.galaxy.id, self.thinkpad.id])
+        self.assertEqual(self.search("thinkpda"), [self.thinkpad.id])
+
+    def test_all_tokens_must_match(self):
+        self.assertEqual(self.search("samsung laptop"), [self.thinkpad.id])
+        self.assertEqual(self.search("samsung tablet"), [])
+
+    def test_index_follows_product_and_category_changes(self):
+        self.galaxy.name = "Pixel"
+        self.galaxy.save()
+        self.assertEqual(self.search("galaxy"), [])
+        self.assertEqual(self.search("pixel"), [self.galaxy.id])
+
+        self.phones.name = "Smartphones"
+        self.phones.save()
+        self.assertEqual(self.search("smartphones"), [self.galaxy.id])
+
+        self.galaxy.delete()
+        self.assertEqual(self.search("pixel"), [])
+
+    def test_rebuild_command_restores_index(self):
+        from django.core.management import call_command
+        from .models import SearchPosting
+
+        SearchPosting.objects.all().delete()
+        self.assertEqual(self.search("thinkpad"), [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(self.search("thinkpad"), [self.thinkpad.id])
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = make_catalog(categories=1, products=2)[0]
+
+    def test_repeat_requests_skip_the_database(self):
+        first = self.client.get(reverse("get-products"))
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(reverse("get-products"))
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first["ETag"], second["ETag"])
+
+    def test_responses_that_set_cookies_are_not_cached(self):
+        from .catalog_cache import cached_catalog_response
+
+        calls = []
+
+        def view(request):
+            calls.append(request)
+            response = JsonResponse({"n": len(calls)})
+            response.set_cookie("visitor", str(len(calls)))
+            return response
+
+        cached = cached_catalog_response(view)
+        responses = [cached(RequestFactory().get("/api/categories/")) for _ in range(2)]
+        self.assertEqual([r.cookies["visitor"].value for r in responses], ["1", "2"])
+        self.assertEqual(len(calls), 2)
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(reverse("get-categories"))["ETag"]
+        response = self.client.get(reverse("get-categories"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+    def test_product_change_invalidates(self):
+        url = reverse("get-product-detail", args=[self.product.id])
+        etag = self.client.get(url)["ETag"]
+        self.product.name = "Renamed"
+        self.product.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["name"], "Renamed")
+
+    def test_errors_are_not_cached(self):
+        url = reverse("get-product-detail", args=[999])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertFalse(self.client.get(url).has_header("ETag"))
+
+    def test_concurrent_misses_build_once(self):
+        from .catalog_cache import cached_catalog_response
+
+        calls = []
+
+        @cached_catalog_response
+        def slow_view(request):
+            calls.append(1)
+            time.sleep(0.05)
+            return JsonResponse({"ok": True})
+
+        responses = []
+        factory = RequestFactory()
+        threads = [
+            threading.Thread(target=lambda: responses.append(slow_view(factory.get("/api/slow/"))))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual({r.content for r in responses}, {b'{"ok": true}'})
+
+
+class TokenUserCacheTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from rest_framework.authtoken.models import Token
+        from .auth_cache import token_cache
+
+        token_cache.clear()
+        self.cache = token_cache
+        self.user = User.objects.create_user(username="alice", password="secret-pass")
+        self.token = Token.objects.create(user=self.user)
+
+    def lookup(self):
+        from .auth_cache import user_for_token
+        return user_for_token(self.token.key)
+
+    def test_miss_is_one_joined_query_and_hit_is_free(self):
+        with CaptureQueriesContext(connection) as miss:
+            self.assertEqual(self.lookup(), self.user)
+        with CaptureQueriesContext(connection) as hit:
+            self.assertEqual(self.lookup(), self.user)
+        self.assertEqual((len(miss), len(hit)), (1, 0))
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 1, "size": 1})
+
+    def test_token_delete_and_user_change_evict(self):
+        self.lookup()
+        self.user.email = "alice@example.com"
+        self.user.save()
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+        self.lookup()
+        self.token.delete()
+        self.assertIsNone(self.lookup())
+
+    def test_lru_and_ttl_bounds(self):
+        from .auth_cache import TokenUserCache
+
+        bounded = TokenUserCache(max_size=2, ttl=60)
+        for key in ("a", "b"):
+            bounded.set(key, self.user)
+        bounded.get("a")
+        bounded.set("c", self.user)
+        self.assertIsNone(bounded.get("b"))
+        self.assertEqual(bounded.get("a"), self.user)
+
+        expired = TokenUserCache(max_size=2, ttl=0)
+        expired.set("a", self.user)
+        self.assertIsNone(expired.get("a"))
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog(products=30)
+
+    def checkout(self, lines):
+        user, auth = make_user(f"buyer{lines}")
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.bulk_create(
+            CartItem(cart=cart, product=product, quantity=2) for product in self.products[:lines]
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("create-order"), CHECKOUT, content_type="application/json", **auth)
+        self.assertEqual(response.status_code, 201)
+        return cart, response.json()["order"], len(queries)
+
+    def test_order_mirrors_cart_and_empties_it(self):
+        cart, order, _ = self.checkout(3)
+        expected = sum(2 * p.price for p in self.products[:3])
+        self.assertEqual(Decimal(order["total_amount"]), expected)
+        self.assertEqual([item["product"] for item in order["items"]], [p.id for p in self.products[:3]])
+        self.assertFalse(cart.items.exists())
+
+    def test_query_count_is_independent_of_cart_size(self):
+        _, _, one_line = self.checkout(1)
+        _, _, thirty_lines = self.checkout(30)
+        self.assertEqual(one_line, thirty_lines)
+
+    def test_empty_cart_is_rejected(self):
+        user, auth = make_user()
+        Cart.objects.create(user=user)
+        response = self.client.post(reverse("create-order"), CHECKOUT, content_type="application/json", **auth)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+@override_settings(ORDER_NOTIFICATION_RECIPIENTS=["owner@example.com"])
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        self.product = make_catalog(products=1)[0]
+
+    def place_order(self):
+        user, auth = make_user()
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        return self.client.post(reverse("create-order"), CHECKOUT, content_type="application/json", **auth)
+
+    def drain(self):
+        from django.core.management import call_command
+        call_command("send_outbox_emails", stdout=StringIO())
+
+    def test_checkout_queues_instead_of_sending(self):
+        self.assertEqual(self.place_order().status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxEmail.objects.get().status, "pending")
+
+        self.drain()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["owner@example.com"])
+        self.assertEqual(OutboxEmail.objects.get().status, "sent")
+
+    def test_loop_closes_the_connection_while_idle(self):
+        from django.core.mail.backends.locmem import EmailBackend
+        from django.core.management import call_command
+
+        from .outbox import enqueue_email
+
+        events = []
+
+        class Backend(EmailBackend):
+            def open(self):
+                events.append("open")
+
+            def close(self):
+                events.append("close")
+
+        def poll(seconds):
+            events.append("sleep")
+            if events.count("sleep") == 1:
+                enqueue_email("Another", "body", ["owner@example.com"])
+            else:
+                raise InterruptedError
+
+        self.place_order()
+        with mock.patch("store.management.commands.send_outbox_emails.get_connection", return_value=Backend()), \
+                mock.patch("store.management.commands.send_outbox_emails.time.sleep", side_effect=poll):
+            with self.assertRaises(InterruptedError):
+                call_command("send_outbox_emails", "--loop", stdout=StringIO())
+        self.assertEqual(events, ["open", "close", "sleep", "open", "close", "sleep"])
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_failures_back_off_then_dead_letter(self):
+        from .outbox import MAX_ATTEMPTS
+
+        self.place_order()
+        email = OutboxEmail.objects.get()
+        with mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages", side_effect=OSError("down")):
+            self.drain()
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts), ("pending", 1))
+            self.assertGreater(email.next_attempt_at, timezone.now())
+            self.assertIn("down", email.last_error)
+
+            for _ in range(MAX_ATTEMPTS - 1):
+                OutboxEmail.objects.update(next_attempt_at=timezone.now())
+                self.drain()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ("dead", MAX_ATTEMPTS))
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class CartAggregateTests(TestCase):
+    def setUp(self):
+        self.cheap, self.pricey = make_catalog(products=2)
+        self.user, self.auth = make_user()
+
+    def post(self, name, data):
+        return self.client.post(reverse(name), data, content_type="application/json", **self.auth)
+
+    def cart(self):
+        return Cart.objects.get(user=self.user)
+
+    def test_mutations_keep_aggregates_current(self):
+        self.post("get-add-carts", {"product_id": self.cheap.id, "quantity": 2})
+        body = self.post("get-add-carts", {"product_id": self.pricey.id}).json()["cart"]
+        self.assertEqual(body["item_count"], 3)
+        self.assertEqual(Decimal(str(body["total"])), 2 * self.cheap.price + self.pricey.price)
+
+        item = self.cart().items.get(product=self.cheap)
+        self.post("update-cart-quantity", {"item_id": item.id, "action": "decrease"})
+        self.assertEqual(self.cart().item_count, 2)
+        self.post("get-remove-carts", {"item_id": item.id})
+        cart = self.cart()
+        self.assertEqual((cart.item_count, cart.total), (1, self.pricey.price))
+
+    def test_add_to_existing_line_increments_in_the_database(self):
+        self.post("get-add-carts", {"product_id": self.cheap.id, "quantity": 2})
+        from .carts import apply_line_delta
+
+        stale = self.cart().items.get()
+        # ** a concurrent add of three lands after this request read the line
+        CartItem.objects.filter(pk=stale.pk).update(quantity=5)
+        apply_line_delta(stale.cart_id, 3, 3 * self.cheap.price)
+        with mock.patch.object(CartItem.objects, "get_or_create", return_value=(stale, False)):
+            self.post("get-add-carts", {"product_id": self.cheap.id, "quantity": 1})
+        cart = self.cart()
+        self.assertEqual((cart.items.get().quantity, cart.item_count), (6, 6))
+
+    def test_cart_view_query_count_does_not_grow_with_lines(self):
+        self.post("get-add-carts", {"product_id": self.cheap.id})
+        with CaptureQueriesContext(connection) as one_line:
+            self.client.get(reverse("get-carts"), **self.auth)
+        self.post("get-add-carts", {"product_id": self.pricey.id})
+        with CaptureQueriesContext(connection) as two_lines:
+            self.client.get(reverse("get-carts"), **self.auth)
+        self.assertEqual(len(one_line), len(two_lines))
+
+    def test_price_change_and_product_delete_recompute(self):
+        self.post("get-add-carts", {"product_id": self.cheap.id, "quantity": 2})
+        self.post("get-add-carts", {"product_id": self.pricey.id})
+        self.cheap.price = Decimal("1.500")
+        self.cheap.save()
+        self.assertEqual(self.cart().total, Decimal("3.000") + self.pricey.price)
+
+        self.pricey.delete()
+        cart = self.cart()
+        self.assertEqual((cart.item_count, cart.total), (2, Decimal("3.000")))
+
+    def test_consistency_command_repairs_drift(self):
+        from django.core.management import call_command
+
+        self.post("get-add-carts", {"product_id": self.cheap.id, "quantity": 2})
+        Cart.objects.update(item_count=9, total=0)
+        out = StringIO()
+        call_command("check_cart_totals", stdout=out)
+        self.assertIn("1 carts drifted", out.getvalue())
+        self.assertEqual(self.cart().item_count, 9)
+
+        call_command("check_cart_totals", "--fix", stdout=StringIO())
+        cart = self.cart()
+        self.assertEqual((cart.item_count, cart.total), (2, 2 * self.cheap.price))
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        import tempfile
+
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name, IMAGE_VARIANTS_SYNC=True)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.media_root = media.name
+
+    def upload(self, size=(1200, 800)):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+
+        buffer = BytesIO()
+        Image.new("RGB", size, "orange").save(buffer, "JPEG")
+        product = make_catalog(categories=1, products=1)[0]
+        product.image = SimpleUploadedFile("photo.jpg", buffer.getvalue(), content_type="image/jpeg")
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        product.refresh_from_db()
+        return product
+
+    def test_saving_an_image_renders_bounded_variants(self):
+        import os
+
+        product = self.upload()
+        card = product.image_variants["card"]
+        self.assertEqual((card["width"], card["height"]), (480, 320))
+        self.assertEqual(product.image_variants["source"], product.image.name)
+        for fmt in ("jpeg", "webp"):
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, card[fmt])))
+
+    def test_serializers_expose_variant_urls(self):
+        product = self.upload(size=(100, 100))
+        body = self.client.get(reverse("get-product-detail", args=[product.id])).json()
+        thumb = body["image_variants"]["thumb"]
+        self.assertEqual((thumb["width"], thumb["height"]), (100, 100))
+        self.assertTrue(thumb["webp"].startswith("/media/products/variants/"))
+
+        _, auth = make_user()
+        cart = self.client.post(
+            reverse("get-add-carts"), {"product_id": product.id}, content_type="application/json", **auth
+        ).json()["cart"]
+        self.assertEqual(cart["items"][0]["product_image_variants"], body["image_variants"])
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog(products=6)
+        self.user, self.auth = make_user()
+
+    def batch(self, operations, **extra):
+        return self.client.post(
+            reverse("batch-update-cart"), {"operations": operations, **extra},
+            content_type="application/json", **self.auth,
+        )
+
+    def test_mixed_operations_return_only_the_delta(self):
+        a, b, c = self.products[:3]
+        self.batch([{"op": "add", "product_id": a.id, "quantity": 2}, {"op": "add", "product_id": b.id}])
+        item_b = CartItem.objects.get(product=b)
+
+        body = self.batch([
+            {"op": "add", "product_id": a.id},
+            {"op": "remove", "item_id": item_b.id},
+            {"op": "set", "product_id": c.id, "quantity": 4},
+        ]).json()
+        self.assertEqual({(i["product_name"], i["quantity"]) for i in body["items"]}, {(a.name, 3), (c.name, 4)})
+        self.assertEqual(body["removed"], [item_b.id])
+        self.assertEqual(body["item_count"], 7)
+        self.assertEqual(Decimal(str(body["total"])), 3 * a.price + 4 * c.price)
+        self.assertNotIn("cart", body)
+
+    def test_full_cart_on_request(self):
+        body = self.batch([{"op": "add", "product_id": self.products[0].id}], full=True).json()
+        self.assertEqual(len(body["cart"]["items"]), 1)
+
+    def test_query_count_is_independent_of_batch_size(self):
+        def run(products):
+            with CaptureQueriesContext(connection) as queries:
+                self.batch([{"op": "add", "product_id": p.id} for p in products])
+            return len(queries)
+
+        run([self.products[5]])  # ** warm the token cache and create the cart
+        self.assertEqual(run(self.products[:1]), run(self.products[1:5]))
+
+    def test_invalid_batches_change_nothing(self):
+        self.assertEqual(self.batch([{"op": "explode", "product_id": 1}]).status_code, 400)
+        self.assertEqual(self.batch([{"op": "add", "product_id": self.products[0].id, "quantity": 0}]).status_code, 400)
+        for bad in ("abc", [1], {"id": 1}, 0, True, 1.5):
+            self.assertEqual(self.batch([{"op": "add", "product_id": bad}]).status_code, 400, bad)
+            self.assertEqual(self.batch([{"op": "remove", "item_id": bad}]).status_code, 400, bad)
+        response = self.batch([{"op": "add", "product_id": self.products[0].id}, {"op": "add", "product_id": 999}])
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(CartItem.objects.exists())
+
+
+class LoadTestHarnessTests(TestCase):
+    def test_every_route_has_a_scenario(self):
+        from .loadtest import uncovered_routes
+        self.assertEqual(uncovered_routes(), [])
+
+    def test_seed_and_run_within_budgets(self):
+        from django.core.management import call_command
+
+        call_command(
+            "seed_store", "--categories=2", "--products=20", "--users=2", "--carts=2", "--orders=4",
+            stdout=StringIO(),
+        )
+        out = StringIO()
+        call_command("run_loadtest", "--requests=2", "--concurrency=1", "--host=testserver", stdout=out)
+        self.assertIn("All endpoints within budget", out.getvalue())
+        self.assertIn("create-order:checkout", out.getvalue())
+
+    def test_budget_violations_are_reported(self):
+        from .loadtest import check_budgets
+
+        summaries = {"get-carts:view": {"errors": 0, "p95_ms": 12.0, "max_queries": 9}}
+        self.assertEqual(
+            check_budgets(summaries, {"get-carts": {"p95_ms": 50, "max_queries": 4}}),
+            ["get-carts:view: max_queries 9 > budget 4"],
+        )
+
+
+class MetricsTests(TestCase):
+    def test_endpoint_reports_latency_and_queries_per_view(self):
+        make_catalog(1, 2)
+        self.client.get(reverse("get-categories"))
+        body = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('store_request_duration_seconds_count{view="get-categories"}', body)
+        line = next(l for l in body.splitlines() if l.startswith('store_db_queries_total{view="get-categories"}'))
+        self.assertGreater(float(line.split()[-1]), 0)
+        self.assertIn("store_auth_token_cache_hits_total", body)
+
+    def test_process_files_are_summed(self):
+        import tempfile
+        from .metrics import MetricsStore
+
+        with tempfile.TemporaryDirectory() as directory:
+            first = MetricsStore(["a", "other"], directory=directory, pid=1)
+            second = MetricsStore(["a", "other"], directory=directory, pid=2)
+            first.record("a", 0.02, 3, 0.001)
+            second.record("a", 0.2, 4, 0.002)
+            second.record("unknown", 0.2, 1, 0.0)
+            totals = second.snapshot()
+        self.assertEqual(totals[first.index["a"]], 2)
+        self.assertEqual(totals[first.index["a"] + 2], 7)
+        self.assertEqual(totals[first.index["other"]], 1)
+
+
+class AsyncReadPathTests(TestCase):
+    def setUp(self):
+        from .auth_cache import token_cache
+
+        cache.clear()
+        token_cache.clear()
+
+    def test_async_catalog_responses_match_sync_bytes(self):
+        products = make_catalog(products=4)
+        for sync_name, async_name, args in (
+            ("get-products", "async-get-products", []),
+            ("get-categories", "async-get-categories", []),
+            ("get-product-detail", "async-get-product-detail", [products[0].id]),
+        ):
+            expected = self.client.get(reverse(sync_name, args=args))
+            actual = self.client.get(reverse(async_name, args=args))
+            self.assertEqual(actual.status_code, 200)
+            self.assertEqual(actual.content, expected.content)
+            self.assertIn("ETag", actual)
+        page = self.client.get(reverse("async-get-products"), {"page_size": 3}).json()
+        self.assertEqual(len(page["results"]), 3)
+        self.assertIsNotNone(page["next"])
+
+    async def test_orders_and_wishlist_through_asgi_handler(self):
+        from asgiref.sync import sync_to_async
+
+        def setup():
+            user, headers = make_user()
+            product = make_catalog(products=1)[0]
+            self.client.post(reverse("toggle-wishlist"), {"product_id": product.id}, content_type="application/json", **headers)
+            self.client.post(reverse("get-add-carts"), {"product_id": product.id}, content_type="application/json", **headers)
+            self.client.post(reverse("create-order"), CHECKOUT, content_type="application/json", **headers)
+            return product, headers["HTTP_AUTHORIZATION"]
+
+        product, authorization = await sync_to_async(setup)()
+        orders = await self.async_client.get(reverse("async-get-user-orders"), headers={"authorization": authorization})
+        self.assertEqual(orders.status_code, 200)
+        self.assertEqual(orders.json()[0]["items"][0]["product"], product.id)
+        wishlist = await self.async_client.get(reverse("async-get-wishlist"), headers={"authorization": authorization})
+        self.assertEqual(wishlist.json(), [product.id])
+        anonymous = await self.async_client.get(reverse("async-get-user-orders"))
+        self.assertEqual(anonymous.status_code, 401)
+
+
+class FastSerializationTests(TestCase):
+    def render_both(self, serializer_data, plan_data):
+        from rest_framework.renderers import JSONRenderer
+        from .fastser import OrjsonRenderer
+
+        return JSONRenderer().render(serializer_data), OrjsonRenderer().render(plan_data)
+
+    def test_plans_match_drf_serializers_byte_for_byte(self):
+        from .carts import load_cart
+        from .fastser import cart_plan, order_plan, product_plan
+        from .serilizer import CartSerializer, OrderSerializer, ProductSerializer
+
+        products = make_catalog(products=3)
+        Product.objects.filter(pk=products[0].pk).update(
+            description="Line\u2028separator, \u00fcml\u00e4uts and \"quotes\"", price=Decimal("7"),
+            image="products/phone.jpg",
+            image_variants={"source": "products/phone.jpg", "thumb": {"width": 10, "height": 8, "jpeg": "products/variants/phone/thumb.jpg"}},
+        )
+        user, headers = make_user()
+        for product in products:
+            self.client.post(reverse("get-add-carts"), {"product_id": product.id}, content_type="application/json", **headers)
+        cart = Cart.objects.get(user=user)
+        self.client.post(reverse("create-order"), CHECKOUT, content_type="application/json", **headers)
+        self.client.post(reverse("get-add-carts"), {"product_id": products[1].id, "quantity": 2}, content_type="application/json", **headers)
+        Order.objects.create(user=user, phone="9800000001")
+
+        queryset = Product.objects.select_related("category").order_by("id")
+        self.assertEqual(*self.render_both(ProductSerializer(queryset, many=True).data, product_plan.serialize(queryset)))
+        self.assertEqual(*self.render_both(CartSerializer(load_cart(cart.pk)).data, cart_plan.first(Cart.objects.filter(pk=cart.pk))))
+        orders = Order.objects.filter(user=user).order_by("id")
+        self.assertEqual(*self.render_both(OrderSerializer(orders, many=True).data, order_plan.serialize(orders)))
+
+    def test_renderer_falls_back_without_orjson(self):
+        from .fastser import OrjsonRenderer
+
+        data = {"total": Decimal("1.500"), "name": "caf\u00e9\u2029"}
+        with mock.patch("store.fastser.orjson", None):
+            fallback = OrjsonRenderer().render(data)
+        self.assertEqual(fallback, OrjsonRenderer().render(data))
+        self.assertEqual(fallback, '{"total":1.5,"name":"café\\u2029"}'.encode())
+
+
+class WishlistTests(TestCase):
+    def setUp(self):
+        self.products = make_catalog(products=6)
+        self.user, self.headers = make_user()
+
+    def post(self, name, data):
+        return self.client.post(reverse(name), data, content_type="application/json", **self.headers)
+
+    def test_toggle_cost_does_not_grow_with_wishlist(self):
+        def toggle_queries(product):
+            with CaptureQueriesContext(connection) as queries:
+                self.post("toggle-wishlist", {"product_id": product.id})
+            return len(queries)
+
+        self.post("toggle-wishlist", {"product_id": self.products[0].id})
+        add, remove = toggle_queries(self.products[1]), toggle_queries(self.products[1])
+        self.post("batch-toggle-wishlist", {"product_ids": [p.id for p in self.products[1:5]], "action": "add"})
+        self.assertEqual(toggle_queries(self.products[5]), add)
+        self.assertEqual(toggle_queries(self.products[5]), remove)
+        self.assertEqual(
+            sorted(self.client.get(reverse("get-wishlist"), **self.headers).json()),
+            [p.id for p in self.products[:5]],
+        )
+
+    def test_batch_toggle_and_unknown_products(self):
+        ids = [p.id for p in self.products[:3]]
+        self.post("toggle-wishlist", {"product_id": ids[0]})
+        body = self.post("batch-toggle-wishlist", {"product_ids": ids}).json()
+        self.assertEqual((body["liked"], body["unliked"]), (ids[1:], ids[:1]))
+        response = self.post("batch-toggle-wishlist", {"product_ids": [ids[0], 99999]})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(sorted(self.client.get(reverse("get-wishlist"), **self.headers).json()), ids[1:])
+
+    def test_hydrated_pages_newest_first_in_one_query(self):
+        for product in self.products:
+            self.post("toggle-wishlist", {"product_id": product.id})
+        url = reverse("get-wishlist-products")
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get(url, {"page_size": 4}, **self.headers).json()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([card["id"] for card in page["results"]], [p.id for p in self.products[::-1][:4]])
+        self.assertEqual(page["results"][0]["category"]["slug"], self.products[-1].category.slug)
+        rest = self.client.get(page["next"], **self.headers).json()
+        self.assertEqual([card["id"] for card in rest["results"]], [self.products[1].id, self.products[0].id])
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        from .auth_cache import token_cache
+
+        token_cache.clear()
+        self.products = make_catalog(products=3)
+        self.user, self.headers = make_user()
+
+    def place_orders(self, count):
+        for n in range(count):
+            for product in self.products[: n % 3 + 1]:
+                self.client.post(reverse("get-add-carts"), {"product_id": product.id, "quantity": 2}, content_type="application/json", **self.headers)
+            self.client.post(reverse("create-order"), CHECKOUT, content_type="application/json", **self.headers)
+
+    def history(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("get-user-orders"), params, **self.headers)
+        return response.json(), len(queries)
+
+    def test_page_cost_is_fixed_and_pages_cover_history(self):
+        self.place_orders(2)
+        _, few = self.history(page_size=2)
+        self.place_orders(4)
+        page, many = self.history(page_size=2)
+        self.assertEqual(many, few)
+        seen = [order["id"] for order in page["results"]]
+        while page["next"]:
+            page = self.client.get(page["next"], **self.headers).json()
+            seen += [order["id"] for order in page["results"]]
+        self.assertEqual(seen, list(Order.objects.order_by("-created_at", "-id").values_list("id", flat=True)))
+        self.assertEqual(len(page["results"][-1]["items"]), 1)
+
+    def test_summary_aggregates_lines_in_one_query(self):
+        self.place_orders(3)
+        summary, queries = self.history(summary=1)
+        self.assertEqual(queries, 1)
+        latest = summary[0]
+        self.assertNotIn("items", latest)
+        self.assertEqual((latest["item_count"], latest["line_count"]), (6, 3))
+        self.assertEqual(latest["items_total"], latest["total_amount"])
+        self.assertEqual(latest["items_total"], "66.000")
+
+
+@override_settings(STORE_DB_REPLICAS=["replica1"], DB_REPLICA_STICKY_SECONDS=30)
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def route(self, method, name, args=(), status=200, **headers):
+        from django.http import HttpResponse
+        from django.urls import resolve
+        from .routers import ReplicaRouter, ReplicaRoutingMiddleware
+
+        router, seen = ReplicaRouter(), {}
+        request = getattr(self.factory, method.lower())(reverse(name, args=args), **headers)
+        request.resolver_match = resolve(request.path_info)
+
+        def get_response(request):
+            middleware.process_view(request, None, args, {})
+            seen.update(product=router.db_for_read(Product), cart=router.db_for_read(Cart), write=router.db_for_write(Product))
+            return HttpResponse(status=status)
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        middleware(request)
+        self.assertEqual(seen["write"], "default")
+        return seen
+
+    def test_read_views_use_replica_for_catalog_tables_only(self):
+        self.assertEqual(self.route("GET", "get-products"), {"product": "replica1", "cart": "default", "write": "default"})
+        self.assertEqual(self.route("GET", "get-carts")["product"], "default")
+        self.assertEqual(self.route("POST", "get-add-carts")["product"], "default")
+
+    def test_writes_pin_the_writer_and_catalog_changes_pin_the_catalog(self):
+        alice, bob = {"HTTP_AUTHORIZATION": "Token alice"}, {"HTTP_AUTHORIZATION": "Token bob"}
+        self.assertEqual(self.route("GET", "get-user-orders", **alice)["product"], "replica1")
+        self.route("POST", "get-add-carts", status=400, **alice)
+        self.assertEqual(self.route("GET", "get-user-orders", **alice)["product"], "replica1")
+        self.route("POST", "create-order", status=201, **alice)
+        self.assertEqual(self.route("GET", "get-user-orders", **alice)["product"], "default")
+        self.assertEqual(self.route("GET", "get-user-orders", **bob)["product"], "replica1")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_catalog(products=1)
+        self.assertEqual(self.route("GET", "get-product-detail", args=[1])["product"], "default")
+
+
+class ReplicaDatabaseTests(TestCase):
+    """A second SQLite database, registered at class setup, stands in for the replica."""
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        import tempfile
+        from django.core.management import call_command
+
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings["replica_test"] = {
+            **connections.settings["default"],
+            "NAME": f"{cls.replica_dir.name}/replica.sqlite3",
+            "TEST": {"NAME": f"{cls.replica_dir.name}/replica.sqlite3", "MIRROR": None},
+        }
+        call_command("migrate", database="replica_test", verbosity=0)
+        cls.enterClassContext(override_settings(STORE_DB_REPLICAS=["replica_test"], DB_REPLICA_STICKY_SECONDS=30))
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica_test"].close()
+        del connections.settings["replica_test"]
+        del connections._connections.replica_test
+        cls.replica_dir.cleanup()
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.headers = make_user()
+        # ** "replicated" copy of a catalog row plus a stale one only the primary lacks
+        self.product = make_catalog(products=1)[0]
+        category = Category.objects.using("replica_test").create(name="Replica", slug="replica")
+        Product.objects.using("replica_test").create(id=self.product.id, category=category, name="Stale name", price=1)
+
+    def test_catalog_reads_come_from_the_replica(self):
+        response = self.client.get(reverse("get-product-detail", args=[self.product.id]))
+        self.assertEqual(response.json()["name"], "Stale name")
+        self.assertEqual(len(self.client.get(reverse("get-products")).json()), 1)
+
+    def test_orders_are_read_from_the_primary_after_checkout(self):
+        self.client.post(reverse("get-add-carts"), {"product_id": self.product.id}, content_type="application/json", **self.headers)
+        self.client.post(reverse("create-order"), CHECKOUT, content_type="application/json", **self.headers)
+        orders = self.client.get(reverse("get-user-orders"), **self.headers).json()
+        self.assertEqual(len(orders), 1)
+        self.assertEqual(orders[0]["items"][0]["product_name"], self.product.name)
+
+        cache.clear()  # ** pin expired: the lagging replica has no orders yet
+        self.assertEqual(self.client.get(reverse("get-user-orders"), **self.headers).json(), [])
+
+
+class GuestCartTests(TestCase):
+    def setUp(self):
+        self.a, self.b = make_catalog(products=2)
+
+    def add(self, client, product, quantity=1, **extra):
+        return client.post(
+            reverse("get-add-carts"), {"product_id": product.id, "quantity": quantity},
+            content_type="application/json", **extra,
+        )
+
+    def test_guests_get_separate_carts_created_on_first_add(self):
+        first, second = Client(), Client()
+        self.assertEqual(first.get(reverse("get-carts")).json()["items"], [])
+        self.assertFalse(Cart.objects.exists())
+
+        cart = self.add(first, self.a).json()["cart"]
+        self.assertNotIn("session_key", cart)
+        self.add(second, self.b, 2)
+        self.assertEqual(Cart.objects.filter(user=None).count(), 2)
+        self.assertEqual([i["product_name"] for i in first.get(reverse("get-carts")).json()["items"]], [self.a.name])
+
+        item_id = cart["items"][0]["id"]
+        response = second.post(reverse("get-remove-carts"), {"item_id": item_id}, content_type="application/json")
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(CartItem.objects.filter(pk=item_id).exists())
+
+    def test_rejected_first_change_leaves_no_guest_cart(self):
+        from .carts import GUEST_CART_COOKIE
+
+        batch = lambda operations: self.client.post(
+            reverse("batch-update-cart"), {"operations": operations}, content_type="application/json",
+        )
+        self.assertEqual(batch([{"op": "add", "product_id": 999}]).status_code, 404)
+        self.assertEqual(batch([{"op": "remove", "item_id": 999}]).status_code, 404)
+        response = self.add(self.client, Product(id=999))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn(GUEST_CART_COOKIE, response.cookies)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_tampered_cookie_is_ignored(self):
+        from .carts import GUEST_CART_COOKIE
+
+        self.add(self.client, self.a)
+        key = Cart.objects.get().session_key
+        self.client.cookies[GUEST_CART_COOKIE] = key
+        self.assertEqual(self.client.get(reverse("get-carts")).json()["items"], [])
+
+    def test_login_merges_guest_lines_into_user_cart(self):
+        from .carts import GUEST_CART_COOKIE
+
+        user, headers = make_user()
+        self.add(self.client, self.a, 1, **headers)
+        self.add(self.client, self.a, 2)
+        self.add(self.client, self.b, 1)
+        guest = Cart.objects.get(user=None)
+
+        response = self.client.post(
+            reverse("login"), {"username": user.username, "password": "secret-pass"}, content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies[GUEST_CART_COOKIE].value, "")
+        self.assertFalse(Cart.objects.filter(pk=guest.pk).exists())
+        cart = Cart.objects.get(user=user)
+        self.assertEqual(dict(cart.items.values_list("product_id", "quantity")), {self.a.id: 3, self.b.id: 1})
+        self.assertEqual((cart.item_count, cart.total), (4, 3 * self.a.price + self.b.price))
+
+    def test_guest_cart_becomes_the_cart_of_a_user_without_one(self):
+        user, _ = make_user()
+        self.add(self.client, self.a, 2)
+        guest = Cart.objects.get()
+        self.client.post(
+            reverse("login"), {"username": user.username, "password": "secret-pass"}, content_type="application/json",
+        )
+        guest.refresh_from_db()
+        self.assertEqual((guest.user, guest.session_key, guest.item_count), (user, None, 2))
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.scarce, self.plenty = make_catalog(products=2)
+        Product.objects.filter(pk=self.scarce.pk).update(stock_available=2)
+        Product.objects.filter(pk=self.plenty.pk).update(stock_available=10)
+        self.user, self.auth = make_user()
+        self.cart = Cart.objects.create(user=self.user)
+
+    def checkout(self, **quantities):
+        CartItem.objects.bulk_create(
+            CartItem(cart=self.cart, product=getattr(self, name), quantity=quantity)
+            for name, quantity in quantities.items()
+        )
+        return self.client.post(reverse("create-order"), CHECKOUT, content_type="application/json", **self.auth)
+
+    def stock(self, product):
+        return tuple(Product.objects.filter(pk=product.pk).values_list("stock_available", "stock_reserved").get())
+
+    def test_checkout_holds_units_for_the_order(self):
+        from .models import StockReservation
+
+        response = self.checkout(scarce=2, plenty=1)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((self.stock(self.scarce), self.stock(self.plenty)), ((0, 2), (9, 1)))
+        order_id = response.json()["order"]["id"]
+        self.assertEqual(
+            sorted(StockReservation.objects.values_list("order_id", "quantity", "expires_at")),
+            [(order_id, 1, None), (order_id, 2, None)],
+        )
+
+    def test_interleaved_reservations_of_the_last_unit(self):
+        from . import stock
+
+        Product.objects.filter(pk=self.scarce.pk).update(stock_available=1)
+        # ** both checkouts saw one unit left; the first UPDATE to land takes it
+        seen = [Product.objects.get(pk=self.scarce.pk).stock_available for _ in range(2)]
+        self.assertEqual(seen, [1, 1])
+        stock.reserve({self.scarce.pk: 1})
+        with self.assertRaises(stock.OutOfStock):
+            stock.reserve({self.scarce.pk: 1})
+        self.assertEqual(self.stock(self.scarce), (0, 1))
+
+    def test_short_product_rejects_whole_checkout(self):
+        response = self.checkout(scarce=3, plenty=1)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["product_ids"], [self.scarce.id])
+        self.assertEqual((self.stock(self.scarce), self.stock(self.plenty)), ((2, 0), (10, 0)))
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.count(), 2)
+
+    def test_failed_order_write_releases_the_hold(self):
+        with mock.patch("store.views.enqueue_email", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                self.checkout(scarce=2)
+        self.assertEqual(self.stock(self.scarce), (2, 0))
+        self.assertFalse(Order.objects.exists())
+
+    def test_cancel_restocks_and_shipping_consumes(self):
+        first = Order.objects.get(pk=self.checkout(scarce=1).json()["order"]["id"])
+        second = Order.objects.get(pk=self.checkout(scarce=1).json()["order"]["id"])
+        self.assertEqual(self.stock(self.scarce), (0, 2))
+
+        first.status = "cancelled"
+        first.save()
+        self.assertEqual(self.stock(self.scarce), (1, 1))
+        second.status = "shipped"
+        second.save()
+        self.assertEqual(self.stock(self.scarce), (1, 0))
+
+    def test_expired_holds_are_released(self):
+        from django.core.management import call_command
+
+        from . import stock
+
+        hold = stock.reserve({self.scarce.pk: 2})
+        self.assertEqual(self.stock(self.scarce), (0, 2))
+        call_command("release_expired_reservations", stdout=StringIO())
+        self.assertEqual(self.stock(self.scarce), (0, 2))
+        with mock.patch("store.stock.reservation_seconds", return_value=0):
+            stock.reserve({self.plenty.pk: 1})
+        out = StringIO()
+        call_command("release_expired_reservations", stdout=out)
+        self.assertIn("Released 1 expired", out.getvalue())
+        self.assertEqual((self.stock(self.plenty), stock.held(hold).count()), ((10, 0), 1))
+
+
+
+class StockStressTests(TransactionTestCase):
+    """Checkouts racing on real threads, each with its own connection and committed transactions."""
+
+    def test_concurrent_checkouts_never_oversell(self):
+        from .loadtest import stress_checkout
+
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("threads need a file-backed test database (DB_ENGINE=sqlite sets one)")
+
+        product = make_catalog(products=1)[0]
+        Product.objects.filter(pk=product.pk).update(stock_available=2)
+        report = stress_checkout(product.pk, stock=5, checkouts=16, concurrency=4, host="testserver")
+        self.assertLessEqual(report["sold"], 5)
+        self.assertFalse(report["oversold"])
+        self.assertEqual(report["sold"] + report["rejected"] + report["errors"], 16)
+        self.assertEqual((report["stock_available"], report["stock_reserved"]), (5 - report["sold"], report["sold"]))
+        self.assertEqual(
+            Product.objects.filter(pk=product.pk).values_list("stock_available", "stock_reserved").get(), (2, 0),
+        )
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.product = make_catalog(products=1)[0]
+        self.user, self.auth = make_user()
+
+    def post(self, name, data, key="key-1"):
+        return self.client.post(
+            reverse(name), data, content_type="application/json", HTTP_IDEMPOTENCY_KEY=key, **self.auth,
+        )
+
+    def add(self, key="key-1", quantity=1):
+        return self.post("get-add-carts", {"product_id": self.product.id, "quantity": quantity}, key)
+
+    def test_retried_checkout_replays_the_first_order(self):
+        self.add("add-1")
+        first = self.post("create-order", CHECKOUT)
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.post("create-order", CHECKOUT)
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(len(queries), 1)
+
+    def test_keys_are_per_endpoint_and_checked_against_the_body(self):
+        self.add()
+        self.add()
+        self.assertEqual(CartItem.objects.get().quantity, 1)
+        self.assertEqual(self.add(quantity=2).status_code, 422)
+        item = CartItem.objects.get()
+        self.post("update-cart-quantity", {"item_id": item.id, "action": "increase"})
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 2)
+
+    def test_guests_without_a_cart_cookie_are_not_deduplicated(self):
+        from .carts import GUEST_CART_COOKIE
+        from .models import IdempotencyKey
+
+        data = {"product_id": self.product.id, "quantity": 1}
+        responses = [
+            Client().post(reverse("get-add-carts"), data, content_type="application/json", HTTP_IDEMPOTENCY_KEY="k")
+            for _ in range(2)
+        ]
+        cookies = [response.cookies[GUEST_CART_COOKIE].value for response in responses]
+        self.assertNotEqual(cookies[0], cookies[1])
+        self.assertNotIn("Idempotent-Replayed", responses[1])
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        guest = Client()
+        guest.cookies[GUEST_CART_COOKIE] = cookies[0]
+        post = lambda: guest.post(reverse("get-add-carts"), data, content_type="application/json", HTTP_IDEMPOTENCY_KEY="k")
+        post()
+        self.assertEqual(post()["Idempotent-Replayed"], "true")
+        self.assertEqual(sorted(CartItem.objects.values_list("quantity", flat=True)), [1, 2])
+
+    def test_duplicate_waits_for_the_running_request(self):
+        from . import idempotency
+        from .models import IdempotencyKey
+
+        self.add("other")
+        body = self.add("other").content
+        row = IdempotencyKey.objects.get()
+        # ** pretend "other" is still running in another worker until the first poll
+        IdempotencyKey.objects.update(status_code=None)
+
+        def finish(seconds):
+            # ** the wait holds no in-process lock
+            self.assertFalse(any(lock.locked() for lock in idempotency._local_locks))
+            IdempotencyKey.objects.filter(pk=row.pk).update(status_code=200)
+
+        with mock.patch.object(idempotency.time, "sleep", side_effect=finish) as sleep:
+            response = self.add("other")
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(response.content, body)
+
+    def test_abandoned_claim_is_taken_over_and_keys_expire(self):
+        from django.core.management import call_command
+
+        from .models import IdempotencyKey
+
+        self.add()
+        IdempotencyKey.objects.update(status_code=None, expires_at=timezone.now())
+        self.assertNotIn("Idempotent-Replayed", self.add())
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+
+        IdempotencyKey.objects.update(expires_at=timezone.now())
+        self.add("key-2")
+        out = StringIO()
+        call_command("expire_idempotency_keys", "--batch-size=1", stdout=out)
+        self.assertIn("Expired 1 idempotency keys", out.getvalue())
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+
+@override_settings(STORE_RATE_LIMITS={
+    "login": {"client": ("2/m", 2)},
+    "get-products?search": {"user": ("1/m", 1)},
+    "*": {"endpoint": ("3/m", 3)},
+})
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def login(self):
+        return self.client.post(reverse("login"), {"username": "x", "password": "y"}, content_type="application/json")
+
+    def test_client_bucket_rejects_with_retry_after(self):
+        from . import throttling
+
+        # ** a frozen clock: the PBKDF2 logins themselves take long enough to shift Retry-After
+        with mock.patch.object(throttling.time, "time", return_value=time.time()):
+            self.assertEqual([self.login().status_code for _ in range(2)], [401, 401])
+            response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+
+    def test_buckets_refill_and_rejections_spend_nothing(self):
+        from . import throttling
+
+        now = time.time()
+        with mock.patch.object(throttling.time, "time", return_value=now):
+            self.login(), self.login()
+            self.assertEqual(self.login().status_code, 429)
+            self.assertEqual(self.login().status_code, 429)
+        with mock.patch.object(throttling.time, "time", return_value=now + 30):
+            self.assertEqual(self.login().status_code, 401)
+            self.assertEqual(self.login().status_code, 429)
+
+    def test_search_variant_and_user_buckets(self):
+        make_catalog(products=1)
+        _, alice = make_user("alice")
+        _, bob = make_user("bob")
+        search = reverse("get-products") + "?search=product"
+        self.assertEqual(self.client.get(search, **alice).status_code, 200)
+        self.assertEqual(self.client.get(search, **alice).status_code, 429)
+        self.assertEqual(self.client.get(search, **bob).status_code, 200)
+        # ** no token, no user bucket; the plain listing falls back to "*"
+        self.assertEqual(self.client.get(search).status_code, 200)
+        self.assertEqual([self.client.get(reverse("get-products")).status_code for _ in range(4)], [200, 200, 200, 429])
+
+    @override_settings(STORE_RATE_LIMITS={
+        "get-products?search": {"client": ("5/s", 20)},
+        "*": {"client": ("50/s", 100)},
+    })
+    def test_heavy_searching_does_not_throttle_plain_browsing(self):
+        from . import throttling
+
+        with mock.patch.object(throttling.time, "time", return_value=time.time()):
+            searches = [self.client.get(reverse("get-products"), {"search": "product"}).status_code for _ in range(20)]
+            self.assertEqual(searches, [200] * 20)
+            self.assertEqual(self.client.get(reverse("get-products"), {"search": "product"}).status_code, 429)
+            self.assertEqual(self.client.get(reverse("get-products")).status_code, 200)
+
+    @override_settings(
+        STORE_RATE_LIMITS={"*": {"client": ("3/m", 3)}},
+        STORE_RATE_LIMIT_CLIENT_HEADER="HTTP_X_FORWARDED_FOR", STORE_RATE_LIMIT_TRUSTED_PROXIES=1,
+    )
+    def test_forged_forwarded_hops_do_not_open_new_buckets(self):
+        from . import throttling
+
+        forged = [f"10.0.0.{i}, 203.0.113.7" for i in range(3)]
+        with mock.patch.object(throttling.time, "time", return_value=time.time()):
+            codes = [self.client.get(reverse("get-products"), HTTP_X_FORWARDED_FOR=hops).status_code for hops in forged]
+            self.assertEqual(codes, [200, 200, 200])
+            self.assertEqual(
+                self.client.get(reverse("get-products"), HTTP_X_FORWARDED_FOR="10.9.9.9, 203.0.113.7").status_code, 429,
+            )
+            # ** another address seen by the proxy is another client
+            self.assertEqual(
+                self.client.get(reverse("get-products"), HTTP_X_FORWARDED_FOR="10.9.9.9, 198.51.100.1").status_code, 200,
+            )
+
+    def test_unthrottled_lets_everything_through(self):
+        from .throttling import unthrottled
+
+        with unthrottled():
+            self.assertEqual({self.login().status_code for _ in range(5)}, {401})
+
+    def test_check_is_one_read_and_one_write(self):
+        from . import throttling
+
+        store = mock.Mock(wraps=throttling.get_store())
+        request = RequestFactory().get(reverse("get-products"), {"search": "x"}, HTTP_AUTHORIZATION="Token abc")
+        with mock.patch.object(throttling, "get_store", return_value=store):
+            self.assertEqual(throttling.throttle(request, "get-products"), 0)
+            self.assertGreater(throttling.throttle(request, "get-products"), 0)
+        # ** the rejected second call reads but writes nothing
+        self.assertEqual((store.get_many.call_count, store.set_many.call_count), (2, 1))
+        self.assertEqual((store.get.call_count, store.set.call_count), (0, 0))
+
+
+class BrowseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # ** prices 10..15, alternating between two categories
+        self.products = make_catalog(categories=2, products=6)
+
+    def get(self, name="get-products", **params):
+        return self.client.get(reverse(name), params)
+
+    def test_filters_and_sorts_server_side(self):
+        body = self.get(category="category-0", min_price="11", sort="-price", page_size=10).json()
+        self.assertEqual([p["price"] for p in body["results"]], ["14.000", "12.000"])
+        listing = self.get(max_price="12", sort="price").json()
+        self.assertEqual([p["price"] for p in listing], ["10.000", "11.000", "12.000"])
+
+    def test_facets_come_from_one_cached_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            body = self.get(category="category-1", min_price="12", facets=1, page_size=1, sort="price").json()
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(
+            [(c["slug"], c["count"]) for c in body["facets"]["categories"]],
+            [("category-0", 2), ("category-1", 2)],
+        )
+        self.assertEqual(body["facets"]["prices"][:2], [{"min": 0, "max": 10, "count": 0}, {"min": 10, "max": 25, "count": 3}])
+
+        # ** another page of the same filters: only the page query
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(body["next"])
+        self.assertEqual(len(queries), 1)
+
+    def test_invalid_filters_are_rejected(self):
+        self.assertEqual(self.get(sort="name").status_code, 400)
+        self.assertEqual(self.get(min_price="abc").status_code, 400)
+        self.assertEqual(self.get(min_price="5", max_price="1").status_code, 400)
+
+    def test_filtered_search_finds_matches_ranked_below_the_cap(self):
+        from . import search
+
+        lamps, shades = Category.objects.create(name="Lamps", slug="lamps"), Category.objects.get(slug="category-1")
+        Product.objects.bulk_create(
+            [Product(category=lamps, name=f"Lamp {i}", price=20) for i in range(101)]
+            + [Product(category=shades, name=f"Shade {i}", description="fits any lamp", price=30 + i) for i in range(2)]
+        )
+        search.reindex_products(Product.objects.all())
+        for name in ("get-products", "async-get-products"):
+            self.assertEqual(len(self.get(name, search="lamp").json()), 100)
+            found = self.get(name, search="lamp", category="category-1").json()
+            self.assertEqual(sorted(p["name"] for p in found), ["Shade 0", "Shade 1"], name)
+            found = self.get(name, search="lamp", min_price="25", sort="-price").json()
+            self.assertEqual([p["name"] for p in found], ["Shade 1", "Shade 0"], name)
+            for extra in ({"facets": 1}, {"page_size": 5}, {"cursor": "x"}):
+                self.assertEqual(self.get(name, search="lamp", **extra).status_code, 400, (name, extra))
+
+    def test_async_twin_matches(self):
+        params = {"category": "category-0", "sort": "price", "facets": 1, "page_size": 2}
+        sync = self.get(**params).json()
+        asynchronous = self.get("async-get-products", **params).json()
+        self.assertEqual(sync["facets"], asynchronous["facets"])
+        self.assertEqual(sync["results"], asynchronous["results"])
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from django.core.management import call_command
+
+        call_command(
+            "seed_store", "--categories=3", "--products=60", "--users=3", "--carts=3", "--orders=12",
+            stdout=StringIO(),
+        )
+
+    def test_hot_paths_use_indexes(self):
+        from .loadtest import Dataset
+        from .management.commands.seed_store import BENCH_PASSWORD
+        from .queryplans import capture_plans
+
+        plans = capture_plans(Dataset.load("bench", BENCH_PASSWORD, host="testserver"))
+        self.assertGreater(len(plans), 10)
+        self.assertEqual([(plan.scenario, plan.problems, plan.sql) for plan in plans if plan.problems], [])
+
+    def test_mysql_plans_flag_full_scans_and_filesorts(self):
+        from .queryplans import plan_problems
+
+        plan = [
+            {"table": "store_order", "type": "ALL", "extra": "Using where; Using filesort"},
+            {"table": "store_category", "type": "ALL", "extra": None},
+            {"table": "store_orderitem", "type": "ref", "extra": "Using index"},
+        ]
+        self.assertEqual(plan_problems(plan, "mysql"), ["full scan of store_order", "filesort on store_order"])
+
+    def test_cart_lines_are_unique_per_product(self):
+        from django.db import IntegrityError, transaction
+
+        cart = Cart.objects.create()
+        product = Product.objects.first()
+        CartItem.objects.create(cart=cart, product=product)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            CartItem.objects.create(cart=cart, product=product)
+
+
+class CatalogImportExportTests(TestCase):
+    def setUp(self):
+        import tempfile
+
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = override_settings(MEDIA_ROOT=media.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.media_root = media.name
+
+    def run_import(self, text, fmt="csv", **kwargs):
+        from .catalog_io import import_catalog
+
+        errors = []
+        with self.captureOnCommitCallbacks(execute=True):
+            importer = import_catalog(
+                StringIO(text), fmt, on_error=lambda line, message: errors.append((line, message)), **kwargs
+            )
+        return importer, errors
+
+    def test_export_then_import_round_trips(self):
+        from django.core.management import call_command
+
+        make_catalog(categories=2, products=5)
+        out = StringIO()
+        call_command("export_catalog", "-", stdout=out)
+        Product.objects.update(price=Decimal("1.000"), description="")
+
+        importer, errors = self.run_import(out.getvalue(), chunk_size=2)
+        self.assertEqual((importer.created, importer.updated, errors), (0, 5, []))
+        self.assertEqual(
+            list(Product.objects.order_by("id").values_list("price", "description"))[1],
+            (Decimal("11.000"), "Description for product 1"),
+        )
+        self.assertEqual(Category.objects.count(), 2)
+
+    def test_jsonl_creates_categories_and_products_and_skips_bad_rows(self):
+        import json
+
+        rows = [
+            {"name": "Steel Trowel", "price": 12.5, "category": "garden", "category_name": "Garden"},
+            {"name": "Hose", "price": "abc", "category": "garden"},
+            {"name": "Rake", "price": "8", "category": "garden", "stock_available": 3},
+        ]
+        importer, errors = self.run_import("\n".join(json.dumps(row) for row in rows) + "\n", "jsonl", chunk_size=1)
+        self.assertEqual((importer.created, errors), (2, [(2, "price must be a number")]))
+        self.assertEqual(Category.objects.get(slug="garden").name, "Garden")
+        self.assertEqual(Product.objects.get(name="Rake").stock_available, 3)
+        found = self.client.get(reverse("get-products"), {"search": "trowel"}).json()
+        self.assertEqual([item["name"] for item in found], ["Steel Trowel"])
+
+    def test_upsert_only_writes_given_columns_and_reprices_carts(self):
+        product = make_catalog(products=1)[0]
+        _, auth = make_user()
+        self.client.post(reverse("get-add-carts"), {"product_id": product.id, "quantity": 2},
+                         content_type="application/json", **auth)
+
+        importer, errors = self.run_import(f"id,name,price,category\n{product.id},Renamed,99,category-0\n")
+        self.assertEqual((importer.updated, errors), (1, []))
+        product.refresh_from_db()
+        self.assertEqual((product.name, product.description), ("Renamed", "Description for product 0"))
+        self.assertEqual(Cart.objects.get().total, Decimal("198.000"))
+
+    def test_taken_category_name_fails_its_rows_only(self):
+        make_catalog(categories=1, products=0)
+        text = (
+            "name,price,category,category_name\n"
+            "Hat,5,hats,Category 0\n"
+            "Cap,4,caps,Caps\n"
+            "Beret,6,berets,Caps\n"
+        )
+        importer, errors = self.run_import(text)
+        self.assertEqual(importer.created, 1)
+        self.assertEqual(errors, [
+            (2, "category_name 'Category 0' is already used by category 'category-0'"),
+            (4, "category_name 'Caps' is already used by category 'caps'"),
+        ])
+        self.assertEqual(sorted(Category.objects.values_list("slug", flat=True)), ["caps", "category-0"])
+        self.assertEqual(list(Product.objects.values_list("name", flat=True)), ["Cap"])
+
+    def test_rejects_unknown_columns(self):
+        from .catalog_io import CatalogError
+
+        with self.assertRaises(CatalogError):
+            self.run_import("name,price,category,colour\nHat,5,hats,red\n")
+
+    def test_local_images_are_copied_into_storage(self):
+        import os
+        import tempfile
+
+        with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as image:
+            image.write(b"not really a jpeg")
+        self.addCleanup(os.unlink, image.name)
+
+        text = f"name,price,category,image\nHat,5,hats,{image.name}\nCap,4,hats,/missing/cap.jpg\n"
+        importer, errors = self.run_import(text, workers=2)
+        self.assertEqual((importer.created, importer.images), (1, 1))
+        self.assertEqual(errors, [(3, "image: '/missing/cap.jpg' not found")])
+        stored = Product.objects.get(name="Hat").image.name
+        self.assertTrue(stored.startswith("products/"))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, stored)))
+
+
+@override_settings(STORE_RATE_LIMITS={})
+class OrderExportTests(TestCase):
+    def setUp(self):
+        from datetime import datetime
+
+        self.products = make_catalog(products=2)
+        self.user, self.auth = make_user()
+        self.orders = []
+        for day, status, lines in [(1, "delivered", 2), (2, "pending", 1), (3, "delivered", 0), (9, "delivered", 1)]:
+            order = Order.objects.create(user=self.user, phone="9800000000", status=status, total_amount=lines * 10)
+            for product in self.products[:lines]:
+                order.items.create(product=product, quantity=2, price=product.price)
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.make_aware(datetime(2026, 9, day, 12)))
+            self.orders.append(order)
+
+    def export(self, params, auth=None):
+        return self.client.get(reverse("export-orders"), params, **(auth or self.staff()))
+
+    def staff(self):
+        self.user.is_staff = True
+        self.user.save()
+        return self.auth
+
+    def test_only_staff_may_export(self):
+        self.assertEqual(self.client.get(reverse("export-orders")).status_code, 401)
+        self.assertEqual(self.export({}, auth=self.auth).status_code, 403)
+
+    def test_streams_one_csv_row_per_line_within_the_filters(self):
+        import csv
+
+        response = self.export({"since": "2026-09-01", "until": "2026-09-03", "status": "delivered"})
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.DictReader(StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(
+            [(int(row["order_id"]), row["product_name"], row["line_total"]) for row in rows],
+            [
+                (self.orders[0].id, "Product 0", "20.000"),
+                (self.orders[0].id, "Product 1", "22.000"),
+                (self.orders[2].id, "", ""),
+            ],
+        )
+
+    def test_csv_neutralizes_formula_cells(self):
+        import csv
+
+        Order.objects.filter(pk=self.orders[3].pk).update(full_name="=HYPERLINK(\"http://x\")", address="@SUM(A1)")
+        Product.objects.filter(pk=self.products[0].pk).update(name="-2+3")
+        response = self.export({"since": "2026-09-09"})
+        row = next(csv.DictReader(StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(
+            (row["full_name"], row["address"], row["product_name"], row["order_total"]),
+            ("'=HYPERLINK(\"http://x\")", "'@SUM(A1)", "'-2+3", "10.000"),
+        )
+
+    def test_rejects_bad_filters(self):
+        for params in ({"since": "last week"}, {"status": "lost"}, {"format": "xml"},
+                       {"since": "2026-09-05", "until": "2026-09-01"}):
+            self.assertEqual(self.export(params).status_code, 400, params)
+
+    def test_reads_two_queries_per_chunk_of_orders(self):
+        from .order_export import export_rows, parse_filters
+
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(export_rows(parse_filters({}), chunk_size=3))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(len(queries), 2 + 2 + 1)
+
+    def test_command_writes_json_lines(self):
+        import json
+
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command("export_orders", "-", "--format=jsonl", "--status=pending", stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([(row["order_id"], row["quantity"]) for row in rows], [(self.orders[1].id, 2)])
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        self.products = make_catalog(products=6)
+        self.customer, _ = make_user()
+        self.client.force_login(User.objects.create_superuser("root", "root@example.com", "secret-pass"))
+
+    def place(self, lines=2):
+        order = Order.objects.create(user=self.customer, phone="9800000000")
+        for product in self.products[:lines]:
+            order.items.create(product=product, quantity=1, price=product.price)
+        return order
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, queries
+
+    def test_changelists_do_not_grow_with_rows(self):
+        self.place()
+        for name in ("order", "orderitem", "product"):
+            url = reverse(f"admin:store_{name}_changelist")
+            _, few = self.count_queries(url)
+            for _ in range(4):
+                self.place()
+            _, more = self.count_queries(url)
+            self.assertEqual(len(few), len(more), name)
+            self.assertFalse([q for q in more.captured_queries if "DISTINCT" in q["sql"]], name)
+
+    def test_order_page_labels_prefetched_lines(self):
+        self.client.get(reverse("admin:store_order_change", args=[self.place(1).pk]))  # ** warms the content type cache
+        _, two = self.count_queries(reverse("admin:store_order_change", args=[self.place(2).pk]))
+        response, six = self.count_queries(reverse("admin:store_order_change", args=[self.place(6).pk]))
+        self.assertEqual(len(two), len(six))
+        self.assertContains(response, "Product 5")
+
+    def test_date_hierarchy_probes_periods(self):
+        self.place()
+        response = self.client.get(reverse("admin:store_order_changelist"))
+        today = timezone.localtime()
+        self.assertContains(response, f"created_at__day={today.day}")
+
+    def test_order_search_is_an_exact_lookup(self):
+        order = self.place()
+        for term in (self.customer.username, str(order.pk)):
+            response = self.client.get(reverse("admin:store_order_changelist"), {"q": term})
+            self.assertEqual(list(response.context["cl"].result_list), [order], term)
+
+    def test_unfiltered_count_uses_the_estimate(self):
+        from .pagination import EstimatedCountPaginator
+
+        with mock.patch("store.pagination.estimated_rows", return_value=2_000_000):
+            self.assertEqual(EstimatedCountPaginator(Order.objects.order_by("-id"), 100).count, 2_000_000)
+            self.assertEqual(EstimatedCountPaginator(Order.objects.filter(status="pending").order_by("-id"), 100).count, 0)
+        with mock.patch("store.pagination.estimated_rows", return_value=50):
+            self.assertEqual(EstimatedCountPaginator(Order.objects.order_by("-id"), 100).count, 0)
+
+    def test_product_edit_applies_stock_as_a_delta(self):
+        from . import stock
+
+        product = self.products[0]
+        Product.objects.filter(pk=product.pk).update(stock_available=10)
+        url = reverse("admin:store_product_change", args=[product.pk])
+        self.assertContains(self.client.get(url), 'name="initial-stock_available" value="10"')
+        data = {
+            "category": product.category_id, "name": product.name, "description": "", "price": "99.000",
+            "initial-stock_available": 10, "stock_available": 15,
+        }
+        # ** a checkout reserves two units while the page is open
+        stock.reserve({product.pk: 2})
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            Product.objects.filter(pk=product.pk).values_list("price", "stock_available", "stock_reserved").get(),
+            (Decimal("99.000"), 13, 2),
+        )
+
+    def test_stale_product_save_leaves_stock_alone(self):
+        from . import stock
+
+        product = self.products[0]
+        Product.objects.filter(pk=product.pk).update(stock_available=5)
+        stale = Product.objects.get(pk=product.pk)
+        stock.reserve({product.pk: 3})
+        stale.name = "Renamed"
+        stale.save()
+        self.assertEqual(
+            Product.objects.filter(pk=product.pk).values_list("name", "stock_available", "stock_reserved").get(),
+            ("Renamed", 2, 3),
+        )
@@ -0,0 +1,185 @@
+"""Token-bucket rate limiting per client, per user and per endpoint.
+
+``STORE_RATE_LIMITS`` maps URL names to buckets::
+
+    "login": {"client": "10/m", "endpoint": ("50/s", 100)},
+    "get-products?search": {"client": ("5/s", 20)},
+    "*": {"client": ("50/s", 100)},
+
+A bucket is a rate, or a (rate, burst) pair where burst defaults to the
+rate's count. ``client`` buckets are keyed by address, ``user`` buckets by
+token (requests without one skip them) and ``endpoint`` buckets are shared
+by every caller. A ``"<name>?<param>"`` entry replaces the one for
+``<name>`` when the query string has ``param``; ``"*"`` covers URL names
+without an entry.
+
+Each bucket is stored as its GCRA "theoretical arrival time", a single
+integer of nanoseconds, in the cache named by ``STORE_RATE_LIMIT_CACHE``: one ``get_many``
+and at most one ``set_many`` per request. With a shared cache such as
+redis every worker sees the same buckets; the read-then-write is not
+atomic, so under heavy contention a bucket can let a few extra requests
+through, never fewer.
+"""
+import hashlib
+import math
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+
+UNITS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 3600, "hour": 3600, "d": 86400, "day": 86400}
+SCOPES = ("client", "user", "endpoint")
+DEFAULT = "*"
+NANOSECONDS = 10 ** 9
+
+_compiled = None
+_bypassed = False
+
+
+def parse_rate(spec):
+    """``"10/m"`` or ``("10/m", 20)`` -> (seconds per token, burst)."""
+    rate, burst = spec if isinstance(spec, (tuple, list)) else (spec, None)
+    count, _, unit = rate.partition("/")
+    count = int(count)
+    if count <= 0 or unit not in UNITS:
+        raise ValueError(f"Invalid rate {rate!r}; expected '<count>/<s|m|h|d>'")
+    return UNITS[unit] / count, burst or count
+
+
+def compile_limits(limits):
+    """``STORE_RATE_LIMITS`` -> {name: (query param or None, [(scope, interval, burst)])}."""
+    compiled = {}
+    for entry, buckets in limits.items():
+        name, _, param = entry.partition("?")
+        for scope in buckets:
+            if scope not in SCOPES:
+                raise ValueError(f"Unknown rate limit scope {scope!r} for {entry!r}")
+        rules = [(scope, *parse_rate(spec)) for scope, spec in buckets.items()]
+        compiled.setdefault(name, {})[param or None] = rules
+    return compiled
+
+
+def limits():
+    global _compiled
+    if _compiled is None:
+        _compiled = compile_limits(getattr(settings, "STORE_RATE_LIMITS", {}))
+    return _compiled
+
+
+@receiver(setting_changed, dispatch_uid="store.throttling.reset")
+def _reset(setting, **kwargs):
+    global _compiled
+    if setting == "STORE_RATE_LIMITS":
+        _compiled = None
+
+
+def get_store():
+    return caches[getattr(settings, "STORE_RATE_LIMIT_CACHE", "default")]
+
+
+@contextmanager
+def unthrottled():
+    """Let every request of this process through, for load tests and benchmarks."""
+    global _bypassed
+    previous, _bypassed = _bypassed, True
+    try:
+        yield
+    finally:
+        _bypassed = previous
+
+
+def rules_for(name, query):
+    """``(bucket prefix, rules)``: the prefix names the matched entry, ``"<name>?<param>"`` for a variant."""
+    compiled = limits()
+    by_param = compiled.get(name, {})
+    for param, rules in by_param.items():
+        if param is not None and param in query:
+            return f"{name}?{param}", rules
+    if None in by_param:
+        return name, by_param[None]
+    return name, compiled.get(DEFAULT, {}).get(None, ())
+
+
+def _client(request):
+    """The caller's address: REMOTE_ADDR, or the forwarded hop a trusted proxy appended.
+
+    Entries left of the trusted proxies' are whatever the client sent, so the
+    address is counted ``STORE_RATE_LIMIT_TRUSTED_PROXIES`` hops from the right.
+    """
+    header = getattr(settings, "STORE_RATE_LIMIT_CLIENT_HEADER", None)
+    proxies = getattr(settings, "STORE_RATE_LIMIT_TRUSTED_PROXIES", 1)
+    hops = [hop.strip() for hop in request.META.get(header, "").split(",") if hop.strip()] if header else []
+    if not hops or proxies <= 0:
+        return request.META.get("REMOTE_ADDR", "")
+    return hops[-min(proxies, len(hops))]
+
+
+def _identity(scope, request):
+    if scope == "client":
+        return _client(request)
+    if scope == "user":
+        header = request.META.get("HTTP_AUTHORIZATION", "")
+        return hashlib.sha1(header.encode()).hexdigest() if header.startswith("Token ") else None
+    return "all"
+
+
+def take(buckets, now=None):
+    """Spend one token from every ``(key, interval, burst)`` bucket.
+
+    Returns 0 when all of them had one, else the seconds until they will;
+    a rejected request spends nothing.
+    """
+    store = get_store()
+    # ** integer nanoseconds: float residue at epoch magnitude would refuse a full burst its last token
+    now = round((time.time() if now is None else now) * NANOSECONDS)
+    stored = store.get_many([key for key, _, _ in buckets])
+    wait = 0
+    updates = {}
+    ttl = 1
+    for key, interval, burst in buckets:
+        interval = round(interval * NANOSECONDS)
+        arrival = max(stored.get(key, now), now) + interval
+        earliest = arrival - burst * interval
+        if earliest > now:
+            wait = max(wait, earliest - now)
+        else:
+            updates[key] = arrival
+            ttl = max(ttl, math.ceil((arrival - now) / NANOSECONDS))
+    if wait:
+        return wait / NANOSECONDS
+    store.set_many(updates, ttl)
+    return 0.0
+
+
+def throttle(request, name):
+    """Seconds the request has to wait, or 0 if it may proceed."""
+    # ** one key per matched entry: a variant's rate never spends the plain entry's bucket
+    prefix, rules = rules_for(name, request.GET)
+    if not rules or _bypassed:
+        return 0.0
+    buckets = []
+    for scope, interval, burst in rules:
+        identity = _identity(scope, request)
+        if identity is not None:
+            buckets.append((f"store:rl:{prefix}:{scope}:{identity}", interval, burst))
+    return take(buckets) if buckets else 0.0
+
+
+class ThrottleMiddleware(MiddlewareMixin):
+    """Answer over-limit requests with 429 and ``Retry-After`` before the view runs."""
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        name = request.resolver_match.url_name
+        if name is None:
+            return None
+        wait = throttle(request, name)
+        if not wait:
+            return None
+        response = JsonResponse({"error": "Too many requests"}, status=429)
+        response["Retry-After"] = str(math.ceil(wait))
+        return response
@@ -1,5 +1,6 @@
 from django.urls import path
-from store.views import get_categories, get_products, get_product_detail, get_carts, get_add_carts, get_remove_carts, update_cart_quantity, register_user, login_user, toggle_wishlist, get_wishlist, create_order, get_user_orders, get_order_detail
+from store.views import get_categories, get_products, get_product_detail, get_carts, get_add_carts, get_remove_carts, update_cart_quantity, batch_update_cart, register_user, login_user, toggle_wishlist, batch_toggle_wishlist, get_wishlist, get_wishlist_products, create_order, get_user_orders, get_order_detail, export_orders, get_metrics
+from store.async_views import aget_products, aget_product_detail, aget_categories, aget_user_orders, aget_wishlist
 
 urlpatterns = [
     path("products/", get_products, name="get-products"),
@@ -9,11 +10,22 @@ urlpatterns = [
     path("carts/add", get_add_carts, name="get-add-carts"),
     path("carts/remove", get_remove_carts, name = "get-remove-carts"),
     path("carts/update", update_cart_quantity, name="update-cart-quantity"),
+    path("carts/batch", batch_update_cart, name="batch-update-cart"),
     path("register/", register_user, name="register"),
     path("login/", login_user, name="login"),
     path("wishlist/toggle", toggle_wishlist, name="toggle-wishlist"),
+    path("wishlist/batch", batch_toggle_wishlist, name="batch-toggle-wishlist"),
     path("wishlist/", get_wishlist, name="get-wishlist"),
+    path("wishlist/products/", get_wishlist_products, name="get-wishlist-products"),
     path("orders/<int:pk>/", get_order_detail, name="get-order-detail"),
     path("orders/create", create_order, name="create-order"),
     path("orders/", get_user_orders, name="get-user-orders"),
+    path("orders/export", export_orders, name="export-orders"),
+    path("metrics", get_metrics, name="metrics"),
+    # ** native async read path for ASGI deployments, same responses as above
+    path("async/products/", aget_products, name="async-get-products"),
+    path("async/products/<int:pk>/", aget_product_detail, name="async-get-product-detail"),
+    path("async/categories/", aget_categories, name="async-get-categories"),
+    path("async/orders/", aget_user_orders, name="async-get-user-orders"),
+    path("async/wishlist/", aget_wishlist, name="async-get-wishlist"),
 ]
\ No newline at end of file
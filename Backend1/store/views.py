@@ -1,4 +1,3 @@
-import os
 from dotenv import load_dotenv
 load_dotenv() 
 from rest_framework.response import Response
@@ -6,14 +5,35 @@ from rest_framework.decorators import api_view
 from rest_framework import status
 from django.contrib.auth import authenticate
 from django.db import transaction
+from django.db.models import F, Prefetch
 from rest_framework.authtoken.models import Token
-from .models import Product, Category, Cart, CartItem, Wishlist, Order, OrderItem
+from .models import Product, Category, Cart, CartItem, Order, OrderItem
 from .serilizer import (
-    ProductSerializer, CategorySerializer, CartItemSerializer, 
-    CartSerializer, UserRegisterSerializer, OrderSerializer
+    CategorySerializer, CartItemSerializer, UserRegisterSerializer, OrderSerializer
 )
-from django.core.mail import send_mail
+from .pagination import (
+    OrderCursorPagination, ProductCursorPagination, WishlistCursorPagination, wants_cursor_page,
+)
+from .orders import order_history, wants_summary
+from .search import search_products
+from .browse import (
+    BrowseError, apply_filters, check_search, facets, ordering, parse_filters, search_scope, wants_facets,
+)
+from .catalog_cache import cached_catalog_response
+from .auth_cache import user_for_token
+from .idempotency import idempotent
+from .outbox import enqueue_email
+from .order_export import CONTENT_TYPES, OrderExportError, export_rows, parse_filters as parse_export_filters, render
+from .carts import (
+    CartBatchError, apply_batch, apply_line_delta, cart_for, empty_cart, forget_guest, guest_key,
+    merge_guest_cart, parse_operations, recompute_totals, remember_guest,
+)
+from .metrics import render_metrics
+from .fastser import cart_plan, order_plan, product_plan, wishlist_product_plan
+from . import stock, wishlists
 from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 
 def get_auth_user(request):
     """Helper to get user from Token in Authorization header"""
@@ -22,9 +42,21 @@ def get_auth_user(request):
         return None
     try:
         token_key = auth_header.split(" ")[1]
-        return Token.objects.get(key=token_key).user
-    except (IndexError, Token.DoesNotExist):
+    except IndexError:
         return None
+    return user_for_token(token_key)
+
+def get_request_cart(request, create=False):
+    """The user's cart, or the guest cart named by the signed cookie.
+
+    Returns (cart, new guest key); the key is set only when ``create`` made
+    a new guest cart and has to be sent back with ``remember_guest``.
+    """
+    return cart_for(get_auth_user(request), guest_key(request), create)
+
+def cart_response(data, new_key=None):
+    response = Response(data)
+    return remember_guest(response, new_key) if new_key else response
 
 @api_view(["POST"])
 def register_user(request):
@@ -42,7 +74,12 @@ def login_user(request):
     
     if user:
         token, _ = Token.objects.get_or_create(user=user)
-        return Response({"token": token.key, "username": user.username}, status=status.HTTP_200_OK)
+        response = Response({"token": token.key, "username": user.username}, status=status.HTTP_200_OK)
+        key = guest_key(request)
+        if key:
+            merge_guest_cart(key, user)
+            forget_guest(response)
+        return response
     return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
 
 @api_view(["POST"])
@@ -52,29 +89,46 @@ def toggle_wishlist(request):
         return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
 
     product_id = request.data.get("product_id")
-    try:
-        product = Product.objects.get(id=product_id)
-        wishlist, _ = Wishlist.objects.get_or_create(user=user)
-        if product in wishlist.products.all():
-            wishlist.products.remove(product)
-            liked = False
-        else:
-            wishlist.products.add(product)
-            liked = True
-        return Response({"liked": liked, "message": "Wishlist updated"})
-    except Product.DoesNotExist:
+    if not Product.objects.filter(id=product_id).exists():
         return Response({"error": "Product not found"}, status=404)
+    # ** one indexed DELETE or INSERT on the through table, never the whole list
+    liked = wishlists.toggle(wishlists.wishlist_id_for(user), product_id)
+    return Response({"liked": liked, "message": "Wishlist updated"})
+
+@api_view(["POST"])
+def batch_toggle_wishlist(request):
+    """Toggle (or ``action``: add/remove) many products in a fixed number of queries."""
+    user = get_auth_user(request)
+    if not user:
+        return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
+    try:
+        product_ids = wishlists.parse_product_ids(request.data.get("product_ids"))
+        liked, unliked = wishlists.apply_batch(
+            wishlists.wishlist_id_for(user), product_ids, request.data.get("action", "toggle"),
+        )
+    except wishlists.WishlistBatchError as exc:
+        return Response({"error": str(exc)}, status=exc.status)
+    return Response({"liked": liked, "unliked": unliked, "message": "Wishlist updated"})
 
 @api_view(["GET"])
 def get_wishlist(request):
     user = get_auth_user(request)
     if not user:
         return Response([]) 
-    wishlist, _ = Wishlist.objects.get_or_create(user=user)
-    return Response(wishlist.products.values_list('id', flat=True))
+    return Response(wishlists.member_rows(user).values_list("product_id", flat=True))
 
+@api_view(["GET"])
+def get_wishlist_products(request):
+    """Wishlisted product cards, newest first, cursor-paged, from one joined query."""
+    user = get_auth_user(request)
+    if not user:
+        return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
+    paginator = WishlistCursorPagination()
+    page = paginator.paginate_queryset(wishlist_product_plan.values(wishlists.member_rows(user), "id"), request)
+    return paginator.get_paginated_response(wishlist_product_plan.dump(page))
+
+@idempotent
 @api_view(["POST"])
-@transaction.atomic
 def create_order(request):
     user = get_auth_user(request)
     if not user:
@@ -82,10 +136,13 @@ def create_order(request):
     
     try:
         cart = Cart.objects.get(user=user)
-        if not cart.items.exists():
-            return Response({"error": "Your cart is empty. Please add items before checkout."}, status=status.HTTP_400_BAD_REQUEST)
     except Cart.DoesNotExist:
         return Response({"error": "Cart not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    # ** one joined read of the cart lines; everything below works from it
+    lines = list(cart.items.select_related("product"))
+    if not lines:
+        return Response({"error": "Your cart is empty. Please add items before checkout."}, status=status.HTTP_400_BAD_REQUEST)
     
     full_name = request.data.get('full_name', '').strip()
     phone = request.data.get('phone', '').strip()
@@ -101,9 +158,34 @@ def create_order(request):
     elif len(clean_phone) < 10:
         return Response({"error": "Phone number must be at least 10 digits"}, status=status.HTTP_400_BAD_REQUEST)
 
+    # ** held in its own short transaction so no product row stays locked while the order is written
+    try:
+        hold = stock.reserve({line.product_id: line.quantity for line in lines if line.product.stock_available is not None})
+    except stock.OutOfStock as exc:
+        return Response(
+            {"error": "Some items are out of stock", "product_ids": exc.product_ids}, status=status.HTTP_409_CONFLICT,
+        )
+    try:
+        order = place_order(request, user, cart, lines, full_name, clean_phone, address, hold)
+    except Exception:
+        if hold is not None:
+            stock.release(stock.held(hold))
+        raise
+
+    # ** re-read with the lines prefetched: bulk_create does not return ids on MySQL
+    order = Order.objects.prefetch_related(
+        Prefetch("items", queryset=OrderItem.objects.select_related("product"))
+    ).get(pk=order.pk)
+    return Response({
+        "message": "Order placed successfully!",
+        "order": OrderSerializer(order).data
+    }, status=status.HTTP_201_CREATED)
+
+@transaction.atomic
+def place_order(request, user, cart, lines, full_name, clean_phone, address, hold):
     order = Order.objects.create(
         user=user,
-        total_amount=cart.total,
+        total_amount=sum(line.quantity * line.product.price for line in lines),
         full_name=full_name,
         phone=clean_phone,
         address=address,
@@ -112,21 +194,25 @@ def create_order(request):
         status='pending'
     )
     
-    for cart_item in cart.items.all():
-        OrderItem.objects.create(
+    OrderItem.objects.bulk_create([
+        OrderItem(
             order=order,
-            product=cart_item.product,
-            quantity=cart_item.quantity,
-            price=cart_item.product.price
+            product=line.product,
+            quantity=line.quantity,
+            price=line.product.price
         )
+        for line in lines
+    ])
     
-    cart.items.all().delete()
+    # ** only the lines that were ordered, in case the cart changed meanwhile
+    CartItem.objects.filter(pk__in=[line.pk for line in lines]).delete()
+    recompute_totals(Cart.objects.filter(pk=cart.pk))
+    stock.attach(hold, order)
 
-    #  EMAIL TO Owner (ADMIN)
-    try:
-        send_mail(
-            subject=f"New Order #{order.id}",
-                        message=f"""
+    #  EMAIL TO Owner (ADMIN), delivered by the send_outbox_emails worker
+    enqueue_email(
+        subject=f"New Order #{order.id}",
+        body=f"""
             New order placed!
             Order ID: {order.id}
             Customer: {user.email} (Username: {user.username})
@@ -136,41 +222,67 @@ def create_order(request):
             Address: {order.address}
             Notes: {order.order_notes}
             """,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[ os.getenv("EMAIL_USER")],
-            fail_silently=True
-        )
-    except Exception as e:
-        print(f"Failed to send email: {e}")
-
-    return Response({
-        "message": "Order placed successfully!",
-        "order": OrderSerializer(order).data
-    }, status=status.HTTP_201_CREATED)
+        recipients=settings.ORDER_NOTIFICATION_RECIPIENTS,
+    )
+    return order
 
+@cached_catalog_response
 @api_view(["GET"])
 def get_products(request):
     query = request.query_params.get('search')
-    products = Product.objects.filter(name__icontains=query) if query else Product.objects.all()
-    return Response(ProductSerializer(products, many=True).data)
+    try:
+        filters = parse_filters(request.query_params)
+        if query:
+            check_search(request.query_params)
+    except BrowseError as exc:
+        return Response({"error": str(exc)}, status=exc.status)
+    # ** .values() rows through the compiled ProductSerializer plan (store/fastser.py)
+    products = product_plan.values(apply_filters(Product.objects.all(), filters))
+    if query:
+        # ** relevance-ranked (or ?sort=), so results are capped instead of cursor-paged;
+        # ** the filters narrow the matches before the cap
+        scope, order_by = search_scope(filters)
+        ids = search_products(
+            query, limit=getattr(settings, "SEARCH_RESULTS_LIMIT", 100), products=scope, order_by=order_by,
+        )
+        found = {row["id"]: row for row in products.filter(pk__in=ids)}
+        return Response(product_plan.dump([found[i] for i in ids if i in found]))
 
+    # ** ?page_size= / ?cursor= switch to keyset pages with next/previous links;
+    # ** ?facets=1 adds the facet counts to the page
+    if wants_cursor_page(request) or wants_facets(request.query_params):
+        paginator = ProductCursorPagination()
+        paginator.ordering = ordering(filters)
+        page = paginator.paginate_queryset(products, request)
+        response = paginator.get_paginated_response(product_plan.dump(page))
+        if wants_facets(request.query_params):
+            response.data["facets"] = facets(filters)
+        return response
+    if "sort" in request.query_params:
+        products = products.order_by(*ordering(filters))
+    return Response(product_plan.dump(list(products)))
+
+@cached_catalog_response
 @api_view(["GET"])
 def get_categories(request):
     return Response(CategorySerializer(Category.objects.all(), many=True).data)
 
+@cached_catalog_response
 @api_view(["GET"])
 def get_product_detail(request, pk):
-    try:
-        return Response(ProductSerializer(Product.objects.get(pk=pk)).data)
-    except Product.DoesNotExist:
+    product = product_plan.first(Product.objects.filter(pk=pk))
+    if product is None:
         return Response({"error": "Product not found"}, status=404)
+    return Response(product)
 
 @api_view(["GET"])
 def get_carts(request):
-    user = get_auth_user(request)
-    cart, _ = Cart.objects.get_or_create(user=user)
-    return Response(CartSerializer(cart).data)
+    cart, _ = get_request_cart(request)
+    if cart is None:
+        return Response(empty_cart())
+    return Response(cart_plan.first(Cart.objects.filter(pk=cart.pk)))
 
+@idempotent
 @api_view(["POST"])
 def get_add_carts(request):
     product_id = request.data.get("product_id")
@@ -178,73 +290,133 @@ def get_add_carts(request):
     
     try:
         product = Product.objects.get(id=product_id)
-        user = get_auth_user(request)
-        cart, _ = Cart.objects.get_or_create(user=user)
-        item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-        item.quantity = item.quantity + quantity if not created else quantity
-        item.save()
+        with transaction.atomic():
+            # ** guest carts are only created here, on the first add, and roll back with it
+            cart, new_key = get_request_cart(request, create=True)
+            item, created = CartItem.objects.get_or_create(cart=cart, product=product, defaults={"quantity": quantity})
+            if not created:
+                # ** in the database, like the aggregate: a concurrent add cannot lose this increment
+                CartItem.objects.filter(pk=item.pk).update(quantity=F("quantity") + quantity)
+            apply_line_delta(cart.pk, quantity, quantity * product.price)
         
-        return Response({
+        return cart_response({
             "message": f"Added to cart",
-            "cart": CartSerializer(cart).data
-        })
+            "cart": cart_plan.first(Cart.objects.filter(pk=cart.pk))
+        }, new_key)
     except Product.DoesNotExist:
         return Response({"error": "Product not found"}, status=404)
 
 @api_view(["POST"])
 def get_remove_carts(request):
     item_id = request.data.get("item_id")
+    cart, _ = get_request_cart(request)
     try:
-        item = CartItem.objects.get(id=item_id)
-        item.delete()
-        user = get_auth_user(request)
-        cart, _ = Cart.objects.get_or_create(user=user)
+        with transaction.atomic():
+            item = CartItem.objects.select_related("product").get(id=item_id, cart=cart)
+            item.delete()
+            apply_line_delta(item.cart_id, -item.quantity, -item.subtotal)
         return Response({
             "message": "Item removed",
-            "cart": CartSerializer(cart).data
+            "cart": cart_plan.first(Cart.objects.filter(pk=cart.pk))
         })
     except CartItem.DoesNotExist:
         return Response({"error": "Item not found"}, status=404)
 
+@idempotent
 @api_view(["POST"])
 def update_cart_quantity(request):
     item_id = request.data.get("item_id")
     action = request.data.get("action")
+    cart, _ = get_request_cart(request)
     try:
-        item = CartItem.objects.get(id=item_id)
-        if action == "increase":
-            item.quantity += 1
-        elif action == "decrease":
-            item.quantity -= 1
-        
-        if item.quantity <= 0:
-            item.delete()
-        else:
-            item.save()
+        with transaction.atomic():
+            item = CartItem.objects.select_related("product").get(id=item_id, cart=cart)
+            previous = item.quantity
+            if action == "increase":
+                item.quantity += 1
+            elif action == "decrease":
+                item.quantity -= 1
+            
+            if item.quantity <= 0:
+                item.delete()
+            else:
+                item.save()
+            changed = max(item.quantity, 0) - previous
+            apply_line_delta(item.cart_id, changed, changed * item.product.price)
             
-        user = get_auth_user(request)
-        cart, _ = Cart.objects.get_or_create(user=user)
-        return Response({"cart": CartSerializer(cart).data})
+        return Response({"cart": cart_plan.first(Cart.objects.filter(pk=cart.pk))})
     except CartItem.DoesNotExist:
         return Response({"error": "Item not found"}, status=404)
 
+@api_view(["POST"])
+def batch_update_cart(request):
+    """Apply many add/set/remove operations at once; return only the delta
+    unless the full cart is asked for with ``full``."""
+    try:
+        operations = parse_operations(request.data.get("operations"))
+        # ** a batch rejected by apply_batch takes the guest cart it created with it
+        with transaction.atomic():
+            cart, new_key = get_request_cart(request, create=True)
+            changed, removed = apply_batch(cart, operations)
+    except CartBatchError as exc:
+        return Response({"error": str(exc)}, status=exc.status)
+
+    if request.data.get("full") or request.query_params.get("full"):
+        return cart_response({"message": "Cart updated", "cart": cart_plan.first(Cart.objects.filter(pk=cart.pk))}, new_key)
+
+    cart = Cart.objects.only("item_count", "total").get(pk=cart.pk)
+    lines = cart.items.filter(product_id__in=changed).select_related("product").order_by("id") if changed else []
+    return cart_response({
+        "message": "Cart updated",
+        "items": CartItemSerializer(lines, many=True).data,
+        "removed": removed,
+        "item_count": cart.item_count,
+        "total": cart.total,
+    }, new_key)
+
 @api_view(["GET"])
 def get_user_orders(request):
     user = get_auth_user(request)
     if not user:
         return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
-    orders = Order.objects.filter(user=user).order_by('-created_at')
-    return Response(OrderSerializer(orders, many=True).data)
+    # ** ?summary=1: header fields plus line aggregates from correlated subqueries in the same query
+    plan, orders = order_history(user, summary=wants_summary(request.query_params))
+    # ** ?page_size= / ?cursor= switch to keyset pages; either way the query
+    # ** count is fixed: orders, then one joined read of their lines
+    if wants_cursor_page(request):
+        paginator = OrderCursorPagination()
+        page = paginator.paginate_queryset(plan.values(orders), request)
+        return paginator.get_paginated_response(plan.dump(page))
+    return Response(plan.serialize(orders.order_by('-created_at')))
 
 @api_view(["GET"])
 def get_order_detail(request, pk):
     user = get_auth_user(request)
     if not user:
         return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
-    try:
-        order = Order.objects.get(id=pk, user=user)
-        return Response(OrderSerializer(order).data)
-    except Order.DoesNotExist:
+    order = order_plan.first(Order.objects.filter(id=pk, user=user))
+    if order is None:
         return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(order)
 
+@require_GET
+def get_metrics(request):
+    """Prometheus scrape endpoint; plain Django so the text is not negotiated."""
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
 
+@require_GET
+def export_orders(request):
+    """Staff-only order export (CSV or JSON lines), streamed a chunk of orders at a time."""
+    user = get_auth_user(request)
+    if not user:
+        return JsonResponse({"error": "Authentication required"}, status=401)
+    if not user.is_staff:
+        return JsonResponse({"error": "Staff only"}, status=403)
+    try:
+        filters = parse_export_filters(request.GET)
+    except OrderExportError as exc:
+        return JsonResponse({"error": str(exc)}, status=exc.status)
+    fmt = filters["format"]
+    response = StreamingHttpResponse(render(export_rows(filters), fmt), content_type=CONTENT_TYPES[fmt])
+    response["Content-Disposition"] = f'attachment; filename="orders.{fmt}"'
+    return response
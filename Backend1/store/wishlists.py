@@ -0,0 +1,93 @@
+"""Wishlist membership through the M2M through table.
+
+Every check, add and remove is a statement on ``Wishlist.products.through``
+keyed by its (wishlist, product) unique index, so toggling costs the same
+whether the wishlist holds two products or two thousand.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from .models import Product, Wishlist
+
+WishlistProduct = Wishlist.products.through
+
+BATCH_ACTIONS = ("toggle", "add", "remove")
+MAX_BATCH_PRODUCTS = getattr(settings, "WISHLIST_BATCH_MAX_PRODUCTS", 100)
+
+
+class WishlistBatchError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def wishlist_id_for(user):
+    wishlist, _ = Wishlist.objects.only("id").get_or_create(user=user)
+    return wishlist.pk
+
+
+def toggle(wishlist_id, product_id):
+    """Flip one product's membership; returns True if it is now liked."""
+    with transaction.atomic():
+        removed, _ = WishlistProduct.objects.filter(wishlist_id=wishlist_id, product_id=product_id).delete()
+        if removed:
+            return False
+        WishlistProduct.objects.bulk_create(
+            [WishlistProduct(wishlist_id=wishlist_id, product_id=product_id)], ignore_conflicts=True,
+        )
+        return True
+
+
+def parse_product_ids(product_ids):
+    if not isinstance(product_ids, list) or not product_ids:
+        raise WishlistBatchError("product_ids must be a non-empty list")
+    if len(product_ids) > MAX_BATCH_PRODUCTS:
+        raise WishlistBatchError(f"at most {MAX_BATCH_PRODUCTS} products per batch")
+    try:
+        return list(dict.fromkeys(int(product_id) for product_id in product_ids))
+    except (TypeError, ValueError):
+        raise WishlistBatchError("product_ids must be integers")
+
+
+def apply_batch(wishlist_id, product_ids, action="toggle"):
+    """Add, remove or toggle many products with one statement per kind.
+
+    Returns (liked ids, unliked ids), both in request order.
+    """
+    if action not in BATCH_ACTIONS:
+        raise WishlistBatchError(f"action must be one of {', '.join(BATCH_ACTIONS)}")
+
+    with transaction.atomic():
+        known = set(Product.objects.filter(pk__in=product_ids).values_list("pk", flat=True))
+        missing = [product_id for product_id in product_ids if product_id not in known]
+        if missing:
+            raise WishlistBatchError(f"Product not found: {missing}", status=404)
+
+        members = WishlistProduct.objects.filter(wishlist_id=wishlist_id, product_id__in=product_ids)
+        present = set(members.values_list("product_id", flat=True))
+        if action == "add":
+            to_remove, to_add = [], [pid for pid in product_ids if pid not in present]
+        elif action == "remove":
+            to_remove, to_add = [pid for pid in product_ids if pid in present], []
+        else:
+            to_remove = [pid for pid in product_ids if pid in present]
+            to_add = [pid for pid in product_ids if pid not in present]
+
+        if to_remove:
+            members.filter(product_id__in=to_remove).delete()
+        if to_add:
+            WishlistProduct.objects.bulk_create(
+                [WishlistProduct(wishlist_id=wishlist_id, product_id=pid) for pid in to_add],
+                ignore_conflicts=True,
+            )
+
+    if action == "add":
+        return product_ids, []
+    if action == "remove":
+        return [], product_ids
+    return to_add, to_remove
+
+
+def member_rows(user):
+    """Through rows of ``user``'s wishlist; their ids grow in the order products were added."""
+    return WishlistProduct.objects.filter(wishlist__user=user)
@@ -1,8 +1,9 @@
-const AUTH_URL = "http://127.0.0.1:8000/api/";
+const AUTH_URL = "http://localhost:8000/api/";
 
 export const loginUser = async (data: any) => {
     const response = await fetch(`${AUTH_URL}login/`, {
         method: "POST",
+        credentials: "include",
         headers: {
             "Content-Type": "application/json",
         },
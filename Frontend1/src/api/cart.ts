@@ -1,8 +1,9 @@
-export const API_URL = "http://127.0.0.1:8000/api/carts/";
+export const API_URL = "http://localhost:8000/api/carts/";
 
 export const fetchCart = async () => {
     const token = localStorage.getItem("token");
     const response = await fetch(API_URL, {
+        credentials: "include",
         headers: {
             "Authorization": token ? `Token ${token}` : ""
         }
@@ -17,6 +18,7 @@ export const addToCart = async (productId: number, quantity: number = 1) => {
     const token = localStorage.getItem("token");
     const response = await fetch(`${API_URL}add`, {
         method: "POST",
+        credentials: "include",
         headers: {
             "Content-Type": "application/json",
             "Authorization": token ? `Token ${token}` : ""
@@ -33,6 +35,7 @@ export const removeFromCart = async (itemId: number) => {
     const token = localStorage.getItem("token");
     const response = await fetch(`${API_URL}remove`, {
         method: "POST",
+        credentials: "include",
         headers: {
             "Content-Type": "application/json",
             "Authorization": token ? `Token ${token}` : ""
@@ -49,6 +52,7 @@ export const updateCartQuantity = async (itemId: number, action: "increase" | "d
     const token = localStorage.getItem("token");
     const response = await fetch(`${API_URL}update`, {
         method: "POST",
+        credentials: "include",
         headers: {
             "Content-Type": "application/json",
             "Authorization": token ? `Token ${token}` : ""
@@ -1,4 +1,4 @@
-export const API_URL = "http://127.0.0.1:8000/api/";
+export const API_URL = "http://localhost:8000/api/";
 
 export interface OrderItem {
     id: number;
@@ -8,12 +8,17 @@ function ProductList() {
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
     const [searchParams] = useSearchParams();
-    const searchQuery = searchParams.get("search");
+    // filtering and sorting happen on the server; forward the ones in the page URL
+    const browseQuery = new URLSearchParams(
+        ["search", "category", "min_price", "max_price", "sort"]
+            .filter((name) => searchParams.get(name))
+            .map((name) => [name, searchParams.get(name) as string])
+    ).toString();
 
     useEffect(() => {
-        let url = "http://127.0.0.1:8000/api/products/";
-        if (searchQuery) {
-            url += `?search=${encodeURIComponent(searchQuery)}`;
+        let url = "http://localhost:8000/api/products/";
+        if (browseQuery) {
+            url += `?${browseQuery}`;
         }
 
         setLoading(true);
@@ -30,7 +35,7 @@ function ProductList() {
                 setError(error.message);
                 setLoading(false);
             });
-    }, [searchQuery]);
+    }, [browseQuery]);
     if (loading) {
         return <div>Loading...</div>;
     }